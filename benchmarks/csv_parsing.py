@@ -0,0 +1,67 @@
+"""
+Benchmark of CSV ingestion throughput. Generates a synthetic response file and compares the fast C-level parsing path
+of CSVParser to the per-cell parsing path that is used as fallback for unusual file contents.
+
+Usage: python benchmarks/csv_parsing.py [-r <rows>] [-c <columns>] [--dates] [--skip_per_cell]
+"""
+
+import argparse
+import contextlib
+from datetime import datetime, timedelta
+import io
+import os
+import tempfile
+from time import perf_counter
+import numpy as np
+from neuro_mine.lib.file_handling import CSVParser
+
+
+def write_test_file(file_path: str, n_rows: int, n_cols: int, dates: bool) -> None:
+    """
+    Writes a synthetic CSV file with a time column followed by random responses
+    :param file_path: The path of the file to write
+    :param n_rows: The number of rows
+    :param n_cols: The number of response columns
+    :param dates: If true, time is written as date-time strings instead of seconds
+    """
+    rng = np.random.default_rng(42)
+    t_start = datetime(2024, 1, 1)
+    with open(file_path, "w") as f:
+        f.write(",".join(["Time"] + [f"n{i}" for i in range(n_cols)]) + "\n")
+        for r in range(n_rows):
+            t = (t_start + timedelta(milliseconds=100 * r)).isoformat(sep=" ", timespec="milliseconds") if dates else f"{r * 0.1:.1f}"
+            f.write(t + "," + ",".join(f"{v:.6f}" for v in rng.standard_normal(n_cols)) + "\n")
+
+
+def time_parse(file_path: str, per_cell: bool) -> float:
+    """
+    Parses a file and returns the elapsed time in seconds
+    """
+    start = perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = CSVParser(file_path, "R")
+        if per_cell:
+            parser._load_data_per_cell(1)
+        else:
+            parser.load_data()
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    a_parser = argparse.ArgumentParser(description="Measures CSV parsing throughput.")
+    a_parser.add_argument("-r", "--rows", help="Number of rows.", type=int, default=20000)
+    a_parser.add_argument("-c", "--columns", help="Number of response columns.", type=int, default=500)
+    a_parser.add_argument("--dates", help="Encode time as date-time strings.", action="store_true")
+    a_parser.add_argument("--skip_per_cell", help="Do not time the per-cell parser.", action="store_true")
+    args = a_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_file = os.path.join(tmp_dir, "bench_responses.csv")
+        write_test_file(test_file, args.rows, args.columns, args.dates)
+        size_mb = os.path.getsize(test_file) / 1e6
+        print(f"Test file: {args.rows} rows x {args.columns + 1} columns, {size_mb:.1f} MB")
+        fast = time_parse(test_file, False)
+        print(f"fast path      {fast:8.2f} s  {size_mb / fast:8.1f} MB/s")
+        if not args.skip_per_cell:
+            slow = time_parse(test_file, True)
+            print(f"per-cell path  {slow:8.2f} s  {size_mb / slow:8.1f} MB/s  (speedup {slow / fast:.1f}x)")
@@ -0,0 +1,87 @@
+"""
+Benchmark of startup costs of the neuro-mine entry points. Each measurement runs in a fresh interpreter and reports
+the time to import the entry point script and to show its command line help, as well as which heavy libraries were
+loaded in the process. Results can be appended to a JSON file to track startup costs across versions.
+
+Usage: python benchmarks/import_times.py [-n <repeats>] [-o <json file to append results to>]
+"""
+
+import argparse
+from datetime import datetime
+import json
+from os import path
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# entry point name -> script module
+entry_points = {
+    "Mine": "neuro_mine.scripts.neuromine_train",
+    "Mine-predict": "neuro_mine.scripts.neuromine_prediction",
+    "Data-diagnostic": "neuro_mine.scripts.data_diagnostics",
+}
+
+heavy_modules = ["tensorflow", "keras", "pandas", "matplotlib", "sklearn", "numba"]
+
+import_snippet = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps([elapsed, [m for m in {heavy} if m in sys.modules]]))
+"""
+
+
+def time_import(module: str) -> Tuple[float, List[str]]:
+    """
+    Imports a module in a fresh interpreter
+    :param module: The module to import
+    :return: The import time in seconds and the list of heavy modules that were loaded by the import
+    """
+    out = subprocess.run([sys.executable, "-c", import_snippet.format(module=module, heavy=heavy_modules)],
+                         capture_output=True, text=True, check=True).stdout.strip().split("\n")[-1]
+    elapsed, loaded = json.loads(out)
+    return elapsed, loaded
+
+
+def time_help(module: str) -> float:
+    """
+    Runs a script module with --help in a fresh interpreter
+    :param module: The script module
+    :return: The wall time in seconds
+    """
+    t = time.perf_counter()
+    subprocess.run([sys.executable, "-m", module, "--help"], capture_output=True, check=True)
+    return time.perf_counter() - t
+
+
+if __name__ == '__main__':
+    a_parser = argparse.ArgumentParser(description="Measures startup costs of neuro-mine entry points.")
+    a_parser.add_argument("-n", "--repeats", help="Number of repeats, the minimum is reported.", type=int, default=3)
+    a_parser.add_argument("-o", "--output", help="JSON file to which results are appended.", type=str, default=None)
+    args = a_parser.parse_args()
+
+    results = {"timestamp": datetime.now().isoformat(), "python": sys.version.split()[0], "entry_points": {}}
+    # import the package itself once as baseline
+    package_time = min(time_import("neuro_mine")[0] for _ in range(args.repeats))
+    print(f"{'neuro_mine':<16} import {package_time:7.3f} s")
+    results["package_import_seconds"] = package_time
+    for name, module in entry_points.items():
+        import_times, loaded = [], []
+        for _ in range(args.repeats):
+            t, loaded = time_import(module)
+            import_times.append(t)
+        help_time = min(time_help(module) for _ in range(args.repeats))
+        print(f"{name:<16} import {min(import_times):7.3f} s   --help {help_time:7.3f} s   loaded: {','.join(loaded) or '-'}")
+        results["entry_points"][name] = {"import_seconds": min(import_times), "help_seconds": help_time,
+                                         "heavy_modules_loaded": loaded}
+
+    if args.output is not None:
+        history = []
+        if path.exists(args.output):
+            with open(args.output) as f:
+                history = json.load(f)
+        history.append(results)
+        with open(args.output, "w") as f:
+            json.dump(history, f, indent=2)
@@ -5,17 +5,40 @@ os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 import logging
 logging.getLogger("tensorflow").setLevel(logging.ERROR)
 
-from .lib.processing import generate_insights, barcode_cluster_plot, generate_insights_from_file, load_and_pre_process_data, test_metrics_plot, linearity_metrics_plot
-from .lib.mine import Mine, BaseData, MineData, MineSpikingData, MineWarning, MineException
-from .lib.taylorDecomp import dca_dr, d2ca_dr2, taylor_predict, taylor_decompose, data_mean_prediction, complexity_scores
-from .lib.model import ActivityPredictor, train_model, get_standard_model
-from .lib.utilities import (create_overwrite, modelweights_to_hdf5, modelweights_from_hdf5, bootstrap, safe_standardize,
-                                safe_standardize_episodic, barcode_cluster, rearrange_hessian, simulate_response, modified_gram_schmidt, sigmoid,
-                                interp_events, EpisodicData, Data, compute_autocorr_time)
+# Public names are resolved lazily on first access such that importing the package (e.g. to read an analysis file or
+# parse a CSV) does not load TensorFlow, matplotlib or pandas
+_lazy_attributes = {
+    "neuro_mine.lib.processing": ["generate_insights", "barcode_cluster_plot", "generate_insights_from_file",
+                                  "load_and_pre_process_data", "test_metrics_plot", "linearity_metrics_plot",
+                                  "analyze_arrays", "MineResult"],
+    "neuro_mine.lib.mine": ["Mine", "BaseData", "MineData", "MineSpikingData", "MineWarning", "MineException"],
+    "neuro_mine.lib.taylorDecomp": ["dca_dr", "d2ca_dr2", "taylor_predict", "taylor_decompose", "data_mean_prediction",
+                                    "complexity_scores"],
+    "neuro_mine.lib.model": ["ActivityPredictor", "train_model", "get_standard_model"],
+    "neuro_mine.lib.utilities": ["create_overwrite", "modelweights_to_hdf5", "modelweights_from_hdf5", "bootstrap",
+                                 "safe_standardize", "safe_standardize_episodic", "barcode_cluster",
+                                 "rearrange_hessian", "simulate_response", "modified_gram_schmidt", "sigmoid",
+                                 "interp_events", "interp_columns", "EpisodicData", "Data", "compute_autocorr_time"]
+}
+_attribute_modules = {name: module for module, names in _lazy_attributes.items() for name in names}
+
+
+def __getattr__(name):
+    if name in _attribute_modules:
+        import importlib
+        value = getattr(importlib.import_module(_attribute_modules[name]), name)
+        globals()[name] = value  # cache such that subsequent accesses do not go through __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__)
 
 __all__ = ["Data",
            "EpisodicData",
            "interp_events",
+           "interp_columns",
            "sigmoid",
            "modified_gram_schmidt",
            "simulate_response",
@@ -43,6 +66,8 @@ __all__ = ["Data",
            "barcode_cluster_plot",
            "test_metrics_plot",
            "linearity_metrics_plot",
+           "analyze_arrays",
+           "MineResult",
            "Mine",
            "BaseData",
            "MineData",
@@ -1,11 +1,19 @@
-from . import processing
-from . import mine
-from . import taylorDecomp
-from . import model
-from . import utilities
+import importlib
 
+# Submodules are imported on first access such that lightweight modules (e.g. file_handling) can be used without
+# loading TensorFlow, matplotlib or pandas
 __all__ = ["processing",
            "mine",
            "model",
            "taylorDecomp",
-           "utilities"]
\ No newline at end of file
+           "utilities"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__)
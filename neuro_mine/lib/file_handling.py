@@ -1,32 +1,38 @@
 import csv
 from dateutil import parser as dateparser
+import io
 import numpy as np
 from os import path
 from datetime import datetime, date, time
-from typing import Optional, Tuple, List
+from time import perf_counter
+from typing import Any, Dict, Optional, Tuple, List
 import os
 
 
 def process_file_args(files_or_dir: List[str]) -> List[str]:
     """
-    Processes file arguments, expanding directories if present
+    Processes file arguments, expanding directories if present. Suite2p output directories are treated like files
     :param files_or_dir: Path to file or directory or list of paths to files
     :return: List of file paths
     """
     # Note: We allow lists of files or a single file or a single directory but not lists containing directories
     if len(files_or_dir) == 1:
+        if is_suite2p_dir(files_or_dir[0]):
+            # remove trailing separators since output files are named after the directory
+            return [path.normpath(files_or_dir[0])]
         if path.isdir(files_or_dir[0]):
             elements = os.listdir(files_or_dir[0])
-            return [path.join(files_or_dir[0], e) for e in elements if path.isfile(path.join(files_or_dir[0], e)) and not e[0]=='.']
+            return [path.join(files_or_dir[0], e) for e in elements if not e[0]=='.' and
+                    (path.isfile(path.join(files_or_dir[0], e)) or is_suite2p_dir(path.join(files_or_dir[0], e)))]
         elif path.isfile(files_or_dir[0]):
             return [files_or_dir[0]]
         else:
             raise ValueError("Unrecognized path: {}".format(files_or_dir))
     for f in files_or_dir:
-        if not path.isfile(f):
+        if not path.isfile(f) and not is_suite2p_dir(f):
             raise ValueError(f"{f} is not a path to a file. Note that if multiple arguments "
-                             "are provided they have to be files")
-    return files_or_dir
+                             "are provided they have to be files or suite2p directories")
+    return [path.normpath(f) if path.isdir(f) else f for f in files_or_dir]
 
 
 def pair_files(resp_files: List[str], pred_files: List[str]) -> List[Tuple[str, str]]:
@@ -49,16 +55,18 @@ class FileParser:
     """
     Base class for file parser
     """
-    def __init__(self, file_path):
+    def __init__(self, file_path, prefix: str="col"):
         """
         Creates a new file parser object
         :param file_path: The path to the file to parse
+        :param prefix: If no column names are provided in the file this prefix will be used to label columns
         """
         if not path.exists(file_path):
             raise FileNotFoundError(f"File {file_path} not found")
         if not path.isfile(file_path):
             raise FileNotFoundError(f"File {file_path} is not a file")
         self.filename = file_path
+        self.prefix = prefix
 
     @staticmethod
     def _parse_datetime(s: str) -> Optional[datetime]:
@@ -79,46 +87,316 @@ class FileParser:
         except (ValueError, OverflowError):
             return None  # neither a float nor a date - should we throw an exception here instead of returning None?
 
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the data from the file
+        :return:
+            [0]: n_timepoints x n_columns data matrix with time in the first column
+            [1]: Whether the file provided column names
+            [2]: The column names
+        """
+        raise NotImplementedError()
+
+    def data_extent(self) -> Tuple[int, int, float, float]:
+        """
+        Determines the size and time span of the data without parsing all of it, e.g. to estimate memory requirements.
+        Rows with missing values are not removed, the extent is therefore an upper bound of the data returned by
+        load_data. Parsers that can't determine the extent from the file structure load the data
+        :return:
+            [0]: The number of timepoints
+            [1]: The number of columns including time
+            [2]: The first time
+            [3]: The last time
+        """
+        data = self.load_data()[0]
+        return data.shape[0], data.shape[1], float(data[0, 0]), float(data[-1, 0])
+
+    def _default_header(self, n_columns: int) -> List[str]:
+        """
+        Column names used if the file does not provide any. The name of the first column is Time
+        """
+        return ["Time"] + [f"{self.prefix}_{i}" for i in range(n_columns - 1)]
+
+    def _clean_data(self, data: np.ndarray, data_header: List[str]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Validates the time column and removes empty columns and rows with missing values
+        :param data: The data matrix with time in the first column
+        :param data_header: The column names
+        :return: The cleaned data matrix and column names
+        """
+        # Make sure that the first column can be interpreted as time
+        if any(np.diff(data[:, 0]) <= 0):
+            raise ValueError("The first column in each datafile should be time. However values aren't strictly increasing,"
+                             " which means that data cannot be assigned to unique timepoints.")
+
+        # remove columns that contain all NaN - these can occur when cell contents in CSV files
+        # are deleted without deleting the column itself
+        full_nan = np.sum(np.isnan(data), axis=0) == data.shape[0]
+        data_header = [dh for i, dh in enumerate(data_header) if not full_nan[i]]
+        if np.any(full_nan):
+            data = data[:, np.logical_not(full_nan)]
+
+        # remove rows that contain at leat one NaN value
+        has_nan = np.sum(np.isnan(data), axis=1) > 0
+        if np.sum(has_nan) > 0:
+            print("###", flush=True)
+            print(f"Removed {np.sum(has_nan)} rows from {self.filename} since they contained at least one NaN or a missing value.", flush=True)
+            print("Note, deleting rows from within Microsoft Excel will sometimes remove data but leave ghost rows in the file. These will trigger this warning as well.")
+            print("###", flush=True)
+            data = data[np.logical_not(has_nan)]
+
+        return data, data_header
+
+    @staticmethod
+    def _datetime64_to_seconds(values: np.ndarray) -> np.ndarray:
+        """
+        Converts datetime64 values to seconds elapsed since the millennium start, the same reference as used for
+        date-time columns in CSV files
+        :param values: The datetime64 values
+        :return: The seconds since the reference with NaN for missing values
+        """
+        t0 = np.datetime64(datetime.combine(date(2000, 1, 1), time()), "us")
+        values = values.astype("datetime64[us]")
+        seconds = (values - t0).astype(np.int64) / 1e6
+        seconds[np.isnat(values)] = np.nan
+        return seconds
+
+    def _column_to_float(self, values: np.ndarray, col_name: int) -> np.ndarray:
+        """
+        Converts a typed column of a binary file to floating point numbers
+        :param values: The column values
+        :param col_name: The name of the column
+        :return: The column as floating point numbers
+        """
+        if np.issubdtype(values.dtype, np.datetime64):
+            return self._datetime64_to_seconds(values)
+        if values.dtype.kind in "OSU":
+            column = [v.decode() if isinstance(v, bytes) else ("" if v is None else str(v)) for v in values]
+            return self._load_string_column(column, col_name)[:, 0]
+        return np.asarray(values, dtype=np.float64)
+
+    def _columns_to_matrix(self, columns: List[np.ndarray]) -> np.ndarray:
+        """
+        Assembles a data matrix from individual columns of equal length
+        :param columns: The columns, the first being time
+        :return: n_timepoints x n_columns data matrix
+        """
+        n_rows = columns[0].shape[0]
+        data = np.empty((n_rows, len(columns)))
+        for i, c in enumerate(columns):
+            if c.ndim != 1 or c.shape[0] != n_rows:
+                raise IOError(f"{self.filename} contains columns of different lengths. Please ensure that all columns have"
+                              f" the same number of rows.")
+            data[:, i] = self._column_to_float(c, i)
+        return data
+
+    @staticmethod
+    def _load_string_column(column: List[str], col_name: int) -> np.ndarray:
+        """
+        Loads a column with text and interprets unique strings as categories
+        :param column: The file column
+        :param col_name: The name of the column
+        :return: The categories encoded as integers
+        """
+        retval = np.full((len(column), 1), np.nan)
+        categ_dict = {}
+        categ_count = 0
+        for i, elem in enumerate(column):
+            # we skip empty cells
+            if elem.strip() == "":
+                continue
+            valid = False
+            try:
+                float(elem)
+            except ValueError:
+                valid = True
+            if not valid:
+                raise ValueError(f"Column {col_name} was identified as containing text but contains at least one number."
+                                 f"Mixed content is not supported. This can be caused by ambiguous encoding or "
+                                 f"misidentification of a malformed header.")
+            if elem not in categ_dict:
+                categ_dict[elem] = categ_count
+                categ_count += 1
+            retval[i] = categ_dict[elem]
+        if categ_count > 2:
+            print("###", flush=True)
+            print(f"Column {col_name} was interpreted as categorical data with {categ_count} categories. Processing will"
+                  f" continue, however, categorical inputs are not properly supported.", flush=True)
+            print("###", flush=True)
+        return retval
+
 
 class CSVParser(FileParser):
     """
     Parser for CSV files
     """
+    # The file format (delimiter and header) is determined on the first lines of the file only. The sample contains
+    # at most sniff_lines lines and stops after sniff_bytes but always contains at least two complete lines
+    sniff_lines = 50
+    sniff_bytes = 1 << 20
+    # Column counts are validated on blocks of roughly this many bytes to bound temporary memory use
+    validation_block_bytes = 1 << 26
+
     def __init__(self, file_path: str, prefix: str="col"):
         """
         Creates a new CSV file parser object
         :param file_path: The path to the file to parse
         :param prefix: If no column names are provided in the file this prefix will be used to label columns
         """
-        super().__init__(file_path)
+        super().__init__(file_path, prefix)
+        # the file is read only once, all further processing works on its contents
+        with open(self.filename, "rb") as f:
+            self._raw = f.read()
+        self._sample = self._read_sample()
         self.delimiter = self._find_delimiter()
         self.col_count = self._validate_file_contents()
         if self.col_count == -1:
             raise IOError("CSV file has different column counts across rows. Please ensure that all rows have the same number of columns.")
-        self.prefix = prefix
+
+    def _read_sample(self) -> str:
+        """
+        Extracts the first complete lines of the file used to determine the file format
+        :return: The sample text
+        """
+        end = 0
+        n_lines = 0
+        while n_lines < self.sniff_lines:
+            nl = self._raw.find(b"\n", end)
+            if nl == -1:
+                end = len(self._raw)
+                break
+            end = nl + 1
+            n_lines += 1
+            if end >= self.sniff_bytes and n_lines >= 2:
+                break
+        return self._raw[:end].decode()
 
     def _find_delimiter(self):
         sniffer = csv.Sniffer()
-        with open(self.filename) as fp:
-            delimiter = sniffer.sniff(fp.read(-1)).delimiter
+        delimiter = sniffer.sniff(self._sample).delimiter
         return delimiter
 
+    @staticmethod
+    def _line_count(line: str, delimiter: str) -> int:
+        """
+        Returns the number of columns in one line of the file
+        """
+        return len(line.strip().split(delimiter))
+
     def _validate_file_contents(self) -> int:
         """
         Performs basic validation of file contents to ensure that all rows within the file have the same number of components
         :return: Number of columns if validated otherwise -1
         """
-        with open(self.filename, "r") as f:
-            lines = f.readlines()
-        col_count = None
-        for l in lines:
-            if col_count is None:
-                col_count = len(l.strip().split(self.delimiter))
+        if len(self._raw) == 0:
+            return None
+        col_count = self._line_count(self._sample.split("\n")[0], self.delimiter)
+        delim_code = self.delimiter.encode()
+        if len(delim_code) != 1:
+            # multi-byte delimiters can't be counted byte-wise
+            for l in io.TextIOWrapper(io.BytesIO(self._raw)):
+                if col_count != self._line_count(l, self.delimiter):
+                    return -1
+            return col_count
+        delim_code = delim_code[0]
+        # leading and trailing whitespace is stripped from lines before splitting - for whitespace delimiters this
+        # can change the column count which is why such lines are checked individually
+        strip_delimiter = self.delimiter.isspace()
+        contents = np.frombuffer(self._raw, dtype=np.uint8)
+        block_start = 0
+        while block_start < contents.size:
+            block_end = block_start + self.validation_block_bytes
+            if block_end >= contents.size:
+                block_end = contents.size
             else:
-                if col_count != len(l.strip().split(self.delimiter)):
+                nl = self._raw.find(b"\n", block_end)
+                block_end = contents.size if nl == -1 else nl + 1
+            block = contents[block_start:block_end]
+            line_starts = np.r_[0, np.flatnonzero(block == ord("\n")) + 1]
+            line_starts = line_starts[line_starts < block.size]
+            delim_pos = np.flatnonzero(block == delim_code)
+            counts = np.diff(np.searchsorted(delim_pos, np.r_[line_starts, block.size])) + 1
+            suspect = counts != col_count
+            if strip_delimiter:
+                line_ends = np.r_[line_starts[1:], block.size] - 1
+                suspect |= np.isin(block[line_starts], [ord(c) for c in " \t"])
+                suspect |= np.isin(block[line_ends], [ord(c) for c in " \t"])
+            for ix in np.flatnonzero(suspect):
+                line_end = line_starts[ix+1] if ix+1 < line_starts.size else block.size
+                line = bytes(block[line_starts[ix]:line_end]).decode()
+                if col_count != self._line_count(line, self.delimiter):
                     return -1
+            block_start = block_end
         return col_count
 
+    # number of values spread across a date-time column on which an inferred format is verified against dateutil
+    date_sample_size = 25
+    # formats tried for time-only columns for which pandas can't infer a format
+    time_only_formats = ["%H:%M:%S.%f", "%H:%M:%S", "%H:%M"]
+
+    def _convert_dates_vectorized(self, column: List[str], t0: datetime) -> Optional[np.ndarray]:
+        """
+        Infers the date-time format(s) of a column from a sample of its entries and converts all entries matching a
+        format in one vectorized step. Each format is verified on the sample against the per-element dateutil conversion
+        :param column: The file column
+        :param t0: The reference time
+        :return: Seconds elapsed since t0 with NaN for entries that don't match any format or None if no format could
+            be inferred and verified
+        """
+        import pandas as pd
+        try:
+            from pandas.tseries.api import guess_datetime_format
+        except ImportError:
+            from pandas._libs.tslibs.parsing import guess_datetime_format
+        values = pd.Series(column, dtype=object).str.strip()
+        non_empty = (values != "").to_numpy()
+        if not np.any(non_empty):
+            return None
+        ne_ix = np.flatnonzero(non_empty)
+        sample_ix = ne_ix[np.unique(np.linspace(0, ne_ix.size - 1, self.date_sample_size).astype(int))]
+        # dateutil results on the sample are the reference for all candidate formats
+        reference = np.full(sample_ix.size, np.nan)
+        formats = []
+        for i, ix in enumerate(sample_ix):
+            try:
+                reference[i] = (dateparser.parse(values[ix]) - t0).total_seconds()
+            except (ValueError, OverflowError):
+                continue
+            except TypeError:
+                # time-zone aware entries - not supported
+                return None
+            fmt = guess_datetime_format(values[ix])
+            if fmt is not None and fmt not in formats:
+                formats.append(fmt)
+        if len(formats) == 0:
+            formats = self.time_only_formats
+        seconds = np.full(len(column), np.nan)
+        for fmt in formats:
+            to_convert = np.logical_and(non_empty, np.isnan(seconds))
+            if not np.any(to_convert):
+                break
+            parsed = pd.to_datetime(values[to_convert], format=fmt, errors="coerce")
+            if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+                return None
+            time_ns = parsed.to_numpy(dtype="datetime64[ns]")
+            # dateutil truncates to microseconds
+            delta_us = np.floor_divide((time_ns - np.datetime64(t0, "ns")).astype(np.int64), 1000)
+            if not any(d in fmt for d in ("%Y", "%y", "%m", "%d", "%b", "%B", "%j")):
+                # without date information dateutil uses the current day while pandas uses 1900-01-01
+                today = datetime.combine(date.today(), time())
+                delta_us += (today - datetime(1900, 1, 1)) // np.timedelta64(1, "us").item()
+            converted = np.full(len(column), np.nan)
+            converted[to_convert] = delta_us / 1e6
+            converted[np.flatnonzero(to_convert)[np.isnat(time_ns)]] = np.nan
+            # only accept the format if it reproduces dateutil on all sample entries it matches
+            matched = np.logical_not(np.isnan(converted[sample_ix]))
+            if not np.any(matched) or not np.array_equal(converted[sample_ix][matched], reference[matched]):
+                continue
+            seconds[np.logical_not(np.isnan(converted))] = converted[np.logical_not(np.isnan(converted))]
+        if np.all(np.isnan(seconds)):
+            return None
+        return seconds
+
     def _load_date_column(self, column: List[str], col_name: int) -> np.ndarray:
         """
         Loads a column with encoded dates/times and encodes them as seconds elapsed since the millennium start such that
@@ -135,7 +413,16 @@ class CSVParser(FileParser):
         # The better way would clearly be to find the minimum of predictor and response start times
         # and use that value but that can only happen after file matching
         t0 = datetime.combine(date(2000, 1, 1), time())
-        for i, elem in enumerate(column):
+        # convert all entries that match the format of the column at once, only remaining entries (heterogeneous
+        # columns) are parsed one by one
+        converted = self._convert_dates_vectorized(column, t0)
+        if converted is None:
+            remaining = range(len(column))
+        else:
+            retval[:, 0] = converted
+            remaining = np.flatnonzero(np.isnan(converted))
+        for i in remaining:
+            elem = column[i]
             # we skip empty cells
             if elem.strip() == "":
                 continue
@@ -148,41 +435,6 @@ class CSVParser(FileParser):
             retval[i] = t_seconds
         return retval
 
-    @staticmethod
-    def _load_string_column(column: List[str], col_name: int) -> np.ndarray:
-        """
-        Loads a column with text and interprets unique strings as categories
-        :param column: The file column
-        :param col_name: The name of the column
-        :return: The categories encoded as integers
-        """
-        retval = np.full((len(column), 1), np.nan)
-        categ_dict = {}
-        categ_count = 0
-        for i, elem in enumerate(column):
-            # we skip empty cells
-            if elem.strip() == "":
-                continue
-            valid = False
-            try:
-                float(elem)
-            except ValueError:
-                valid = True
-            if not valid:
-                raise ValueError(f"Column {col_name} was identified as containing text but contains at least one number."
-                                 f"Mixed content is not supported. This can be caused by ambiguous encoding or "
-                                 f"misidentification of a malformed header.")
-            if elem not in categ_dict:
-                categ_dict[elem] = categ_count
-                categ_count += 1
-            retval[i] = categ_dict[elem]
-        if categ_count > 2:
-            print("###", flush=True)
-            print(f"Column {col_name} was interpreted as categorical data with {categ_count} categories. Processing will"
-                  f" continue, however, categorical inputs are not properly supported.", flush=True)
-            print("###", flush=True)
-        return retval
-
     @staticmethod
     def _load_numerical_column(column: List[str], col_name: int) -> np.ndarray:
         """
@@ -206,28 +458,82 @@ class CSVParser(FileParser):
             retval[i] = value
         return retval
 
-    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+    def _column_kinds(self, skip: int) -> List[str]:
         """
-        Loads the data from the file
-        :return:
+        Determines for each column whether it contains date-times, text or numbers based on its first data row
+        :param skip: The number of header rows
+        :return: List of "date", "text" or "number" for each column
         """
-        # We allow at most one header row - so we simply ask csv sniffer if there is a header or not
-        sniffer = csv.Sniffer()
-        with open(self.filename) as f:
-            has_header = sniffer.has_header(f.read(-1))
+        first_row = self._sample.split("\n")[skip].strip().split(self.delimiter)
+        kinds = []
+        for elem in first_row:
+            if self._parse_datetime(elem) is not None:
+                kinds.append("date")
+                continue
+            try:
+                float(elem)
+            except ValueError:
+                kinds.append("text")
+                continue
+            kinds.append("number")
+        return kinds
 
-        # Load as text-file, processing line-by-line
-        with open(self.filename, "r") as f:
-            lines = f.readlines()
+    def _load_data_fast(self, skip: int) -> np.ndarray:
+        """
+        Loads all data with C-level parsers. Only date and text columns are converted cell by cell
+        :param skip: The number of header rows
+        :return: The data matrix
+        """
+        kinds = self._column_kinds(skip)
+        if len(kinds) != self.col_count:
+            raise ValueError("First data row does not match the column count")
+        number_cols = [i for i, k in enumerate(kinds) if k == "number"]
+        other_cols = [i for i, k in enumerate(kinds) if k != "number"]
+        numbers = None
+        # the numpy parser is fastest but does not support missing cells and skips blank lines which can only be
+        # present in single column files
+        if len(number_cols) > 0 and self.col_count > 1:
+            try:
+                numbers = np.loadtxt(io.BytesIO(self._raw), delimiter=self.delimiter, skiprows=skip,
+                                     usecols=number_cols, comments=None, quotechar=None, ndmin=2, dtype=np.float64)
+            except ValueError:
+                numbers = None
+        if numbers is not None and len(other_cols) == 0:
+            return numbers
+        import pandas as pd
+        read_cols = other_cols if numbers is not None else list(range(self.col_count))
+        # python's float() accepts these spellings of NaN, treat them as missing in numerical columns
+        nan_values = ["", "nan", "NaN", "NAN", "-nan", "-NaN", "-NAN", "+nan", "+NaN", "+NAN"]
+        # round_trip precision gives the same values as python's float() conversion
+        df = pd.read_csv(io.BytesIO(self._raw), sep=self.delimiter, header=None, skiprows=skip, engine="c",
+                         usecols=read_cols, quoting=csv.QUOTE_NONE, skip_blank_lines=False, keep_default_na=False,
+                         float_precision="round_trip",
+                         na_values={i: nan_values if kinds[i] == "number" else [""] for i in read_cols},
+                         dtype={i: np.float64 if kinds[i] == "number" else str for i in read_cols})
+        data = np.full((df.shape[0], self.col_count), np.nan)
+        if numbers is not None:
+            if numbers.shape[0] != df.shape[0]:
+                raise ValueError("Row counts of parsed columns do not match")
+            data[:, number_cols] = numbers
+        for i in read_cols:
+            if kinds[i] == "number":
+                data[:, i] = df[i].to_numpy(dtype=np.float64)
+                continue
+            column = ["" if pd.isna(elem) else elem for elem in df[i]]
+            if kinds[i] == "date":
+                data[:, i] = self._load_date_column(column, i)[:, 0]
+            else:
+                data[:, i] = self._load_string_column(column, i)[:, 0]
+        return data
 
-        # Determine data header (column names)
-        if has_header:
-            data_header = lines[0].strip().split(self.delimiter)
-            skip = 1  # skip first row when loading data
-        else:
-            # The name of the first column is Time
-            data_header = ["Time"]+[f"{self.prefix}_{i}" for i in range(self.col_count-1)]
-            skip = 0
+    def _load_data_per_cell(self, skip: int) -> np.ndarray:
+        """
+        Loads all data by converting each cell individually which is slow but reports mixed column content
+        :param skip: The number of header rows
+        :return: The data matrix
+        """
+        # Load as text-file, processing line-by-line
+        lines = io.TextIOWrapper(io.BytesIO(self._raw)).readlines()
 
         # assemble all lines that contain data, split by the delimiter
         file_contents = [line.strip().split(self.delimiter) for line in lines[skip:]]
@@ -252,27 +558,609 @@ class CSVParser(FileParser):
                 continue
             data_columns.append(self._load_numerical_column(dc, i))
 
+        return np.hstack(data_columns)
+
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the data from the file
+        :return:
+        """
+        start_time = perf_counter()
+        # We allow at most one header row - so we simply ask csv sniffer if there is a header or not
+        sniffer = csv.Sniffer()
+        has_header = sniffer.has_header(self._sample)
+
+        # Determine data header (column names)
+        if has_header:
+            data_header = self._sample.split("\n")[0].strip().split(self.delimiter)
+            skip = 1  # skip first row when loading data
+        else:
+            data_header = self._default_header(self.col_count)
+            skip = 0
 
-        data = np.hstack(data_columns)
+        try:
+            data = self._load_data_fast(skip)
+        except (ValueError, IndexError):
+            # unusual or mixed cell contents - the per-cell parser handles all cases the fast parser can't and
+            # reports offending columns
+            data = self._load_data_per_cell(skip)
 
-        # Make sure that the first column can be interpreted as time
-        if any(np.diff(data[:, 0]) <= 0):
-            raise ValueError("The first column in each datafile should be time. However values aren't strictly increasing,"
-                             " which means that data cannot be assigned to unique timepoints.")
+        _report_throughput(self.filename, start_time)
 
-        # remove columns that contain all NaN - these can occur when cell contents in CSV files
-        # are deleted without deleting the column itself
-        full_nan = np.sum(np.isnan(data), axis=0) == data.shape[0]
-        data_header = [dh for i, dh in enumerate(data_header) if not full_nan[i]]
-        data = data[:, np.logical_not(full_nan)]
+        data, data_header = self._clean_data(data, data_header)
 
-        # remove rows that contain at leat one NaN value
-        has_nan = np.sum(np.isnan(data), axis=1) > 0
-        if np.sum(has_nan) > 0:
-            print("###", flush=True)
-            print(f"Removed {np.sum(has_nan)} rows from {self.filename} since they contained at least one NaN or a missing value.", flush=True)
-            print("Note, deleting rows from within Microsoft Excel will sometimes remove data but leave ghost rows in the file. These will trigger this warning as well.")
-            print("###", flush=True)
-        data = data[np.logical_not(has_nan)]
+        return data, has_header, data_header
+
+    def data_extent(self) -> Tuple[int, int, float, float]:
+        """
+        Determines the size and time span of the data from the number of lines and the first and last line
+        :return: See FileParser.data_extent
+        """
+        contents = self._raw.rstrip(b"\r\n")
+        n_rows = contents.count(b"\n") + 1
+        lines = self._sample.split("\n")
+        if csv.Sniffer().has_header(self._sample):
+            n_rows -= 1
+            lines = lines[1:]
+        if n_rows < 1 or len(lines) == 0:
+            return super().data_extent()
+        times = []
+        for line in [lines[0], contents[contents.rfind(b"\n") + 1:].decode()]:
+            cell = line.strip().split(self.delimiter)[0].strip().strip('"')
+            try:
+                times.append(float(cell))
+            except ValueError:
+                dt = self._parse_datetime(cell)
+                if dt is None:
+                    return super().data_extent()
+                times.append(dt.timestamp())
+        return n_rows, self.col_count, times[0], times[1]
+
+
+class NPYParser(FileParser):
+    """
+    Parser for numpy .npy files. Files either contain a 2D array with time in the first column or a structured array
+    whose field names are used as column names. Files are memory-mapped such that only one copy of the data is created
+    """
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the data from the file
+        :return:
+        """
+        start_time = perf_counter()
+        arr = np.load(self.filename, mmap_mode="r")
+        if arr.dtype.names is not None:
+            data_header = list(arr.dtype.names)
+            data = self._columns_to_matrix([arr[n] for n in data_header])
+            has_header = True
+        else:
+            if arr.ndim != 2:
+                raise IOError(f"{self.filename} has to contain a 2D array with time in the first column not an array "
+                              f"with {arr.ndim} dimensions.")
+            # for floating point data this keeps the memory map, other types are converted in one pass
+            data = np.asarray(arr, dtype=np.float64)
+            data_header = self._default_header(data.shape[1])
+            has_header = False
+        _report_throughput(self.filename, start_time)
+        data, data_header = self._clean_data(data, data_header)
+        return data, has_header, data_header
+
+    def data_extent(self) -> Tuple[int, int, float, float]:
+        """
+        Determines the size and time span of the data from the memory-mapped array
+        :return: See FileParser.data_extent
+        """
+        arr = np.load(self.filename, mmap_mode="r")
+        if arr.dtype.names is not None and arr.ndim == 1 and arr.shape[0] > 0:
+            times = self._column_to_float(np.asarray(arr[arr.dtype.names[0]][[0, -1]]), 0)
+            return arr.shape[0], len(arr.dtype.names), float(times[0]), float(times[1])
+        if arr.dtype.names is None and arr.ndim == 2 and arr.shape[0] > 0:
+            return arr.shape[0], arr.shape[1], float(arr[0, 0]), float(arr[-1, 0])
+        return super().data_extent()
+
+
+class NPZParser(FileParser):
+    """
+    Parser for numpy .npz archives. Archives either contain a single 2D array with time in the first column (column
+    names can be provided in an additional 1D string array called "names") or one 1D array per column in which case
+    the array names are used as column names and time has to be the first array
+    """
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the data from the file
+        :return:
+        """
+        start_time = perf_counter()
+        with np.load(self.filename, allow_pickle=False) as archive:
+            keys = [k for k in archive.files if k != "names"]
+            arrays = [archive[k] for k in keys]
+            names = [str(n) for n in archive["names"]] if "names" in archive.files else None
+        if len(arrays) == 1 and arrays[0].ndim == 2:
+            data = np.asarray(arrays[0], dtype=np.float64)
+            has_header = names is not None
+            data_header = names if has_header else self._default_header(data.shape[1])
+        else:
+            data = self._columns_to_matrix(arrays)
+            has_header = True
+            data_header = keys
+        if len(data_header) != data.shape[1]:
+            raise IOError(f"{self.filename} provides {len(data_header)} column names for {data.shape[1]} columns.")
+        _report_throughput(self.filename, start_time)
+        data, data_header = self._clean_data(data, data_header)
+        return data, has_header, data_header
+
+
+class HDF5Parser(FileParser):
+    """
+    Parser for HDF5 files. Files either contain a single 2D dataset with time in the first column (column names can
+    be provided in a "names" attribute of the dataset) or one 1D dataset per column at the root of the file. In the
+    latter case the dataset names are used as column names, a dataset called "Time" or "time" is used as first column
+    and the remaining columns are ordered by creation if the file tracks creation order and by name otherwise
+    """
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the data from the file
+        :return:
+        """
+        import h5py
+        start_time = perf_counter()
+        with h5py.File(self.filename, "r") as f:
+            datasets = {k: v for k, v in f.items() if isinstance(v, h5py.Dataset)}
+            matrices = [k for k, v in datasets.items() if v.ndim == 2]
+            if len(matrices) == 1:
+                dset = datasets[matrices[0]]
+                data = np.empty(dset.shape, dtype=np.float64)
+                dset.read_direct(data)
+                has_header = "names" in dset.attrs
+                if has_header:
+                    data_header = [n.decode() if isinstance(n, bytes) else str(n) for n in dset.attrs["names"]]
+                else:
+                    data_header = self._default_header(data.shape[1])
+            elif len(matrices) == 0:
+                data_header = sorted([k for k, v in datasets.items() if v.ndim == 1], key=lambda k: k.lower() != "time")
+                if len(data_header) == 0:
+                    raise IOError(f"{self.filename} does not contain any datasets at its root.")
+                columns = []
+                for k in data_header:
+                    dset = datasets[k]
+                    if dset.dtype.kind in "iufb":
+                        # read numerical columns directly as floating point numbers
+                        col = np.empty(dset.shape, dtype=np.float64)
+                        dset.read_direct(col)
+                    else:
+                        col = dset[()]
+                    columns.append(col)
+                data = self._columns_to_matrix(columns)
+                has_header = True
+            else:
+                raise IOError(f"{self.filename} contains more than one 2D dataset ({matrices}). It is unclear which "
+                              f"one contains the data.")
+        if len(data_header) != data.shape[1]:
+            raise IOError(f"{self.filename} provides {len(data_header)} column names for {data.shape[1]} columns.")
+        _report_throughput(self.filename, start_time)
+        data, data_header = self._clean_data(data, data_header)
+        return data, has_header, data_header
+
+    def data_extent(self) -> Tuple[int, int, float, float]:
+        """
+        Determines the size and time span of the data from the dataset shapes and the first and last time
+        :return: See FileParser.data_extent
+        """
+        import h5py
+        with h5py.File(self.filename, "r") as f:
+            datasets = {k: v for k, v in f.items() if isinstance(v, h5py.Dataset)}
+            matrices = [k for k, v in datasets.items() if v.ndim == 2]
+            columns = sorted([k for k, v in datasets.items() if v.ndim == 1], key=lambda k: k.lower() != "time")
+            if len(matrices) == 1 and datasets[matrices[0]].shape[0] > 0:
+                dset = datasets[matrices[0]]
+                return dset.shape[0], dset.shape[1], float(dset[0, 0]), float(dset[dset.shape[0] - 1, 0])
+            if len(matrices) == 0 and len(columns) > 0 and datasets[columns[0]].shape[0] > 0:
+                dset = datasets[columns[0]]
+                times = self._column_to_float(np.array([dset[0], dset[dset.shape[0] - 1]]), 0)
+                return dset.shape[0], len(columns), float(times[0]), float(times[1])
+        return super().data_extent()
+
+
+class ParquetParser(FileParser):
+    """
+    Parser for Apache Parquet files with time in the first column. Requires the optional pyarrow package
+    """
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the data from the file
+        :return:
+        """
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading parquet files requires pyarrow. Install it with 'pip install pyarrow'.")
+        start_time = perf_counter()
+        table = pq.read_table(self.filename)
+        data_header = [str(n) for n in table.column_names]
+        # missing values become NaN (numbers), NaT (timestamps) or None (text)
+        data = self._columns_to_matrix([c.to_numpy(zero_copy_only=False) for c in table.columns])
+        _report_throughput(self.filename, start_time)
+        data, data_header = self._clean_data(data, data_header)
+        return data, True, data_header
+
+    def data_extent(self) -> Tuple[int, int, float, float]:
+        """
+        Determines the size and time span of the data from the file metadata and the time column
+        :return: See FileParser.data_extent
+        """
+        import pyarrow.parquet as pq
+        pfile = pq.ParquetFile(self.filename)
+        names = pfile.schema_arrow.names
+        if pfile.metadata.num_rows == 0:
+            return super().data_extent()
+        times = pfile.read(columns=[names[0]]).column(0).to_numpy(zero_copy_only=False)
+        times = self._column_to_float(times[[0, -1]], 0)
+        return pfile.metadata.num_rows, len(names), float(times[0]), float(times[1])
+
+
+class NWBParser(FileParser):
+    """
+    Parser for local NWB (neurodata without borders) files which are read with h5py. Time series are identified by
+    their neurodata_type attribute. Responses (prefix "R") are by default all RoiResponseSeries while predictors (any
+    other prefix) are by default all other time series with at most two dimensions excluding image, electrical and
+    spike series. Series can instead be selected by name or by path within the file. Series sampled at different times
+    are interpolated to the timestamps of the most finely sampled series. Series are read chunk by chunk such that only
+    the output matrix is held in memory
+    """
+    response_series = None  # names or paths of series to use as responses - if None all RoiResponseSeries are used
+    predictor_series = None  # names or paths of series to use as predictors - if None all other time series are used
+    response_types = {"RoiResponseSeries"}
+    excluded_types = {"RoiResponseSeries", "ImageSeries", "ImageMaskSeries", "OpticalSeries", "TwoPhotonSeries",
+                      "OnePhotonSeries", "ElectricalSeries", "SpikeEventSeries", "IndexSeries"}
+    chunk_rows = 1 << 16  # number of timepoints read at once
 
-        return data, has_header, data_header
\ No newline at end of file
+    def __init__(self, file_path: str, prefix: str="col", series: Optional[List[str]]=None):
+        """
+        Creates a new NWB parser object
+        :param file_path: The path to the file to parse
+        :param prefix: "R" for responses, otherwise data is treated as predictors
+        :param series: Names or paths of the series to load overriding the class defaults
+        """
+        super().__init__(file_path, prefix)
+        if series is None:
+            series = self.response_series if prefix == "R" else self.predictor_series
+        self.series = series
+
+    @staticmethod
+    def _find_series(f) -> Dict[str, Any]:
+        """
+        Finds all time series groups within the file
+        :param f: The open h5py file
+        :return: Dictionary of series path to its group
+        """
+        import h5py
+        found = {}
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Group) and "neurodata_type" in obj.attrs and "data" in obj:
+                if "timestamps" in obj or "starting_time" in obj:
+                    found[name] = obj
+
+        f.visititems(visit)
+        return found
+
+    def _select_series(self, found: Dict[str, Any]) -> List[str]:
+        """
+        Selects the series to load
+        :param found: Dictionary of series path to group of all series in the file
+        :return: List of selected series paths
+        """
+        if self.series is not None:
+            selected = []
+            for s in self.series:
+                matches = [p for p in found if p == s.strip("/") or p.split("/")[-1] == s]
+                if len(matches) == 0:
+                    raise IOError(f"{self.filename} does not contain a series {s}. Available series: {list(found)}")
+                if len(matches) > 1:
+                    raise IOError(f"Series name {s} is ambiguous in {self.filename}, use one of {matches} instead.")
+                selected.append(matches[0])
+            return selected
+        selected = []
+        for p, g in found.items():
+            nd_type = g.attrs["neurodata_type"]
+            nd_type = nd_type.decode() if isinstance(nd_type, bytes) else str(nd_type)
+            if self.prefix == "R":
+                if nd_type in self.response_types:
+                    selected.append(p)
+            elif nd_type not in self.excluded_types and g["data"].ndim <= 2:
+                selected.append(p)
+        if len(selected) == 0:
+            raise IOError(f"{self.filename} does not contain any {'response' if self.prefix == 'R' else 'predictor'} "
+                          f"series. Available series: {list(found)}")
+        return sorted(selected)
+
+    @staticmethod
+    def _series_times(group) -> np.ndarray:
+        """
+        Gets the timestamps of a series either from its timestamps or from its starting time and sampling rate
+        :param group: The series group
+        :return: The timestamps in seconds
+        """
+        n_times = group["data"].shape[0]
+        if "timestamps" in group:
+            times = np.empty(group["timestamps"].shape, dtype=np.float64)
+            group["timestamps"].read_direct(times)
+            return times
+        starting_time = group["starting_time"]
+        return starting_time[()] + np.arange(n_times) / starting_time.attrs["rate"]
+
+    def _read_series(self, group, times: np.ndarray, target_times: np.ndarray, out: np.ndarray) -> None:
+        """
+        Reads a series chunk by chunk into the output matrix, interpolating to the target times if necessary
+        :param group: The series group
+        :param times: The timestamps of the series
+        :param target_times: The timestamps of the output matrix
+        :param out: The output columns, NaN where target times are outside of the series
+        """
+        dset = group["data"]
+        conversion = float(dset.attrs.get("conversion", 1.0))
+        offset = float(dset.attrs.get("offset", 0.0))
+        same_times = times.size == target_times.size and np.array_equal(times, target_times)
+        n_rows = min(dset.shape[0], times.size)
+        out[:] = np.nan
+        for start in range(0, n_rows, self.chunk_rows):
+            # overlap chunks by one row so that target times between chunks can be interpolated
+            stop = min(start + self.chunk_rows + 1, n_rows)
+            block = np.asarray(dset[start:stop], dtype=np.float64).reshape(stop - start, -1) * conversion + offset
+            if same_times:
+                out[start:stop] = block
+                continue
+            first = np.searchsorted(target_times, times[start], side="left")
+            last = np.searchsorted(target_times, times[stop - 1], side="right")
+            for i in range(block.shape[1]):
+                out[first:last, i] = np.interp(target_times[first:last], times[start:stop], block[:, i])
+
+    def _layout(self, f) -> Tuple[Dict[str, Any], List[str], List[np.ndarray], np.ndarray, List[int]]:
+        """
+        Determines the series to load and the timestamps and columns of the data matrix
+        :param f: The open h5py file
+        :return:
+            [0]: Dictionary of series path to its group of all series in the file
+            [1]: The selected series paths
+            [2]: The timestamps of each selected series
+            [3]: The timestamps of the data matrix
+            [4]: The number of columns of each selected series
+        """
+        found = self._find_series(f)
+        selected = self._select_series(found)
+        times = [self._series_times(found[s]) for s in selected]
+        # use the timestamps of the most finely sampled series as time of the data matrix
+        finest = int(np.argmin([np.median(np.diff(t)) if t.size > 1 else np.inf for t in times]))
+        n_cols = [int(np.prod(found[s]["data"].shape[1:])) for s in selected]
+        return found, selected, times, times[finest], n_cols
+
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the selected series from the file
+        :return:
+        """
+        import h5py
+        start_time = perf_counter()
+        with h5py.File(self.filename, "r") as f:
+            found, selected, times, target_times, n_cols = self._layout(f)
+            data = np.empty((target_times.size, 1 + sum(n_cols)))
+            data[:, 0] = target_times
+            data_header = ["Time"]
+            offset = 1
+            n_bytes = 0
+            for s, t, nc in zip(selected, times, n_cols):
+                self._read_series(found[s], t, target_times, data[:, offset:offset + nc])
+                offset += nc
+                name = s.split("/")[-1]
+                data_header += [name] if nc == 1 else [f"{name}_{i}" for i in range(nc)]
+                n_bytes += found[s]["data"].size * found[s]["data"].dtype.itemsize
+        elapsed = perf_counter() - start_time
+        print(f"Loaded {len(selected)} series from {path.split(self.filename)[1]} ({n_bytes / 1e6:.1f} MB) "
+              f"in {elapsed:.2f} s", flush=True)
+        data, data_header = self._clean_data(data, data_header)
+        return data, True, data_header
+
+    def data_extent(self) -> Tuple[int, int, float, float]:
+        """
+        Determines the size and time span of the data from the series shapes and timestamps
+        :return: See FileParser.data_extent
+        """
+        import h5py
+        with h5py.File(self.filename, "r") as f:
+            _, _, _, target_times, n_cols = self._layout(f)
+        if target_times.size == 0:
+            return super().data_extent()
+        return target_times.size, 1 + sum(n_cols), float(target_times[0]), float(target_times[-1])
+
+
+class Suite2pParser(FileParser):
+    """
+    Parser for suite2p output directories, usable directly as response source. The directory is either a single plane
+    directory or a suite2p directory with one subdirectory per plane in which case all planes are combined into one
+    response matrix. The "combined" directory that suite2p creates for multi-plane recordings is ignored since it
+    duplicates the plane data. Activity arrays are memory-mapped and only objects classified as cells are read
+    """
+    th_iscell = 0.5  # threshold on the suite2p classifier probability to consider an object a cell
+    deconvolved = False  # if True use the deconvolved activity (spks.npy) instead of fluorescence (F.npy)
+    frame_time = None  # time between frames in the unit of the predictors - if None derived from the suite2p ops
+    cell_block_size = 512  # number of cells transposed into the data matrix at once
+
+    def __init__(self, file_path: str, prefix: str="col", th_iscell: Optional[float]=None,
+                 deconvolved: Optional[bool]=None, frame_time: Optional[float]=None):
+        """
+        Creates a new suite2p parser object
+        :param file_path: The path to the suite2p output or plane directory
+        :param prefix: Unused since suite2p objects are labelled by plane and ROI index
+        :param th_iscell: Classifier threshold overriding the class default
+        :param deconvolved: Whether to use deconvolved activity overriding the class default
+        :param frame_time: The time between frames overriding the class default
+        """
+        if not path.isdir(file_path):
+            raise FileNotFoundError(f"Suite2p directory {file_path} not found")
+        self.filename = file_path
+        self.prefix = prefix
+        self.plane_dirs = suite2p_plane_dirs(file_path)
+        if len(self.plane_dirs) == 0:
+            raise ValueError(f"Directory {file_path} does not seem to be valid suite2p output. No directories with "
+                             f"output files found.")
+        if th_iscell is not None:
+            self.th_iscell = th_iscell
+        if deconvolved is not None:
+            self.deconvolved = deconvolved
+        if frame_time is not None:
+            self.frame_time = frame_time
+
+    def _plane_frame_time(self, plane_dir: str) -> float:
+        """
+        Determines the time between frames of one plane
+        :param plane_dir: The plane directory
+        :return: The frame time
+        """
+        if self.frame_time is not None:
+            return self.frame_time
+        ops = np.load(path.join(plane_dir, "ops.npy"), allow_pickle=True)[()]
+        return 1 / ops["fs"]  # this is a frame-rate in Hz!
+
+    def _planes(self) -> List[Tuple[str, np.ndarray, np.ndarray, float]]:
+        """
+        Opens the activity of all planes
+        :return: For each plane its directory, the memory-mapped activity, the indices of cells and the frame time
+        """
+        activity_file = "spks.npy" if self.deconvolved else "F.npy"
+        planes = []
+        for plane_dir in self.plane_dirs:
+            # suite2p stores objects along axis 0 and time along axis 1
+            activity = np.load(path.join(plane_dir, activity_file), mmap_mode="r")
+            cells = np.flatnonzero(np.load(path.join(plane_dir, "iscell.npy"))[:, 1] > self.th_iscell)
+            planes.append((plane_dir, activity, cells, self._plane_frame_time(plane_dir)))
+        return planes
+
+    def load_data(self) -> Tuple[np.ndarray, bool, List]:
+        """
+        Loads the data of all planes
+        :return:
+        """
+        start_time = perf_counter()
+        planes = self._planes()
+        # planes of a volume can differ by one frame when acquisition stopped mid-volume
+        n_frames = min(p[1].shape[1] for p in planes)
+        frame_times = [p[3] for p in planes]
+        if not np.allclose(frame_times, frame_times[0]):
+            raise ValueError(f"Planes of {self.filename} have different frame rates and can't be combined.")
+        data = np.empty((n_frames, 1 + sum(p[2].size for p in planes)))
+        data[:, 0] = np.arange(n_frames) * frame_times[0]
+        data_header = ["Time"]
+        n_bytes = 0
+        offset = 1
+        for plane_dir, activity, cells, ft in planes:
+            plane_name = path.basename(path.normpath(plane_dir)) if len(planes) > 1 else None
+            for b in range(0, cells.size, self.cell_block_size):
+                block = cells[b:b + self.cell_block_size]
+                data[:, offset + b:offset + b + block.size] = activity[block, :n_frames].T
+            offset += cells.size
+            n_bytes += cells.size * n_frames * activity.itemsize
+            data_header += [f"ROI {c}" if plane_name is None else f"{plane_name} ROI {c}" for c in cells]
+        elapsed = perf_counter() - start_time
+        print(f"Loaded {data.shape[1] - 1} cells from {len(planes)} plane(s) of {self.filename} "
+              f"({n_bytes / 1e6:.1f} MB) in {elapsed:.2f} s", flush=True)
+        data, data_header = self._clean_data(data, data_header)
+        return data, True, data_header
+
+    def data_extent(self) -> Tuple[int, int, float, float]:
+        """
+        Determines the size and time span of the data from the shapes of the activity arrays
+        :return: See FileParser.data_extent
+        """
+        planes = self._planes()
+        n_frames = min(p[1].shape[1] for p in planes)
+        return n_frames, 1 + sum(p[2].size for p in planes), 0.0, (n_frames - 1) * planes[0][3]
+
+
+def suite2p_plane_dirs(dir_path: str) -> List[str]:
+    """
+    Finds the plane directories of suite2p output
+    :param dir_path: Path to a suite2p output directory or a single plane directory
+    :return: Sorted list of plane directories, empty if the directory does not contain suite2p output
+    """
+    if not path.isdir(dir_path):
+        return []
+    if path.exists(path.join(dir_path, "ops.npy")) and path.exists(path.join(dir_path, "iscell.npy")):
+        return [dir_path]
+    # the combined directory duplicates the data of all planes
+    subdirs = [path.join(dir_path, d) for d in sorted(os.listdir(dir_path)) if d != "combined" and d[0] != '.']
+    return [d for d in subdirs if path.isdir(d) and path.exists(path.join(d, "ops.npy"))
+            and path.exists(path.join(d, "iscell.npy"))]
+
+
+def is_suite2p_dir(dir_path: str) -> bool:
+    """
+    Determines whether a path is a suite2p output or plane directory
+    :param dir_path: The path to check
+    :return: True if the path contains suite2p output
+    """
+    return len(suite2p_plane_dirs(dir_path)) > 0
+
+
+# class level parser options that can be set by users, e.g. through command line arguments
+parser_options = {
+    Suite2pParser: ["th_iscell", "deconvolved", "frame_time"],
+    NWBParser: ["response_series", "predictor_series"]
+}
+
+
+def get_parser_options() -> Dict[str, Dict[str, Any]]:
+    """
+    Collects the current class level parser options, e.g. to transfer them to worker processes
+    :return: Dictionary of parser class name to dictionary of option values
+    """
+    return {cls.__name__: {a: getattr(cls, a) for a in attributes} for cls, attributes in parser_options.items()}
+
+
+def set_parser_options(options: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Sets class level parser options
+    :param options: Dictionary of parser class name to dictionary of option values as returned by get_parser_options
+    """
+    for cls in parser_options:
+        for a, v in options.get(cls.__name__, {}).items():
+            setattr(cls, a, v)
+
+
+# file extensions and the parsers used to read them - files with other extensions are read as CSV files
+parsers = {
+    ".csv": CSVParser,
+    ".tsv": CSVParser,
+    ".txt": CSVParser,
+    ".npy": NPYParser,
+    ".npz": NPZParser,
+    ".h5": HDF5Parser,
+    ".hdf5": HDF5Parser,
+    ".parquet": ParquetParser,
+    ".pq": ParquetParser,
+    ".nwb": NWBParser
+}
+
+
+def get_parser(file_path: str, prefix: str="col") -> FileParser:
+    """
+    Creates the parser appropriate for a file based on its extension
+    :param file_path: The path to the file to parse or to a suite2p output directory
+    :param prefix: If no column names are provided in the file this prefix will be used to label columns
+    :return: The file parser
+    """
+    if path.isdir(file_path) and is_suite2p_dir(file_path):
+        return Suite2pParser(file_path, prefix)
+    extension = path.splitext(file_path)[1].lower()
+    return parsers.get(extension, CSVParser)(file_path, prefix)
+
+
+def _report_throughput(file_path: str, start_time: float) -> None:
+    """
+    Prints how fast a file was parsed
+    :param file_path: The path of the parsed file
+    :param start_time: The perf_counter value at the start of parsing
+    """
+    elapsed = perf_counter() - start_time
+    size_mb = path.getsize(file_path) / 1e6
+    print(f"Parsed {path.split(file_path)[1]} ({size_mb:.1f} MB) in {elapsed:.2f} s "
+          f"({size_mb / max(elapsed, 1e-9):.1f} MB/s)", flush=True)
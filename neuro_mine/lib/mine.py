@@ -3,13 +3,14 @@ Module for easy running of MINE on user data
 """
 import h5py
 import numpy as np
-from typing import List, Optional, Union, Dict, Tuple
+from typing import List, Optional, Union, Dict, Tuple, TYPE_CHECKING
 from neuro_mine.lib import utilities
-from neuro_mine.lib import model
-from neuro_mine.lib.taylorDecomp import taylor_decompose, d2ca_dr2, complexity_scores, data_mean_prediction
 from dataclasses import dataclass
 import warnings
-from sklearn.metrics import roc_auc_score
+# NOTE: model, taylorDecomp (tensorflow) and sklearn are imported within Mine methods such that analysis results can be
+# loaded without the cost of importing these modules
+if TYPE_CHECKING:
+    from neuro_mine.lib import model
 
 @dataclass(frozen=True)
 class BaseData:
@@ -271,6 +272,12 @@ class Mine:
     Class that collects intended model data and provides
     analysis function to be run on user-data
     """
+    # If set to true, initialized models are kept in a class-level cache and reused by all Mine objects with matching
+    # model structure. This avoids re-creating models and re-tracing their compiled graphs in long-running processes
+    # that analyze many recordings in turn (see neuromine_worker.py)
+    cache_models = False
+    _model_cache: Dict[Tuple, Tuple["model.ActivityPredictor", List[np.ndarray]]] = {}
+
     def __init__(self, train_fraction: float, model_history: int, score_cut: float, compute_taylor: bool,
                  return_jacobians: bool, taylor_look_ahead: int, taylor_pred_every: int, fit_spikes: bool):
         """
@@ -298,12 +305,21 @@ class Mine:
         # set following to true to return hessians -
         # Note memory requirements of (n_sample x (n_timepointsxn_predictors)^2) sized array
         self.return_hessians = False
+        # number of timepoints for which hessians are computed at once during taylor expansion - memory of this step
+        # scales with taylor_chunk_size x (n_timepoints x n_predictors)^2
+        self.taylor_chunk_size = 64
+        # set the following to true to form model inputs of each training batch on the fly instead of holding all
+        # (n_timepoints x model_history x n_predictors) training inputs in memory
+        self.stream_training_data = False
         # set the following to a hdf5 file our group object to store model-weights in subgroups labeled
         # according to "cell_{cell_index}_weights". These model-weights can be loaded into a list compatible
         # with tensorflow.keras.model.set_weights() using the utilities.modelweights_from_hdf5 function
         # NOTE: Before setting the weights, the model has to be initialized to the appropriate model structure
         # by evaluation on an appropriately structured test input
         self.model_weight_store: Union[None, h5py.Group, h5py.File] = None
+        # set the following to a hdf5 file or group object to store the weights of the stacked models that jointly fit
+        # each response and its permuted controls (see analyze_data_with_shuffles) in the same layout
+        self.shuffle_weight_store: Union[None, h5py.Group, h5py.File] = None
         self.n_epochs = 100  # sensible default
         self.taylor_look_ahead = taylor_look_ahead
         self.taylor_pred_every = taylor_pred_every
@@ -353,14 +369,40 @@ class Mine:
         """""
         Generates and initializes model
         """""
+        from neuro_mine.lib import model
+        cache_key = (self.model_history, self.fit_spikes, n_predictors, self.learning_rate, self.l2_penalty)
+        if Mine.cache_models and cache_key in Mine._model_cache:
+            m, init_weights = Mine._model_cache[cache_key]
+            m.set_weights(init_weights)
+            return m, init_weights
         m = model.get_standard_model(self.model_history, self.fit_spikes, learning_rate=self.learning_rate,
                                      l2_penalty=self.l2_penalty)
         # the following is required to init variables at desired shape
         m(np.random.randn(1, self.model_history, n_predictors).astype(np.float32))
         # save untrained weights to reinitialize model without having to recreate the class which somehow leaks memory
         init_weights = m.get_weights()
+        if Mine.cache_models:
+            Mine._model_cache[cache_key] = (m, init_weights)
         return m, init_weights
 
+    def _input_mean(self, tset) -> np.ndarray:
+        """
+        Computes the mean model input across the training data, the point at which derivatives are computed
+        :param tset: The training dataset
+        :return: 1 x model_history x n_predictors mean input
+        """
+        if not self.stream_training_data:
+            all_inputs = []
+            for inp, outp in tset:
+                all_inputs.append(inp.numpy())
+            return np.mean(np.vstack(all_inputs), 0, keepdims=True)
+        # accumulate across batches to avoid holding all training inputs in memory
+        input_sum, n_inputs = 0, 0
+        for inp, outp in tset:
+            input_sum = input_sum + np.sum(inp.numpy(), 0, keepdims=True, dtype=np.float64)
+            n_inputs += inp.shape[0]
+        return (input_sum / n_inputs).astype(np.float32)
+
     def _gen_epoch_steps(self) -> List[int]:
         """
         Generate logarithmic training scale up to the requested maximum
@@ -403,6 +445,37 @@ class Mine:
 
     def analyze_episodic(self, pred_data: List[List[np.ndarray]],
                          response_data: List[np.ndarray]) -> Union[MineSpikingData, MineData]:
+        """
+        Process given episodic data with MINE
+        :param pred_data: For each episode the predictor data as a list of n_timepoints long vectors
+        :param response_data: For each episode the n_responses x n_timepoints matrix of responses
+        :return:
+            MineData object with the requested data
+        """
+        return self._analyze_episodic(pred_data, response_data, None)[0]
+
+    def analyze_episodic_with_shuffles(self, pred_data: List[List[np.ndarray]], response_data: List[np.ndarray],
+                                       rolls: List[np.ndarray]) -> Tuple[Union[MineSpikingData, MineData],
+                                                                         Union[MineSpikingData, MineData]]:
+        """
+        Process given episodic data with MINE, fitting circularly permuted controls of each response jointly with the
+        model of the real response (see analyze_data_with_shuffles)
+        :param pred_data: For each episode the predictor data as a list of n_timepoints long vectors
+        :param response_data: For each episode the n_responses x n_timepoints matrix of responses
+        :param rolls: For each episode the n_responses x n_shuffles matrix of circular shifts applied to each response
+        :return:
+            [0]: MineData object with the requested data
+            [1]: MineData object with n_responses x n_shuffles matrices of control scores
+        """
+        return self._analyze_episodic(pred_data, response_data, rolls)
+
+    def _analyze_episodic(self, pred_data: List[List[np.ndarray]], response_data: List[np.ndarray],
+                          shuffle_rolls: Optional[List[np.ndarray]]) -> Tuple[Union[MineSpikingData, MineData],
+                                                                              Optional[Union[MineSpikingData,
+                                                                                             MineData]]]:
+        from neuro_mine.lib import model
+        from neuro_mine.lib.taylorDecomp import taylor_decompose, d2ca_dr2, complexity_scores, data_mean_prediction
+        from sklearn.metrics import roc_auc_score
         if len(pred_data) != len(response_data):
             raise ValueError(f"Episode count in prediction data {len(pred_data)} does not match response data {len(response_data)}")
         n_predictors = None
@@ -446,12 +519,23 @@ class Mine:
         cum_epochs = np.cumsum(epoch_sets)
         # create model once
         m, init_weights = self._create_init_model(n_predictors)
+        fit_model, stacked, stacked_init, shuffle_outs = self._joint_shuffle_setup(m, n_predictors, n_responses,
+                                                                                   None if shuffle_rolls is None
+                                                                                   else shuffle_rolls[0].shape[1])
         for cell_ix in range(n_responses):
-            tset = ep_data.training_data(cell_ix, batch_size=batch_size)
-            # reset weights to pre-trained state
-            m.set_weights(init_weights)
-            # the following appears to be required to re-init variables?
-            m(np.random.randn(1, self.model_history, n_predictors).astype(np.float32))
+            if shuffle_rolls is None:
+                tset = ep_data.training_data(cell_ix, batch_size=batch_size, streaming=self.stream_training_data)
+                # reset weights to pre-trained state
+                m.set_weights(init_weights)
+                # the following appears to be required to re-init variables?
+                m(np.random.randn(1, self.model_history, n_predictors).astype(np.float32))
+            else:
+                joint_data = utilities.EpisodicData(self.model_history, pred_data,
+                                                    [self._rolled_copies(rd[cell_ix], ep_rolls[cell_ix], True)
+                                                     for rd, ep_rolls in zip(response_data, shuffle_rolls)],
+                                                    train_ep)
+                tset = joint_data.joint_training_data(batch_size=batch_size, streaming=self.stream_training_data)
+                stacked.set_weights(stacked_init)
             # train
             if self.train_progress:
                 # Train in episode sets to obtain curves of train and test error progression
@@ -460,7 +544,9 @@ class Mine:
                 train_curve = np.full(cum_epochs.size, np.nan)
                 test_curve = train_curve.copy()
                 for i, ecount in enumerate(epoch_sets):
-                    model.train_model(m, tset, ecount, 0)
+                    model.train_model(fit_model, tset, ecount, 0)
+                    if shuffle_rolls is not None:
+                        m.set_weights(stacked.model_weights(0))
                     ep_predictions = ep_data.predict_response(cell_ix, m)
                     c_tr, c_ts = self._episodic_scores(ep_predictions, train_ep, score_function)
                     train_curve[i] = c_tr
@@ -469,7 +555,14 @@ class Mine:
                 outs.train_progress_data["test_score_curve"].append(test_curve)
             else:
                 # train in one fell swoop
-                model.train_model(m, tset, self.n_epochs, 0)
+                model.train_model(fit_model, tset, self.n_epochs, 0)
+            if shuffle_rolls is not None:
+                # the real response is fit by the first model of the stack - the others only need to be scored
+                m.set_weights(stacked.model_weights(0))
+                self._store_shuffle_weights(stacked, cell_ix)
+                tr, ts = self._episodic_stack_scores(stacked, joint_data, train_ep, score_function)
+                shuffle_outs.scores_trained[cell_ix] = tr[1:]
+                shuffle_outs.scores_test[cell_ix] = ts[1:]
             # save final weights
             if self.model_weight_store is not None:
                 w_group = self.model_weight_store.create_group(f"cell_{cell_ix}_weights")
@@ -487,12 +580,15 @@ class Mine:
                     print(f"        Unit {cell_ix+1} out of {n_responses} completed. "
                           f"Test score={np.round(outs.scores_test[cell_ix], 3)} which was below cut-off.", flush=True)
                 continue
+            if not (self.compute_taylor or self.return_jacobians or self.return_hessians):
+                # no derivative based metrics were requested
+                if self.verbose:
+                    print(f"        Unit {cell_ix + 1} out of {n_responses} completed. "
+                          f"Test score={np.round(outs.scores_test[cell_ix], 3)}", flush=True)
+                continue
             # compute first and second order derivatives
-            tset = ep_data.training_data(cell_ix, batch_size=batch_size)
-            all_inputs = []
-            for inp, outp in tset:
-                all_inputs.append(inp.numpy())
-            x_bar = np.mean(np.vstack(all_inputs), 0, keepdims=True)
+            tset = ep_data.training_data(cell_ix, batch_size=batch_size, streaming=self.stream_training_data)
+            x_bar = self._input_mean(tset)
             jacobian, hessian = d2ca_dr2(m, x_bar)
             # compute taylor-expansion and nonlinearity evaluation if requested
             if self.compute_taylor:
@@ -500,7 +596,8 @@ class Mine:
                 # compute taylor expansion - piecewise across episodes
                 true_change, pc, by_pred = [], [], []
                 for regs in regressor_list:
-                    tc, p, bp = taylor_decompose(m, regs, self.taylor_pred_every, self.taylor_look_ahead)
+                    tc, p, bp = taylor_decompose(m, regs, self.taylor_pred_every, self.taylor_look_ahead,
+                                                  chunk_size=self.taylor_chunk_size)
                     true_change.append(tc)
                     pc.append(p)
                     by_pred.append(bp)
@@ -580,7 +677,13 @@ class Mine:
                 outs.taylor_true_change = np.nan
                 outs.taylor_full_prediction = np.nan
                 outs.taylor_by_pred = np.nan
-        return outs.to_mine_data(self.fit_spikes)
+        if shuffle_outs is None:
+            return outs.to_mine_data(self.fit_spikes), None
+        if shuffle_outs.scores_test.shape[1] == 1:
+            # a single control per response is reported like the result of a separate shuffle fit
+            shuffle_outs.scores_trained = shuffle_outs.scores_trained[:, 0]
+            shuffle_outs.scores_test = shuffle_outs.scores_test[:, 0]
+        return outs.to_mine_data(self.fit_spikes), shuffle_outs.to_mine_data(self.fit_spikes)
 
     def analyze_data(self, pred_data: List[np.ndarray], response_data: np.ndarray) -> Union[MineSpikingData, MineData]:
         """
@@ -591,6 +694,31 @@ class Mine:
         :return:
             MineData object with the requested data
         """
+        return self._analyze_data(pred_data, response_data, None)[0]
+
+    def analyze_data_with_shuffles(self, pred_data: List[np.ndarray], response_data: np.ndarray,
+                                   rolls: np.ndarray) -> Tuple[Union[MineSpikingData, MineData],
+                                                               Union[MineSpikingData, MineData]]:
+        """
+        Process given data with MINE, fitting circularly permuted controls of each response jointly with the model of
+        the real response. The real response and its controls share their inputs and are fit by one stacked model of
+        which only the model of the real response is analyzed further while controls are only scored
+        :param pred_data: Predictor data as a list of n_timepoints long vectors. Predictors are shared among all
+            responses
+        :param response_data: n_responses x n_timepoints matrix of responses
+        :param rolls: n_responses x n_shuffles matrix of circular shifts applied to each response
+        :return:
+            [0]: MineData object with the requested data
+            [1]: MineData object with n_responses x n_shuffles matrices of control scores
+        """
+        return self._analyze_data(pred_data, response_data, rolls)
+
+    def _analyze_data(self, pred_data: List[np.ndarray], response_data: np.ndarray,
+                      shuffle_rolls: Optional[np.ndarray]) -> Tuple[Union[MineSpikingData, MineData],
+                                                                    Optional[Union[MineSpikingData, MineData]]]:
+        from neuro_mine.lib import model
+        from neuro_mine.lib.taylorDecomp import taylor_decompose, d2ca_dr2, complexity_scores, data_mean_prediction
+        from sklearn.metrics import roc_auc_score
         self._check_inputs(pred_data, response_data)
         res_len = response_data.shape[1]
         n_responses = response_data.shape[0]
@@ -621,12 +749,22 @@ class Mine:
         cum_epochs = np.cumsum(epoch_sets)
         # create model once
         m, init_weights = self._create_init_model(n_predictors)
+        fit_model, stacked, stacked_init, shuffle_outs = self._joint_shuffle_setup(m, n_predictors, n_responses,
+                                                                                   None if shuffle_rolls is None
+                                                                                   else shuffle_rolls.shape[1])
         for cell_ix in range(n_responses):
-            tset = data_obj.training_data(cell_ix, batch_size=batch_size)
-            # reset weights to pre-trained state
-            m.set_weights(init_weights)
-            # the following appears to be required to re-init variables?
-            m(np.random.randn(1, self.model_history, n_predictors).astype(np.float32))
+            if shuffle_rolls is None:
+                tset = data_obj.training_data(cell_ix, batch_size=batch_size, streaming=self.stream_training_data)
+                # reset weights to pre-trained state
+                m.set_weights(init_weights)
+                # the following appears to be required to re-init variables?
+                m(np.random.randn(1, self.model_history, n_predictors).astype(np.float32))
+            else:
+                joint_data = utilities.Data(self.model_history, pred_data,
+                                            self._rolled_copies(response_data[cell_ix], shuffle_rolls[cell_ix], True),
+                                            train_frames)
+                tset = joint_data.joint_training_data(batch_size=batch_size, streaming=self.stream_training_data)
+                stacked.set_weights(stacked_init)
             # train
             if self.train_progress:
                 # Train in episode sets to obtain curves of train and test error progression
@@ -635,7 +773,9 @@ class Mine:
                 train_curve = np.full(cum_epochs.size, np.nan)
                 test_curve = train_curve.copy()
                 for i, ecount in enumerate(epoch_sets):
-                    model.train_model(m, tset, ecount, 0)
+                    model.train_model(fit_model, tset, ecount, 0)
+                    if shuffle_rolls is not None:
+                        m.set_weights(stacked.model_weights(0))
                     p, r = data_obj.predict_response(cell_ix, m)
                     c_tr = score_function(p[:train_frames], r[:train_frames])
                     c_ts = score_function(p[train_frames:], r[train_frames:])
@@ -645,7 +785,14 @@ class Mine:
                 outs.train_progress_data["test_score_curve"].append(test_curve)
             else:
                 # train in one fell swoop
-                model.train_model(m, tset, self.n_epochs, 0)
+                model.train_model(fit_model, tset, self.n_epochs, 0)
+            if shuffle_rolls is not None:
+                # the real response is fit by the first model of the stack - the others only need to be scored
+                m.set_weights(stacked.model_weights(0))
+                self._store_shuffle_weights(stacked, cell_ix)
+                tr, ts = self._stack_scores(stacked, joint_data, train_frames, score_function)
+                shuffle_outs.scores_trained[cell_ix] = tr[1:]
+                shuffle_outs.scores_test[cell_ix] = ts[1:]
             # save final weights
             if self.model_weight_store is not None:
                 w_group = self.model_weight_store.create_group(f"cell_{cell_ix}_weights")
@@ -664,19 +811,22 @@ class Mine:
                     print(f"        Unit {cell_ix+1} out of {n_responses} completed. "
                           f"Test score={np.round(outs.scores_test[cell_ix], 3)} which was below cut-off.", flush=True)
                 continue
+            if not (self.compute_taylor or self.return_jacobians or self.return_hessians):
+                # no derivative based metrics were requested
+                if self.verbose:
+                    print(f"        Unit {cell_ix + 1} out of {n_responses} completed. "
+                          f"Test score={np.round(outs.scores_test[cell_ix], 3)}", flush=True)
+                continue
             # compute first and second order derivatives
-            tset = data_obj.training_data(cell_ix, batch_size=batch_size)
-            all_inputs = []
-            for inp, outp in tset:
-                all_inputs.append(inp.numpy())
-            x_bar = np.mean(np.vstack(all_inputs), 0, keepdims=True)
+            tset = data_obj.training_data(cell_ix, batch_size=batch_size, streaming=self.stream_training_data)
+            x_bar = self._input_mean(tset)
             jacobian, hessian = d2ca_dr2(m, x_bar)
             # compute taylor-expansion and nonlinearity evaluation if requested
             if self.compute_taylor:
                 regressors = data_obj.regressor_matrix(cell_ix)
                 # compute taylor expansion
                 true_change, pc, by_pred = taylor_decompose(m, regressors, self.taylor_pred_every,
-                                                            self.taylor_look_ahead)
+                                                            self.taylor_look_ahead, chunk_size=self.taylor_chunk_size)
                 outs.taylor_true_change.append(true_change)
                 outs.taylor_full_prediction.append(pc)
                 outs.taylor_by_pred.append(by_pred)
@@ -740,4 +890,203 @@ class Mine:
                 outs.taylor_true_change = np.nan
                 outs.taylor_full_prediction = np.nan
                 outs.taylor_by_pred = np.nan
+        if shuffle_outs is None:
+            return outs.to_mine_data(self.fit_spikes), None
+        if shuffle_outs.scores_test.shape[1] == 1:
+            # a single control per response is reported like the result of a separate shuffle fit
+            shuffle_outs.scores_trained = shuffle_outs.scores_trained[:, 0]
+            shuffle_outs.scores_test = shuffle_outs.scores_test[:, 0]
+        return outs.to_mine_data(self.fit_spikes), shuffle_outs.to_mine_data(self.fit_spikes)
+
+    def _shuffle_model(self, n_predictors: int, n_shuffles: int):
+        """
+        Generates and initializes a stack of models to fit all permuted copies of a response at once
+        """
+        from neuro_mine.lib import model
+        m = model.get_standard_model(self.model_history, self.fit_spikes, learning_rate=self.learning_rate,
+                                     l2_penalty=self.l2_penalty, n_models=n_shuffles)
+        m(np.random.randn(1, self.model_history, n_predictors).astype(np.float32))
+        return m, m.get_weights()
+
+    @staticmethod
+    def _rolled_copies(response: np.ndarray, rolls: np.ndarray, include_real: bool) -> np.ndarray:
+        """
+        Stacks circularly permuted copies of one response
+        :param response: The n_timepoints long response
+        :param rolls: The circular shifts to apply
+        :param include_real: If true the unpermuted response will be the first row
+        :return: n_copies x n_timepoints matrix
+        """
+        copies = [np.roll(response, r) for r in rolls]
+        if include_real:
+            copies = [response] + copies
+        return np.vstack(copies)
+
+    def _stack_scores(self, m: "model.StackedActivityPredictor", data_obj: utilities.Data, train_frames: int,
+                      score_function: callable) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes train and test scores of each model in a stack on the responses it was fit to
+        :return:
+            [0]: n_models long vector of train scores
+            [1]: n_models long vector of test scores
+        """
+        p = utilities.simulate_response(m, data_obj.regressor_matrix(0))
+        r = data_obj.ca_responses[:, self.model_history - 1:]
+        scores_trained = np.array([score_function(p[:train_frames, k], r[k, :train_frames])
+                                   for k in range(p.shape[1])])
+        scores_test = np.array([score_function(p[train_frames:, k], r[k, train_frames:]) for k in range(p.shape[1])])
+        return scores_trained, scores_test
+
+    def _episodic_stack_scores(self, m: "model.StackedActivityPredictor", ep_data: utilities.EpisodicData,
+                               train_ep: int, score_function: callable) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes train and test scores of each model in a stack on the episodic responses it was fit to
+        :return:
+            [0]: n_models long vector of train scores
+            [1]: n_models long vector of test scores
+        """
+        ep_predictions = [(utilities.simulate_response(m, d.regressor_matrix(0)),
+                           d.ca_responses[:, self.model_history - 1:]) for d in ep_data.data_objects]
+        scores = [self._episodic_scores([(p[:, k], r[k]) for p, r in ep_predictions], train_ep, score_function)
+                  for k in range(ep_predictions[0][0].shape[1])]
+        return np.array([s[0] for s in scores]), np.array([s[1] for s in scores])
+
+    def _joint_shuffle_setup(self, m: "model.ActivityPredictor", n_predictors: int, n_responses: int,
+                             n_shuffles: Optional[int]) -> Tuple:
+        """
+        Prepares the joint fit of responses and their permuted controls
+        :param m: The model used to analyze the real responses
+        :param n_predictors: The number of predictors
+        :param n_responses: The number of responses
+        :param n_shuffles: The number of controls per response or None if no controls are fit
+        :return:
+            [0]: The model to train
+            [1]: The stacked model with the real response first or None
+            [2]: The initial weights of the stacked model or None
+            [3]: The outputs receiving the control scores or None
+        """
+        if n_shuffles is None:
+            return m, None, None, None
+        stacked, stacked_init = self._shuffle_model(n_predictors, n_shuffles + 1)
+        shuffle_outs = _Outputs(False, False, False, n_responses, n_predictors, self.model_history, False)
+        shuffle_outs.scores_trained = np.full((n_responses, n_shuffles), np.nan)
+        shuffle_outs.scores_test = shuffle_outs.scores_trained.copy()
+        return stacked, stacked, stacked_init, shuffle_outs
+
+    def _store_shuffle_weights(self, stacked: "model.StackedActivityPredictor", cell_ix: int) -> None:
+        """
+        Saves the weights of a stacked model fit jointly to a response and its controls
+        """
+        if self.shuffle_weight_store is not None:
+            w_group = self.shuffle_weight_store.create_group(f"cell_{cell_ix}_weights")
+            utilities.modelweights_to_hdf5(w_group, stacked.get_weights())
+
+    def analyze_shuffles(self, pred_data: List[np.ndarray], response_data: np.ndarray,
+                         rolls: np.ndarray) -> Union[MineSpikingData, MineData]:
+        """
+        Fits circularly permuted copies of each response to obtain null distributions of train and test scores. All
+        copies of a response share the predictor inputs and are fit jointly by one stacked model. No derivatives or
+        Taylor metrics are computed
+        :param pred_data: Predictor data as a list of n_timepoints long vectors. Predictors are shared among all
+            responses
+        :param response_data: n_responses x n_timepoints matrix of responses
+        :param rolls: n_responses x n_shuffles matrix of circular shifts applied to each response
+        :return:
+            MineData object with n_responses x n_shuffles matrices of scores
+        """
+        from neuro_mine.lib import model
+        from sklearn.metrics import roc_auc_score
+        self._check_inputs(pred_data, response_data)
+        res_len = response_data.shape[1]
+        n_responses = response_data.shape[0]
+        n_shuffles = rolls.shape[1]
+        train_frames = int(self.train_fraction * res_len)
+        n_predictors = len(pred_data)
+
+        batch_size = res_len // 4
+        if batch_size < 1:
+            batch_size = 1
+        if batch_size > 256:
+            batch_size = 256
+
+        if self.fit_spikes:
+            score_function = lambda predicted, real: roc_auc_score(real, utilities.sigmoid(predicted))
+        else:
+            score_function = lambda predicted, real: np.corrcoef(predicted, real)[0, 1]
+
+        outs = _Outputs(False, False, False, n_responses, n_predictors, self.model_history, False)
+        outs.scores_trained = np.full((n_responses, n_shuffles), np.nan)
+        outs.scores_test = outs.scores_trained.copy()
+        m, init_weights = self._shuffle_model(n_predictors, n_shuffles)
+        for cell_ix in range(n_responses):
+            shuffled = self._rolled_copies(response_data[cell_ix], rolls[cell_ix], False)
+            data_obj = utilities.Data(self.model_history, pred_data, shuffled, train_frames)
+            tset = data_obj.joint_training_data(batch_size=batch_size, streaming=self.stream_training_data)
+            m.set_weights(init_weights)
+            model.train_model(m, tset, self.n_epochs, 0)
+            if self.model_weight_store is not None:
+                w_group = self.model_weight_store.create_group(f"cell_{cell_ix}_weights")
+                utilities.modelweights_to_hdf5(w_group, m.get_weights())
+            outs.scores_trained[cell_ix], outs.scores_test[cell_ix] = self._stack_scores(m, data_obj, train_frames,
+                                                                                         score_function)
+            if self.verbose:
+                print(f"        Unit {cell_ix + 1} out of {n_responses} completed. "
+                      f"Median shuffled test score={np.round(np.nanmedian(outs.scores_test[cell_ix]), 3)}",
+                      flush=True)
+        return outs.to_mine_data(self.fit_spikes)
+
+    def analyze_episodic_shuffles(self, pred_data: List[List[np.ndarray]], response_data: List[np.ndarray],
+                                  rolls: List[np.ndarray]) -> Union[MineSpikingData, MineData]:
+        """
+        Fits circularly permuted copies of each response across episodes to obtain null distributions of train and
+        test scores. All copies of a response share the predictor inputs and are fit jointly by one stacked model
+        :param pred_data: For each episode the predictor data as a list of n_timepoints long vectors
+        :param response_data: For each episode the n_responses x n_timepoints matrix of responses
+        :param rolls: For each episode the n_responses x n_shuffles matrix of circular shifts applied to each response
+        :return:
+            MineData object with n_responses x n_shuffles matrices of scores
+        """
+        from neuro_mine.lib import model
+        from sklearn.metrics import roc_auc_score
+        if len(pred_data) != len(response_data) or len(rolls) != len(response_data):
+            raise ValueError("Predictors, responses and rolls need to be given for each episode")
+        for pd, rd in zip(pred_data, response_data):
+            self._check_inputs(pd, rd, no_std_check=True)
+        n_predictors = len(pred_data[0])
+        n_responses = response_data[0].shape[0]
+        n_shuffles = rolls[0].shape[1]
+        train_ep = int(self.train_fraction * len(pred_data))
+
+        if self.fit_spikes:
+            score_function = lambda predicted, real: roc_auc_score(real, utilities.sigmoid(predicted))
+        else:
+            score_function = lambda predicted, real: np.corrcoef(predicted, real)[0, 1]
+
+        total_res_len = sum([rd.shape[1] for rd in response_data])
+        batch_size = total_res_len // 4
+        if batch_size < 1:
+            batch_size = 1
+        if batch_size > 256:
+            batch_size = 256
+
+        outs = _Outputs(False, False, False, n_responses, n_predictors, self.model_history, False)
+        outs.scores_trained = np.full((n_responses, n_shuffles), np.nan)
+        outs.scores_test = outs.scores_trained.copy()
+        m, init_weights = self._shuffle_model(n_predictors, n_shuffles)
+        for cell_ix in range(n_responses):
+            shuffled = [self._rolled_copies(rd[cell_ix], ep_rolls[cell_ix], False)
+                        for rd, ep_rolls in zip(response_data, rolls)]
+            ep_data = utilities.EpisodicData(self.model_history, pred_data, shuffled, train_ep)
+            tset = ep_data.joint_training_data(batch_size=batch_size, streaming=self.stream_training_data)
+            m.set_weights(init_weights)
+            model.train_model(m, tset, self.n_epochs, 0)
+            if self.model_weight_store is not None:
+                w_group = self.model_weight_store.create_group(f"cell_{cell_ix}_weights")
+                utilities.modelweights_to_hdf5(w_group, m.get_weights())
+            outs.scores_trained[cell_ix], outs.scores_test[cell_ix] = self._episodic_stack_scores(m, ep_data, train_ep,
+                                                                                                  score_function)
+            if self.verbose:
+                print(f"        Unit {cell_ix + 1} out of {n_responses} completed. "
+                      f"Median shuffled test score={np.round(np.nanmedian(outs.scores_test[cell_ix]), 3)}",
+                      flush=True)
         return outs.to_mine_data(self.fit_spikes)
@@ -11,7 +11,7 @@ import tensorflow as tf
 tf.get_logger().setLevel("ERROR")
 import tensorflow.keras as keras
 from tensorflow.keras import layers, regularizers, initializers
-from typing import Optional, Union
+from typing import List, Optional, Union
 import warnings
 
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -262,6 +262,147 @@ class ActivityPredictor(keras.Model):
     def out(self) -> Optional[keras.layers.Layer]:
         return self._out
 
+class _StackedDense(layers.Layer):
+    """
+    Dense layer holding independent weights for each of a stack of models
+    """
+
+    def __init__(self, n_models: int, units: int, activation: Optional[str], l2_penalty: Optional[float], **kwargs):
+        """
+        Creates a new stacked dense layer
+        :param n_models: The number of models in the stack
+        :param units: The number of units of each model
+        :param activation: The activation function to use or None for a linear layer
+        :param l2_penalty: The l2 penalty on the weights of each model or None for no regularization
+        """
+        super().__init__(**kwargs)
+        self.n_models = n_models
+        self.units = units
+        self.activation = keras.activations.get(activation)
+        self.l2_penalty = l2_penalty
+        self.kernel = None
+        self.bias = None
+
+    def build(self, input_shape):
+        fan_in = input_shape[-1]
+        # glorot uniform initialization of each model's kernel
+        limit = np.sqrt(6 / (fan_in + self.units))
+        self.kernel = self.add_weight(name="kernel", shape=(self.n_models, fan_in, self.units),
+                                      initializer=initializers.RandomUniform(-limit, limit),
+                                      regularizer=None if self.l2_penalty is None else
+                                      regularizers.L2(self.l2_penalty))
+        self.bias = self.add_weight(name="bias", shape=(self.n_models, 1, self.units), initializer="zeros")
+
+    def call(self, inputs):
+        if len(inputs.shape) == 2:
+            # inputs (batch x features) are shared by all models
+            out = tf.einsum("bi,kiu->kbu", inputs, self.kernel)
+        else:
+            # inputs are n_models x batch x features
+            out = tf.matmul(inputs, self.kernel)
+        return self.activation(out + self.bias)
+
+
+class StackedActivityPredictor(ActivityPredictor):
+    """
+    Stack of independent activity predictors with the structure of ActivityPredictor that share their inputs and are
+    trained jointly, each on its own response. Used to fit permuted copies of a response in one pass
+    """
+
+    def __init__(self, n_units: int, n_conv: int, drop_rate: float, input_length: int, activation: str,
+                 predict_spikes: bool, n_models: int):
+        """
+        Creates a new StackedActivityPredictor
+        :param n_units: The number of units in each dense layer
+        :param n_conv: The number of units in each initial convolutional layer
+        :param drop_rate: The drop-out rate during training
+        :param input_length: The length (across time) of inputs to the network (sets conv filter size)
+        :param activation: The activation function to use
+        :param predict_spikes: If true, 0/1 spike data instead of continuous data is expected
+        :param n_models: The number of models in the stack
+        """
+        super(StackedActivityPredictor, self).__init__(n_units, n_conv, drop_rate, input_length, activation,
+                                                       predict_spikes)
+        if n_models < 1:
+            raise ValueError("Need at least one model in the stack")
+        self.n_models: int = n_models
+
+    def setup(self) -> None:
+        """
+        Initializes the model, resetting weights
+        """
+        self._flatten = layers.Flatten()
+        self._conv_layer = _StackedDense(self.n_models, self.n_conv, self.activation, self.l2_sparsity,
+                                         name="PseudoConvolution")
+        self._drop_cl = layers.Dropout(self.drop_rate)
+        self._deep_1 = _StackedDense(self.n_models, self.n_units, self.activation, self.l2_sparsity, name="Deep1")
+        self._drop_d1 = layers.Dropout(self.drop_rate)
+        self._deep_2 = _StackedDense(self.n_models, self.n_units, self.activation, self.l2_sparsity, name="Deep2")
+        self._drop_d2 = layers.Dropout(self.drop_rate)
+        self._deep_3 = _StackedDense(self.n_models, self.n_units, self.activation, self.l2_sparsity, name="Deep3")
+        self._drop_d3 = layers.Dropout(self.drop_rate)
+        self._deep_4 = _StackedDense(self.n_models, self.n_units, self.activation, self.l2_sparsity, name="Deep4")
+        self._drop_d4 = layers.Dropout(self.drop_rate)
+        self._out = _StackedDense(self.n_models, 1, None, None, name="Out")
+        self.optimizer = keras.optimizers.Adam(learning_rate=self.learning_rate)
+        # the losses of the models are summed - since models do not share weights each model receives the gradient
+        # of its own loss
+        if self.predict_spikes:
+            self.loss_fn = lambda labels, logits: tf.reduce_sum(tf.reduce_mean(
+                tf.nn.sigmoid_cross_entropy_with_logits(labels=labels, logits=logits), axis=0))
+        else:
+            self.loss_fn = lambda labels, pred: tf.reduce_sum(tf.reduce_mean(tf.square(labels - pred), axis=0))
+        self._initialized = True
+
+    def get_output(self, inputs: np.ndarray) -> np.ndarray:
+        """
+        Returns the output values given the model inputs as n_inputs x n_models matrix
+        """
+        self.check_input(inputs)
+        return self.fast_predict(inputs).numpy()
+
+    def get_probability(self, inputs: np.ndarray) -> np.ndarray:
+        """
+        Returns the spike probabilities given model inputs as n_inputs x n_models matrix
+        """
+        if not self.predict_spikes:
+            raise ValueError("Model does not predict spikes. Probability representation is meaningless")
+        self.check_input(inputs)
+        return tf.math.sigmoid(self.fast_predict(inputs)).numpy()
+
+    def model_weights(self, index: int) -> List[np.ndarray]:
+        """
+        Returns the weights of one model of the stack
+        :param index: The index of the model in the stack
+        :return: List of weights compatible with set_weights of an ActivityPredictor of the same structure
+        """
+        self.check_init()
+        weights = []
+        for lyr in [self._conv_layer, self._deep_1, self._deep_2, self._deep_3, self._deep_4, self._out]:
+            weights.append(lyr.kernel.numpy()[index])
+            weights.append(lyr.bias.numpy()[index, 0])
+        return weights
+
+    def call(self, inputs: Union[np.ndarray, tf.Tensor], training: Optional[bool] = None, mask=None) -> tf.Tensor:
+        if training is None:
+            training = False
+        self.check_init()
+        inputs = self._flatten(inputs)
+        inputs = self._conv_layer(inputs, training=training)
+        inputs = self._drop_cl(inputs, training=training)
+        inputs = self._deep_1(inputs, training=training)
+        inputs = self._drop_d1(inputs, training=training)
+        inputs = self._deep_2(inputs, training=training)
+        inputs = self._drop_d2(inputs, training=training)
+        inputs = self._deep_3(inputs, training=training)
+        inputs = self._drop_d3(inputs, training=training)
+        inputs = self._deep_4(inputs, training=training)
+        inputs = self._drop_d4(inputs, training=training)
+        out = self._out(inputs)
+        # n_models x batch x 1 -> batch x n_models to align with the stacked labels
+        return tf.transpose(tf.squeeze(out, axis=-1))
+
+
 def train_model(mdl: ActivityPredictor, tset: tf.data.Dataset, n_epochs: int, datacount: int) -> None:
     # Trigger weight initialization by fetching one batch and doing a dry run
     for dummy_inp, _ in tset.take(1):
@@ -277,7 +418,7 @@ def train_model(mdl: ActivityPredictor, tset: tf.data.Dataset, n_epochs: int, da
 
 
 def get_standard_model(hist_steps: int, predict_spikes: bool, learning_rate: Optional[float]=None,
-                       l2_penalty: Optional[float]=None) -> ActivityPredictor:
+                       l2_penalty: Optional[float]=None, n_models: Optional[int]=None) -> ActivityPredictor:
     """
     Creates and returns an activity predictor instance with standard parameters
     found through a hyperparameter search
@@ -285,8 +426,12 @@ def get_standard_model(hist_steps: int, predict_spikes: bool, learning_rate: Opt
     :param predict_spikes: If true, 0/1 spike data instead of continuous data is expected
     :param learning_rate: The learning rate, if None standard will be used
     :param l2_penalty: The l2 penalty, if None standard will be used
+    :param n_models: If set, a stack of this many independent models is created (see StackedActivityPredictor)
     """
-    m = ActivityPredictor(64, 80, 0.5, hist_steps, "swish", predict_spikes)
+    if n_models is None:
+        m = ActivityPredictor(64, 80, 0.5, hist_steps, "swish", predict_spikes)
+    else:
+        m = StackedActivityPredictor(64, 80, 0.5, hist_steps, "swish", predict_spikes, n_models)
     if learning_rate is None:
         m.learning_rate = 1e-3
     else:
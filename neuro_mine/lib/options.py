@@ -3,6 +3,8 @@ import numpy as np
 default_options = {
     "use_time": False,
     "run_shuffle": False,
+    "n_shuffles": 1,
+    "joint_shuffle": False,
     "th_test": np.sqrt(0.5),
     "taylor_sig": 0.05,
     "taylor_cut": 0.1,
@@ -18,4 +20,12 @@ default_options = {
     "downsampling": 1,
     "ignore_memory_warning": False,
     "train_progress": False,
+    "preprocessing_cache": True,
+    "stage_cache": True,
+    "n_workers": 1,
+    "memory_budget": None,
+    "apply_memory_plan": False,
+    "interpolated_format": "csv",
+    "receptive_field_format": "csv",
+    "plots": True,
 }
@@ -1,17 +1,25 @@
-from typing import Dict, Tuple, List, Union, Optional, Any
+from __future__ import annotations
+from typing import Dict, Tuple, List, Union, Optional, Any, Callable
 import numpy as np
-import pandas as pd
 from os import path
 import h5py
 from neuro_mine.lib import file_handling as fh
 import json
-from neuro_mine.lib.utilities import safe_standardize, interp_events, safe_standardize_episodic
+from neuro_mine.lib import utilities
+from neuro_mine.lib.utilities import safe_standardize, interp_events, interp_columns, safe_standardize_episodic
+from neuro_mine.lib.options import default_options
 from neuro_mine.lib.mine import Mine, MineData, MineSpikingData, MineException, MineWarning, BaseData
-from.upsetplot import UpSet, from_indicators
-import matplotlib.pyplot as pl
 from warnings import warn
 import psutil
 import datetime
+from dataclasses import dataclass
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import time
+# NOTE: pandas and matplotlib are imported within the functions that need them to keep importing this module fast
 
 
 def downsample_data(in_data: np.ndarray, in_time: np.ndarray,
@@ -46,15 +54,30 @@ def downsample_data(in_data: np.ndarray, in_time: np.ndarray,
 
 
 def downsample_mat_with_time(in_data: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Downsamples all columns of a matrix by a given factor, giving the same results as downsample_data on each column.
+    Overhangs will be removed
+    :param in_data: n_timepoints x n_columns matrix with time in the first column
+    :param factor: The downsampling factor
+    :return: The downsampled matrix with the first time of each bin in the first column
+    """
     assert in_data.ndim == 2
-    in_time = in_data[:, 0]
-    out_data = []
-    out_time = None
-    for i in range(1, in_data.shape[1]):
-        od, out_time = downsample_data(in_data[:, i], in_time, factor)
-        out_data.append(od[:, None])
-    out_data = np.hstack(out_data)
-    return np.c_[out_time[:, None], out_data]
+    if factor <= 1:
+        return in_data.copy()
+    n_bins = in_data.shape[0] // factor
+    valid_size = n_bins * factor
+    out_data = np.empty((n_bins, in_data.shape[1]), dtype=np.result_type(in_data, np.float64))
+    out_data[:, 0] = in_data[:valid_size:factor, 0]
+    # determine which columns likely contain event-data - for these we call a spike if there is at least one
+    # spike in the down-sampled bin, otherwise bins are averaged
+    data = in_data[:, 1:]
+    is_event = np.all(np.logical_or(np.isclose(data, 0), np.isclose(data, 1)), axis=0)
+    # bins are laid out along the last axis such that reductions run over contiguous memory as for single columns
+    binned = np.ascontiguousarray(data[:valid_size].T).reshape(data.shape[1], n_bins, factor)
+    out_data[:, 1:] = np.mean(binned, axis=2).T
+    if np.any(is_event):
+        out_data[:, 1:][:, is_event] = np.max(binned[is_event], axis=2).T
+    return out_data
 
 
 def downsample_mat_list(in_list: List[np.ndarray], factor: int) -> List[np.ndarray]:
@@ -81,6 +104,21 @@ def safe_interp_1d(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> np.ndarray:
         return np.interp(x, xp, fp)
 
 
+def safe_interp(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> np.ndarray:
+    """
+    Matrix version of safe_interp_1d which interpolates all columns of fp at once
+    :param x: The interpolation timepoints
+    :param xp: The timepoints of the original data
+    :param fp: The n_timepoints x n_columns datapoints at the original timepoints
+    :return: The len(x) x n_columns interpolated data
+    """
+    # the heuristic only depends on the interpolation times and is therefore the same for all columns
+    if np.all(np.logical_or(np.isclose(x, 0), np.isclose(x, 1))):
+        return interp_events(x, xp, fp)
+    else:
+        return interp_columns(x, xp, fp)
+
+
 def ip_time_proposal(pred_times: np.ndarray, resp_times: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     For one set (e.g., episode) of predictor and response data, proposes interpolation times
@@ -102,6 +140,103 @@ def ip_time_proposal(pred_times: np.ndarray, resp_times: np.ndarray) -> Tuple[np
     return ip_time, valid_pred, valid_resp
 
 
+def grid_slice(target_times: np.ndarray, source_times: np.ndarray, max_step: Optional[int] = None,
+               tolerance: float = 1e-6) -> Optional[slice]:
+    """
+    Determines whether target times coincide with every k-th source time, in which case data can be resampled by
+    slicing instead of interpolation
+    :param target_times: The equally spaced times to resample to
+    :param source_times: The times of the original data
+    :param max_step: If set, the largest step k for which a slice is returned
+    :param tolerance: The allowed deviation between target and source times as fraction of the source time delta
+    :return: The slice of source times matching the target times or None if the times don't match
+    """
+    if target_times.size < 2 or source_times.size < 2:
+        return None
+    source_delta = (source_times[-1] - source_times[0]) / (source_times.size - 1)
+    ratio = (target_times[-1] - target_times[0]) / (target_times.size - 1) / source_delta
+    step = int(np.round(ratio))
+    if step < 1 or abs(ratio - step) > tolerance or (max_step is not None and step > max_step):
+        return None
+    start = int(np.round((target_times[0] - source_times[0]) / source_delta))
+    stop = start + step * (target_times.size - 1) + 1
+    if start < 0 or stop > source_times.size:
+        return None
+    matched = slice(start, stop, step)
+    if np.max(np.abs(source_times[matched] - target_times)) > tolerance * source_delta:
+        return None
+    return matched
+
+
+def aligned_time_proposal(pred_times: np.ndarray,
+                          resp_times: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Proposes interpolation times like ip_time_proposal but for data on a shared sampling grid, i.e. if the times of
+    the lower resolution data are equally spaced and coincide with every k-th timepoint of the higher resolution data.
+    In this case the times of the lower resolution data are used directly
+    :param pred_times: The predictor times
+    :param resp_times: The response times
+    :return: None if the times are not on a shared grid otherwise the same outputs as ip_time_proposal
+    """
+    max_allowed_time = min([pred_times.max(), resp_times.max()])
+    min_allowed_time = max([pred_times.min(), resp_times.min()])
+    valid_pred = np.logical_and(pred_times <= max_allowed_time, pred_times >= min_allowed_time)
+    valid_resp = np.logical_and(resp_times <= max_allowed_time, resp_times >= min_allowed_time)
+    if np.sum(valid_pred) < np.sum(valid_resp):
+        ip_time, fine_times = pred_times[valid_pred], resp_times[valid_resp]
+    else:
+        ip_time, fine_times = resp_times[valid_resp], pred_times[valid_pred]
+    if ip_time.size < 2:
+        return None
+    deltas = np.diff(ip_time)
+    if np.max(np.abs(deltas - np.mean(deltas))) > 1e-6 * np.mean(deltas):
+        return None
+    if grid_slice(ip_time, fine_times) is None:
+        return None
+    return ip_time, valid_pred, valid_resp
+
+
+def resample_to_grid(ip_time: np.ndarray, times: np.ndarray, valid: np.ndarray, data: np.ndarray,
+                     is_events: bool, is_predictor: bool) -> Tuple[np.ndarray, bool]:
+    """
+    Resamples data to the interpolation times, by slicing if the interpolation times coincide with timepoints of the
+    data and by interpolation otherwise
+    :param ip_time: The interpolation times
+    :param times: The times of the data
+    :param valid: Boolean vector of the data rows that may be used
+    :param data: The n_timepoints x n_columns data with time in the first column
+    :param is_events: Whether the data columns (except time) are 0/1 coded events
+    :param is_predictor: Whether the data are predictors which are interpolated with safe_interp
+    :return:
+        [0]: The resampled data
+        [1]: True if the data was sliced, False if it was interpolated
+    """
+    valid_ix = np.flatnonzero(valid)
+    # slicing events with a step larger than one would drop events between the kept timepoints
+    matched = grid_slice(ip_time, times[valid_ix], max_step=1 if is_events else None)
+    if matched is not None:
+        return data[valid_ix[matched]], True
+    if is_predictor:
+        return safe_interp(ip_time, times[valid_ix], data[valid_ix]), False
+    if not is_events:
+        return interp_columns(ip_time, times[valid_ix], data[valid_ix]), False
+    # all spike trains are interpolated at once
+    resampled = interp_events(ip_time, times[valid_ix], data[valid_ix, 1:])
+    return np.c_[ip_time[:, None], resampled], False
+
+
+def _report_resampling(pred_sliced: bool, resp_sliced: bool, episodes: Optional[List[int]] = None) -> None:
+    """
+    Prints whether predictors and responses were sliced or interpolated
+    :param pred_sliced: Whether predictors were sliced
+    :param resp_sliced: Whether responses were sliced
+    :param episodes: If set, the episodes the report applies to
+    """
+    prefix = "" if episodes is None else f"Episode{'s' if len(episodes) > 1 else ''} {', '.join(map(str, episodes))}: "
+    print(f"{prefix}Predictors were {'sliced' if pred_sliced else 'interpolated'} and responses were "
+          f"{'sliced' if resp_sliced else 'interpolated'} to the shared timepoints", flush=True)
+
+
 def episodic_interpolation(predictor_data: List[np.ndarray], response_data: List[np.ndarray], pred_times: List[np.ndarray],
                         resp_times: List[np.ndarray], is_spike_data: bool) -> Tuple[List[np.ndarray], List[np.ndarray], List[np.ndarray]]:
     """
@@ -135,21 +270,25 @@ def episodic_interpolation(predictor_data: List[np.ndarray], response_data: List
         valid_resp.append(vr)
     # perform interpolation
     ip_preds, ip_resps, ip_times = [], [], []
+    resampling = {}  # the episodes for each combination of predictors and responses being sliced
     for i in range(n_episodes):
         n_frames = int((max_times[i] - min_times[i]) / min_delta)
         ip_time = min_times[i] + np.arange(n_frames) * min_delta
-        ip_pred_data = np.hstack(
-            [safe_interp_1d(ip_time, pred_times[i][valid_pred[i]], pda[valid_pred[i]])[:, None] for pda in predictor_data[i].T])
-        if not is_spike_data:
-            ip_resp_data = np.hstack(
-                [np.interp(ip_time, resp_times[i][valid_resp[i]], rd[valid_resp[i]])[:, None] for rd in response_data[i].T])
-        else:
-            ip_resp_data = np.hstack(
-                [interp_events(ip_time, resp_times[i][valid_resp[i]], rd[valid_resp[i]])[:, None] for rd in response_data[i].T[1:, :]])
-            ip_resp_data = np.c_[ip_time[:, None], ip_resp_data]
+        # data whose timepoints coincide with the interpolation times is sliced instead of interpolated
+        ip_pred_data, pred_sliced = resample_to_grid(ip_time, pred_times[i], valid_pred[i], predictor_data[i], False,
+                                                     True)
+        ip_resp_data, resp_sliced = resample_to_grid(ip_time, resp_times[i], valid_resp[i], response_data[i],
+                                                     is_spike_data, False)
+        resampling.setdefault((pred_sliced, resp_sliced), []).append(i)
         ip_preds.append(ip_pred_data)
         ip_resps.append(ip_resp_data)
         ip_times.append(ip_time)
+    if len(resampling) == 1:
+        _report_resampling(*next(iter(resampling)))
+    else:
+        # episodes whose clocks differ are resampled differently
+        for (pred_sliced, resp_sliced), episodes in resampling.items():
+            _report_resampling(pred_sliced, resp_sliced, episodes)
     return ip_preds, ip_resps, ip_times
 
 
@@ -169,18 +308,18 @@ def joint_interpolation(predictor_data: np.ndarray, response_data: np.ndarray, p
         [2]: n_interp_times vector of interpolation times as floats
     """
 
-    ip_time, valid_pred, valid_resp = ip_time_proposal(pred_times, resp_times)
+    # if predictors and responses share a sampling grid the times of the lower resolution data are used directly
+    # such that data can be sliced instead of interpolated
+    proposal = aligned_time_proposal(pred_times, resp_times)
+    if proposal is None:
+        proposal = ip_time_proposal(pred_times, resp_times)
+    ip_time, valid_pred, valid_resp = proposal
 
     # perform interpolation
-    ip_pred_data = np.hstack(
-        [safe_interp_1d(ip_time, pred_times[valid_pred], pda[valid_pred])[:, None] for pda in predictor_data.T])
-    if not is_spike_data:
-        ip_resp_data = np.hstack(
-            [np.interp(ip_time, resp_times[valid_resp], rd[valid_resp])[:, None] for rd in response_data.T])
-    else:
-        ip_resp_data = np.hstack(
-            [interp_events(ip_time, resp_times[valid_resp], rd[valid_resp])[:, None] for rd in response_data.T[1:, :]])
-        ip_resp_data = np.c_[ip_time[:, None], ip_resp_data]
+    ip_pred_data, pred_sliced = resample_to_grid(ip_time, pred_times, valid_pred, predictor_data, False, True)
+    ip_resp_data, resp_sliced = resample_to_grid(ip_time, resp_times, valid_resp, response_data, is_spike_data,
+                                                 False)
+    _report_resampling(pred_sliced, resp_sliced)
     return ip_pred_data, ip_resp_data, ip_time
 
 
@@ -194,6 +333,7 @@ def generate_insights(mdata: Union[MineData, MineSpikingData], predictor_names:
     :param kwargs: Further arguments about thresholds (test_score_thresh, taylor_sig, taylor_cutoff, lax_thresh, sqr_thresh_)
     :return: Dataframe with insights about model fits
     """
+    import pandas as pd
     if "test_score_thresh" in kwargs:
         test_score_thresh = kwargs["test_score_thresh"]
     else:
@@ -219,8 +359,8 @@ def generate_insights(mdata: Union[MineData, MineSpikingData], predictor_names:
     is_spike_data = type(mdata) == MineSpikingData
 
     model_scores = mdata.roc_auc_test if is_spike_data else mdata.correlations_test
-    interpret_dict = {"Response": [], "Fit": []} | {ph: [] for ph in predictor_names} | {"Linearity": []}
     n_objects = model_scores.size
+    n_predictors = len(predictor_names)
     # for taylor analysis (which predictors are important) compute our significance levels based on a) user input
     # and b) the number of responses above threshold which gives the multiple-comparison correction - bonferroni
     n_fit = np.sum(model_scores >= test_score_thresh)
@@ -232,28 +372,21 @@ def generate_insights(mdata: Union[MineData, MineSpikingData], predictor_names:
                                           0.999999426697, 0.999999998027])
     n_sigma = np.where((min_significance - normal_quantiles_by_sigma) < 0)[0][0] + 1
 
-    for j in range(n_objects):
-        response = response_names[j]
-        interpret_dict["Response"].append(response)
-        fit = model_scores[j] > test_score_thresh
-        interpret_dict["Fit"].append("Y" if fit else "N")
-        if not fit:
-            for pc in predictor_names:
-                interpret_dict[pc].append("-")
-            interpret_dict["Linearity"].append("-")
-        else:
-            if mdata.model_lin_approx_scores[j] >= lax_thresh:
-                interpret_dict["Linearity"].append("linear")
-            else:
-                if mdata.model_2nd_approx_scores[j] >= sqr_thresh:
-                    interpret_dict["Linearity"].append("quadratic")
-                else:
-                    interpret_dict["Linearity"].append("cubic+")
-            for k, pc in enumerate(predictor_names):
-                taylor_mean = mdata.taylor_scores[j][k][0]
-                taylor_std = mdata.taylor_scores[j][k][1]
-                taylor_is_sig = taylor_mean - n_sigma * taylor_std - taylor_cutoff
-                interpret_dict[pc].append("Y" if taylor_is_sig > 0 else "N")
+    fit = model_scores > test_score_thresh
+    # responses that were not fit are marked with "-" in all predictor and linearity columns
+    contributions = np.full((n_objects, n_predictors), "-", dtype=object)
+    linearity = np.full(n_objects, "-", dtype=object)
+    if np.any(fit):
+        taylor_scores = mdata.taylor_scores[fit, :n_predictors]
+        significant = taylor_scores[:, :, 0] - n_sigma * taylor_scores[:, :, 1] - taylor_cutoff > 0
+        contributions[fit] = np.where(significant, "Y", "N")
+        linearity[fit] = np.select([mdata.model_lin_approx_scores[fit] >= lax_thresh,
+                                    mdata.model_2nd_approx_scores[fit] >= sqr_thresh],
+                                   ["linear", "quadratic"], "cubic+")
+    # columns are passed as lists such that pandas infers the same column types as for the per-response strings
+    interpret_dict = ({"Response": list(response_names[:n_objects]), "Fit": np.where(fit, "Y", "N").tolist()} |
+                      {ph: contributions[:, k].tolist() for k, ph in enumerate(predictor_names)} |
+                      {"Linearity": linearity.tolist()})
     return pd.DataFrame(interpret_dict)
 
 
@@ -264,24 +397,32 @@ def generate_insights_from_file(filepath: str, **kwargs) -> pd.DataFrame:
     :param kwargs: Further arguments about thresholds (test_score_thresh, taylor_sig, taylor_cutoff, lax_thresh, sqr_thresh_)
     :return: Dataframe with insights about model fits
     """
-    with h5py.File(filepath, "r") as f:
-        data_object = BaseData.from_hdf5(f["analysis"])
-        name_grp = f["data_names"]
-        predictor_bytes = name_grp["predictor_names"][()]
-        predictor_names = [pb[0].decode("utf-8") for pb in predictor_bytes]
-        response_bytes = name_grp["response_names"][()]
-        response_names = [rb[0].decode("utf-8") for rb in response_bytes]
+    data_object, _, predictor_names, response_names = load_analysis_file(filepath)
     return generate_insights(data_object, predictor_names, response_names, **kwargs)
 
 
-def barcode_cluster_plot(insight_df: pd.DataFrame, predictor_names: List[str]) -> Tuple[pl.Figure, pd.DataFrame]:
+def barcode_clusters(insight_df: pd.DataFrame, predictor_names: List[str]) -> pd.DataFrame:
+    """
+    Computes the barcode of each response, i.e. which predictors contribute to it and whether it is nonlinear
+    :param insight_df: The insights of the responses
+    :param predictor_names: The names of the predictors
+    :return: Boolean dataframe with one column per predictor and a final "Nonlinear" column
+    """
+    import pandas as pd
     barcode_labels = [ph for ph in predictor_names] + ["Nonlinear"]
     barcode = np.hstack([(np.array(insight_df[ph]) == "Y")[:, None] for ph in predictor_names])
     barcode = np.c_[barcode, (np.array(insight_df["Linearity"]) != "linear")[:, None]]
-    df_barcode = pd.DataFrame(barcode, columns=barcode_labels)
-    aggregate = from_indicators(df_barcode)
+    return pd.DataFrame(barcode, columns=barcode_labels)
+
+
+def barcode_cluster_plot(insight_df: pd.DataFrame, predictor_names: List[str]) -> Tuple[pl.Figure, pd.DataFrame]:
+    import matplotlib.pyplot as pl
+    from .upsetplot import UpSet, from_indicator_counts
+    df_barcode = barcode_clusters(insight_df, predictor_names)
+    # count responses per barcode before plotting such that plotting scales with the number of distinct barcodes
+    aggregate = from_indicator_counts(df_barcode)
     fig = pl.figure()
-    up_set = UpSet(aggregate, subset_size='count', min_subset_size=1, facecolor="C1", sort_by='cardinality',
+    up_set = UpSet(aggregate, subset_size='auto', min_subset_size=1, facecolor="C1", sort_by='cardinality',
                        sort_categories_by=None)
     axes_dict = up_set.plot(fig)
     axes_dict['intersections'].set_yscale('log')
@@ -297,6 +438,7 @@ def linearity_metrics_plot(mdata: BaseData, linear_threshold: Optional[float],
     :param squared_threshold: The squared or 2nd order threshold
     :return: Figure object
     """
+    import matplotlib.pyplot as pl
     fig = pl.figure()
     pl.scatter(mdata.model_lin_approx_scores, mdata.model_2nd_approx_scores, s=2)
     if linear_threshold is not None:
@@ -310,6 +452,23 @@ def linearity_metrics_plot(mdata: BaseData, linear_threshold: Optional[float],
     return fig
 
 
+def permutation_p_values(model_scores: np.ndarray, shuffle_scores: np.ndarray) -> np.ndarray:
+    """
+    Computes for each response the fraction of permuted controls with a test score at least as large as the score on
+    the real data, counting the real data as one of the permutations
+    :param model_scores: n_responses long vector of test scores on real data
+    :param shuffle_scores: n_responses x n_shuffles matrix of test scores on permuted data
+    :return: n_responses long vector of permutation p-values, NaN where the real test score is not finite
+    """
+    if shuffle_scores.ndim == 1:
+        shuffle_scores = shuffle_scores[:, None]
+    # like failed fits, non-finite control scores (e.g. of constant predictions) never exceed the real score
+    n_exceeding = np.sum(shuffle_scores >= model_scores[:, None], axis=1)
+    p_values = (n_exceeding + 1) / (shuffle_scores.shape[1] + 1)
+    p_values[~np.isfinite(model_scores)] = np.nan
+    return p_values
+
+
 def test_metrics_plot(mdata: Union[MineData, MineSpikingData], mdata_shuff: Union[MineData, MineSpikingData],
                       test_score_thresh: float) -> pl.Figure:
     """
@@ -320,6 +479,7 @@ def test_metrics_plot(mdata: Union[MineData, MineSpikingData], mdata_shuff: Unio
     :param test_score_thresh: The currently selected test score threshold
     :return: Figure object
     """
+    import matplotlib.pyplot as pl
     if type(mdata) == MineSpikingData:
         is_spike_data = True
     else:
@@ -334,12 +494,19 @@ def test_metrics_plot(mdata: Union[MineData, MineSpikingData], mdata_shuff: Unio
     ab_shuff = np.full_like(c_thresholds, np.nan)
     for i, ct in enumerate(c_thresholds):
         ab_real[i] = np.sum(model_scores > ct) / n_objects
-        ab_shuff[i] = np.sum(shuffle_scores > ct) / n_objects
+        # with multiple permutations per response this is the expected fraction across permutations
+        ab_shuff[i] = np.sum(shuffle_scores > ct) / shuffle_scores.size
 
     # compute false-discovery-rate as the fraction of identified positives in the suffled over the real data
     fdr = ab_shuff / (ab_real+1e-12)
     fdr[np.logical_and(ab_real == 0, ab_shuff > 0)] = 1  # a false discovery rate of 1 is a reasonable assumption if only shuffles are positive
     fdr[np.logical_and(ab_real == 0, ab_shuff == 0)] = np.nan  # no determination if both are 0
+    if shuffle_scores.ndim > 1:
+        # the false discovery rate of a threshold cannot exceed that of any lower threshold since all responses
+        # passing it also pass the lower threshold - enforcing this smooths the estimate
+        undetermined = np.isnan(fdr)
+        fdr = np.fmin.accumulate(fdr)
+        fdr[undetermined] = np.nan
 
     # plot identified fractions on top, false discovery rate on bottom plot
     axes[0].plot(c_thresholds, ab_real, label="Real data")
@@ -367,6 +534,7 @@ def train_curve_plot(mdata: Union[MineData, MineSpikingData]) -> pl.figure:
     :param mdata: The Mine result data from a fit or reinstantiated from an analysis file
     :return: Figure object
     """
+    import matplotlib.pyplot as pl
     count = float(mdata.train_progress_data["train_score_curve"].shape[0])
     m_train = np.mean(mdata.train_progress_data["train_score_curve"], axis=0)
     std_train = np.std(mdata.train_progress_data["train_score_curve"], axis=0) / np.sqrt(count)
@@ -397,44 +565,254 @@ def time_from_index(ix: int, model_history: int, ip_rate: float) -> float:
     return (1/ip_rate) * ix_corr
 
 
-def mem_threshold_warn(ip_pred_data: Union[List[np.ndarray], np.ndarray], model_history: int, is_episodic: bool,
-                       threshold_fraction=0.75) -> bool:
+# file formats in which tables can be written and their file extensions
+table_formats = {"csv": ".csv", "hdf5": ".hdf5", "parquet": ".parquet"}
+
+
+def write_table(file_base: str, columns: List[str], data: np.ndarray, file_format: str,
+                row_names: Optional[List[str]] = None, row_label: str = "Response") -> str:
+    """
+    Writes a numerical table. The file is written under a temporary name and then moved into place such that readers
+    never see partial files. HDF5 files store the table as one 2D dataset "data" with column names in its "names"
+    attribute, the layout that MINE reads as input, and row names as a separate dataset
+    :param file_base: The path of the file without extension
+    :param columns: The names of the numerical columns
+    :param data: n_rows x n_columns matrix of values
+    :param file_format: One of "csv", "hdf5" or "parquet"
+    :param row_names: If set, the name of each row stored as first column
+    :param row_label: The name of the row name column
+    :return: The path of the written file
+    """
+    if file_format not in table_formats:
+        raise ValueError(f"Unknown table format {file_format}. Valid formats are {list(table_formats.keys())}")
+    file_path = file_base + table_formats[file_format]
+    tmp_path = file_path + f".{os.getpid()}.tmp"
+    if file_format == "hdf5":
+        with h5py.File(tmp_path, "w") as t_file:
+            dset = t_file.create_dataset("data", data=data)
+            dset.attrs["names"] = np.array(columns, dtype=object)
+            if row_names is not None:
+                t_file.create_dataset(row_label, data=np.array(row_names, dtype=object), dtype=h5py.string_dtype())
+    elif file_format == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing parquet files requires pyarrow. Install it with 'pip install pyarrow'.")
+        arrays = [] if row_names is None else [pa.array(row_names, type=pa.string())]
+        arrays += [pa.array(np.ascontiguousarray(data[:, i])) for i in range(data.shape[1])]
+        names = ([] if row_names is None else [row_label]) + list(columns)
+        pq.write_table(pa.Table.from_arrays(arrays, names=names), tmp_path)
+    else:
+        import pandas as pd
+        df = pd.DataFrame(data, columns=columns)
+        if row_names is not None:
+            df.insert(0, row_label, row_names)
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+class BackgroundWriter:
+    """
+    Writes output files on a background thread such that writing does not delay fitting or plotting. Errors of
+    writes are raised when waiting for the writer
+    """
+
+    def __init__(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+
+    def submit(self, write_function: Callable, *args, **kwargs) -> None:
+        """
+        Queues a write
+        :param write_function: The function performing the write
+        """
+        self._futures.append(self._executor.submit(write_function, *args, **kwargs))
+
+    def wait(self) -> None:
+        """
+        Waits for all queued writes to finish, raising the first error that occurred
+        """
+        futures, self._futures = self._futures, []
+        for f in futures:
+            f.result()
+
+    def close(self) -> None:
+        """
+        Waits for all queued writes and stops the background thread
+        """
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
+
+
+def memory_budget(configuration: Dict) -> int:
+    """
+    Returns the memory budget of a run
+    :param configuration: The run configuration
+    :return: The budget in bytes, either as configured in GB or 3/4 of the system memory
+    """
+    budget_gb = configuration["config"].get("memory_budget", None)
+    if budget_gb is None:
+        return int(psutil.virtual_memory().total * 0.75)
+    return int(budget_gb * 1024**3)
+
+
+def _stage_memory(episode_lengths: List[int], n_predictors: int, n_responses: int, model_history: int,
+                  taylor_look_ahead: int, train_fraction: float, n_shuffles: int, fit_jacobian: bool,
+                  taylor_chunk_size: int, stream_training_data: bool) -> Dict[str, int]:
+    """
+    Models the memory used by each stage of a fit
+    :param episode_lengths: The number of interpolated timepoints of each episode
+    :param n_predictors: The number of predictors
+    :param n_responses: The number of responses
+    :param model_history: The number of timepoints in the model history
+    :param taylor_look_ahead: The number of timepoints the Taylor expansion predicts ahead
+    :param train_fraction: The fraction of data used for training
+    :param n_shuffles: The number of rotated copies of each response that are fit as controls (0 if none)
+    :param fit_jacobian: Whether jacobians are stored
+    :param taylor_chunk_size: The number of timepoints for which hessians are computed at once
+    :param stream_training_data: Whether training inputs are formed per batch instead of held in memory
+    :return: Dictionary of stage names and their memory in bytes
+    """
+    n_time = sum(episode_lengths)
+    n_inputs = model_history * n_predictors  # size of one model input and of each hessian dimension
+    # interpolated data with time column, standardized copies and the rotated responses of the shuffle fit, which
+    # are either created for all responses at once or, for many shuffles, for one response at a time
+    input_data = 8 * n_time * (n_predictors + 1) + 8 * n_time * (n_responses + 1) + 8 * n_time * (n_predictors +
+                                                                                                     n_responses)
+    if n_shuffles == 1:
+        input_data += 8 * n_time * n_responses
+    elif n_shuffles > 1:
+        input_data += 8 * n_time * n_shuffles
+    n_train = max(0, int(train_fraction * n_time) - model_history + 1)
+    if stream_training_data:
+        # regressor matrix and its tensorflow copy
+        training = mean_inputs = 2 * 4 * n_time * n_predictors
+    else:
+        # float32 training inputs are materialized, copied into the dataset and cached batch by batch. For the data
+        # mean the inputs are additionally collected and stacked
+        train_inputs = 4 * n_train * n_inputs
+        training = 3 * train_inputs
+        mean_inputs = 4 * train_inputs
+    if n_shuffles > 1:
+        # labels of all rotated copies of a response
+        training += 3 * 4 * n_train * n_shuffles
+    # Taylor expansion starts every model_history timepoints
+    n_taylor = [max(0, int(np.ceil((el - taylor_look_ahead - model_history + 1) / model_history)))
+                for el in episode_lengths]
+    chunk = max(1, min(taylor_chunk_size, max(n_taylor)))
+    # current and next windows plus hessians of one chunk with the temporaries of the second order terms
+    taylor = 2 * 4 * sum(n_taylor) * n_inputs + 5 * 4 * chunk * n_inputs**2
+    # Taylor results of every response are collected and stacked once all responses are fit
+    outputs = 2 * 4 * n_responses * sum(n_taylor) * (n_predictors**2 + 2)
+    if fit_jacobian:
+        outputs += 8 * n_responses * n_inputs
+    return {"Input data": input_data, "Model training": training, "Data mean input": mean_inputs,
+            "Taylor expansion": taylor, "Fit outputs": outputs}
+
+
+def _peak_memory(stages: Dict[str, int]) -> int:
+    """
+    Computes the peak memory of a fit from its stages. Input data and fit outputs are held throughout while the
+    remaining stages are transient and do not overlap
+    :param stages: Dictionary of stage names and their memory in bytes
+    :return: The peak memory in bytes
+    """
+    transient = max(stages["Model training"], stages["Data mean input"], stages["Taylor expansion"])
+    return stages["Input data"] + stages["Fit outputs"] + transient
+
+
+def plan_memory(episode_lengths: List[int], n_predictors: int, n_responses: int, model_history: int,
+                configuration: Dict, taylor_chunk_size=64) -> Dict:
     """
-    Estimate memory usage of model training and warn user if it exceeds threshold level. Also prints downsampling
-    suggestion to reduce memory usage.
-    :param ip_pred_data: The prediction data to be used during training
+    Models the peak memory of a fit and plans how to fit it into the memory budget: First the number of hessians
+    computed at once during the Taylor expansion is reduced and training inputs are streamed. If this is insufficient,
+    the smallest additional downsampling factor that fits the budget is determined
+    :param episode_lengths: The number of interpolated timepoints of each episode
+    :param n_predictors: The number of predictors
+    :param n_responses: The number of responses
     :param model_history: The number of timepoints in the model history
-    :param is_episodic: Indicates whether training is across episodes (i.e., ip_pred_data is a List)
-    :param threshold_fraction: The fraction of total memory that can be filled before triggering a warning
-    :return: True if memory exceeded threshold level
-    """
-    # compute expected training data size and warn user if crossing a threshold
-    # we set the threshold to 3/4 of the total available memory on the machine
-    mem_gb_avail = int(psutil.virtual_memory().total / (1024**3))
-    td_gb_thresh = int(mem_gb_avail * threshold_fraction)
-    td_byte_thresh = int(td_gb_thresh * 1024**3 / 3)  # division by three to safely account for internal data duplication - a future version ideally avoids this
-    td_length = sum([pd.shape[0] for pd in ip_pred_data]) if is_episodic else ip_pred_data.shape[0]
-    n_predictors = ip_pred_data[0].shape[1] if is_episodic else ip_pred_data.shape[1]
-    td_size = td_length * model_history * n_predictors * 4  # 32-bit float, 4 bytes per number
-    if td_size > td_byte_thresh:
-        downsample_to_thresh = int(td_size // td_byte_thresh + 2)
-        downsample_proposal = 1
-        for i in range(2, downsample_to_thresh):
-            downsample_proposal += 1
-            m_hist = model_history // i
-            if m_hist < 1:
-                m_hist = 1
-            if (td_length//downsample_proposal) * m_hist * n_predictors * 4 < td_byte_thresh:
+    :param configuration: The run configuration
+    :param taylor_chunk_size: The configured number of timepoints for which hessians are computed at once
+    :return: Dictionary with the budget, the stages and peak of the configured fit, the planned chunk size and
+        streaming mode with the resulting stages and peak, and the additional downsampling factor (1 if not required,
+        None if no factor fits the budget)
+    """
+    budget = memory_budget(configuration)
+
+    look_ahead_fraction = configuration["config"]["taylor_look"]
+    n_shuffles = configuration["config"].get("n_shuffles", 1) if configuration["config"]["run_shuffle"] else 0
+    if n_shuffles > 0 and configuration["config"].get("joint_shuffle", False):
+        # the real response is fit as one more copy alongside its controls
+        n_shuffles += 1
+
+    def stage_memory(lengths: List[int], history: int, chunk: int, stream: bool) -> Dict[str, int]:
+        look_ahead = max(1, int(np.round(history * look_ahead_fraction, 0)))
+        return _stage_memory(lengths, n_predictors, n_responses, history, look_ahead,
+                             configuration["config"]["miner_train_fraction"], n_shuffles,
+                             configuration["config"]["jacobian"], chunk, stream)
+
+    def fit_to_budget(lengths: List[int], history: int) -> Tuple[int, bool, Dict[str, int]]:
+        chunk, stream = taylor_chunk_size, False
+        stages = stage_memory(lengths, history, chunk, stream)
+        while _peak_memory(stages) > budget:
+            if stages["Taylor expansion"] >= max(stages["Model training"], stages["Data mean input"]) and chunk > 1:
+                chunk //= 2
+            elif not stream:
+                stream = True
+            else:
                 break
-        print("############################")
-        print(f"The total system memory is {mem_gb_avail} GB RAM")
-        print(f"Expected training data size is larger than {td_size // (1024**3)} GB.")
-        print("This either leads to out-of-memory errors, unexplained crashes or sluggish performance.")
-        print("Reducing history length or downsampling data will reduce training data size.")
-        print(f"Setting the downsampling factor to {downsample_proposal} will reduce datasize below {td_gb_thresh} GB.")
-        print("############################")
-        return True
-    return False
+            stages = stage_memory(lengths, history, chunk, stream)
+        return chunk, stream, stages
+
+    configured = stage_memory(episode_lengths, model_history, taylor_chunk_size, False)
+    chunk, stream, planned = fit_to_budget(episode_lengths, model_history)
+    downsampling = 1
+    if _peak_memory(planned) > budget:
+        downsampling = None
+        # keep at least 10 timepoints per episode and one timepoint of model history
+        for factor in range(2, min(min(episode_lengths) // 10, model_history) + 1):
+            _, _, ds_stages = fit_to_budget([el // factor for el in episode_lengths], max(1, model_history // factor))
+            if _peak_memory(ds_stages) <= budget:
+                downsampling = factor
+                break
+    return {"budget": budget, "stages": configured, "peak": _peak_memory(configured), "taylor_chunk_size": chunk,
+            "stream_training_data": stream, "planned_stages": planned, "planned_peak": _peak_memory(planned),
+            "downsampling": downsampling}
+
+
+def print_memory_plan(plan: Dict, taylor_chunk_size=64) -> None:
+    """
+    Prints the modeled memory of each stage of a fit and the changes planned to fit it into the memory budget
+    :param plan: The memory plan as returned by plan_memory
+    :param taylor_chunk_size: The configured number of timepoints for which hessians are computed at once
+    """
+    gb = 1024**3
+    print("############################")
+    print(f"Memory plan for a budget of {plan['budget'] / gb:.2f} GB (total system memory "
+          f"{psutil.virtual_memory().total / gb:.1f} GB)")
+    for name, size in plan["stages"].items():
+        print(f"    {name}: {size / gb:.2f} GB")
+    print(f"Estimated peak memory: {plan['peak'] / gb:.2f} GB")
+    if plan["peak"] > plan["budget"]:
+        if plan["taylor_chunk_size"] != taylor_chunk_size:
+            print(f"Computing hessians for {plan['taylor_chunk_size']} instead of {taylor_chunk_size} timepoints at "
+                  f"once during Taylor expansion reduces its memory.")
+        if plan["stream_training_data"]:
+            print("Streaming training data forms model inputs for each batch instead of holding them in memory.")
+        if plan["planned_peak"] < plan["peak"]:
+            print(f"With these changes the estimated peak memory is {plan['planned_peak'] / gb:.2f} GB.")
+        if plan["downsampling"] is None:
+            print("No downsampling factor reduces the estimated peak memory below the budget. Fitting the responses "
+                  "in shards reduces the memory of response data and fit outputs.")
+        elif plan["downsampling"] > 1:
+            print(f"Additionally downsampling by a factor of {plan['downsampling']} reduces the estimated peak memory "
+                  f"below the budget.")
+    print("############################", flush=True)
 
 
 def roll_2d_array(in_array: np.ndarray, rolls: np.ndarray[int]) -> np.ndarray:
@@ -447,8 +825,352 @@ def roll_2d_array(in_array: np.ndarray, rolls: np.ndarray[int]) -> np.ndarray:
     return out_array
 
 
+def permutation_rolls(mine_resp: Union[np.ndarray, List[np.ndarray]], is_episodic: bool,
+                      n_shuffles: int) -> Union[np.ndarray, List[np.ndarray]]:
+    """
+    Draws the circular shifts of permuted controls, moving data forward between 1/4 and 3/4 of the length
+    :param mine_resp: n_responses x n_timepoints matrix of responses or one such matrix per episode
+    :param is_episodic: Whether mine_resp holds the responses of each episode
+    :param n_shuffles: The number of controls per response
+    :return: n_responses x n_shuffles matrix of shifts or one such matrix per episode
+    """
+    if not is_episodic:
+        return np.random.randint(low=mine_resp.shape[1] // 4, high=(mine_resp.shape[1] * 3) // 4,
+                                 size=(mine_resp.shape[0], n_shuffles))
+    return [np.random.randint(low=mr.shape[1] // 4, high=(mr.shape[1] * 3) // 4, size=(mr.shape[0], n_shuffles))
+            for mr in mine_resp]
+
+
+# version of the preprocessing steps - increase whenever parsing, interpolation or downsampling change such that
+# cached preprocessing results of previous versions are not used anymore
+preprocessing_cache_version = 1
+
+
+def _hash_path(file_or_dir: str, hasher) -> None:
+    """
+    Updates a hash with the contents of a file or, for directories such as suite2p output, of all contained files
+    :param file_or_dir: The path to hash
+    :param hasher: The hashlib hash object to update
+    """
+    if path.isdir(file_or_dir):
+        for root, dirs, files in os.walk(file_or_dir):
+            dirs.sort()
+            for f in sorted(files):
+                hasher.update(path.relpath(path.join(root, f), file_or_dir).encode())
+                _hash_path(path.join(root, f), hasher)
+        return
+    with open(file_or_dir, "rb") as f:
+        while True:
+            block = f.read(1 << 24)
+            if not block:
+                break
+            hasher.update(block)
+
+
+def preprocessing_cache_key(pred_path: List[str], resp_path: List[str], is_episodic: bool, downsampling: int) -> str:
+    """
+    Computes the key identifying preprocessed data from the contents of all input files, the preprocessing
+    parameters and the version of the preprocessing code
+    :param pred_path: Path to predictor data files
+    :param resp_path: Path to response data files
+    :param is_episodic: Whether data is treated as episodic
+    :param downsampling: The downsampling factor
+    :return: The key as hexadecimal string
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    # parser options that change the loaded data are part of the key as well
+    parameters = {
+        "version": preprocessing_cache_version,
+        "episodic": is_episodic,
+        "downsampling": downsampling,
+        "parser_options": fh.get_parser_options()
+    }
+    hasher.update(json.dumps(parameters).encode())
+    for p in list(pred_path) + list(resp_path):
+        hasher.update(b"\0")
+        _hash_path(p, hasher)
+    return hasher.hexdigest()
+
+
+def preprocessing_cache_path(cache_dir: str, resp_path: List[str]) -> str:
+    """
+    Determines the file storing the preprocessed data of a set of inputs. There is one cache file per input, the key
+    of the cached data is stored within the file
+    :param cache_dir: The directory in which cache files are stored
+    :param resp_path: Path to response data files which are used to name the cache file
+    :return: The path to the cache file
+    """
+    name = path.splitext(path.split(resp_path[0])[-1])[0]
+    return path.join(cache_dir, f"MINE_{name}_preprocessed.hdf5")
+
+
+def save_preprocessing_cache(cache_file: str, key: str, is_spike_data: bool, ip_pred_data: Any, ip_resp_data: Any,
+                             ip_time: Any, pred_header: List[str], resp_header: List[str]) -> None:
+    """
+    Stores preprocessed data, replacing data of a previous key. The file is written under a temporary name and then
+    moved into place such that concurrent runs (e.g. shards of one recording) never read partial files
+    :param cache_file: The path of the cache file
+    :param key: The cache key
+    :param is_spike_data: Whether data is spiking data
+    :param ip_pred_data: The interpolated predictor data (list of episodes for episodic data)
+    :param ip_resp_data: The interpolated response data (list of episodes for episodic data)
+    :param ip_time: The timepoints after interpolation (list of episodes for episodic data)
+    :param pred_header: Predictor names
+    :param resp_header: Response names
+    """
+    is_episodic = isinstance(ip_pred_data, list)
+    tmp_file = cache_file + f".{os.getpid()}.tmp"
+    with h5py.File(tmp_file, "w") as dfile:
+        dfile.attrs["key"] = key
+        dfile.attrs["is_spike_data"] = is_spike_data
+        dfile.attrs["is_episodic"] = is_episodic
+        dfile.create_dataset("pred_header", data=np.array(pred_header, dtype=object), dtype=h5py.string_dtype())
+        dfile.create_dataset("resp_header", data=np.array(resp_header, dtype=object), dtype=h5py.string_dtype())
+        if not is_episodic:
+            ip_pred_data, ip_resp_data, ip_time = [ip_pred_data], [ip_resp_data], [ip_time]
+        for i, (ipd, ird, ipt) in enumerate(zip(ip_pred_data, ip_resp_data, ip_time)):
+            grp = dfile.create_group(f"episode_{i}")
+            grp.create_dataset("ip_pred_data", data=ipd)
+            grp.create_dataset("ip_resp_data", data=ird)
+            grp.create_dataset("ip_time", data=ipt)
+    os.replace(tmp_file, cache_file)
+
+
+def load_preprocessing_cache(cache_file: str, key: str) -> Optional[Tuple[bool, Any, Any, Any, List[str], List[str]]]:
+    """
+    Loads preprocessed data if a cache file for the key exists
+    :param cache_file: The path of the cache file
+    :param key: The cache key
+    :return: None if the data is not cached otherwise the same outputs as load_and_pre_process_data
+    """
+    if not path.isfile(cache_file):
+        return None
+    try:
+        with h5py.File(cache_file, "r") as dfile:
+            if dfile.attrs["key"] != key:
+                return None
+            is_spike_data = bool(dfile.attrs["is_spike_data"])
+            is_episodic = bool(dfile.attrs["is_episodic"])
+            pred_header = [h.decode() for h in dfile["pred_header"][()]]
+            resp_header = [h.decode() for h in dfile["resp_header"][()]]
+            n_episodes = len([k for k in dfile.keys() if k.startswith("episode_")])
+            ip_pred_data, ip_resp_data, ip_time = [], [], []
+            for i in range(n_episodes):
+                grp = dfile[f"episode_{i}"]
+                ip_pred_data.append(grp["ip_pred_data"][()])
+                ip_resp_data.append(grp["ip_resp_data"][()])
+                ip_time.append(grp["ip_time"][()])
+    except (OSError, KeyError):
+        # unreadable cache files, e.g. of interrupted runs, are simply recomputed
+        return None
+    if not is_episodic:
+        ip_pred_data, ip_resp_data, ip_time = ip_pred_data[0], ip_resp_data[0], ip_time[0]
+    return is_spike_data, ip_pred_data, ip_resp_data, ip_time, pred_header, resp_header
+
+
+# version of the fitting and output stages - increase whenever changes alter the results of these stages such that
+# stage outputs of previous versions are recomputed
+stage_cache_version = 1
+
+
+def stage_key(parameters: Dict, upstream: List[str]) -> str:
+    """
+    Computes the key of a processing stage as content hash of its parameters and the results of the stages it depends on
+    :param parameters: The parameters that change the outputs of the stage
+    :param upstream: The result identifiers of the stages whose outputs are inputs of the stage
+    :return: The key as hexadecimal string
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(json.dumps({"version": stage_cache_version, "parameters": parameters}, sort_keys=True).encode())
+    for u in upstream:
+        hasher.update(b"\0")
+        hasher.update(u.encode())
+    return hasher.hexdigest()
+
+
+class StageCache:
+    """
+    Tracks the processing stages of one file pair. Each stage declares a key, the content hash of its inputs and
+    parameters, and reports the files it wrote. Keys and files are recorded in a manifest in the output folder such
+    that a later run only recomputes stages whose key changed or whose output files are missing
+    """
+
+    def __init__(self, manifest_file: str, use_cache: bool):
+        """
+        Creates a new stage cache
+        :param manifest_file: The path of the json manifest with the stages of previous runs
+        :param use_cache: If false all stages are recomputed and no manifest is written. The manifest of previous runs
+            is removed since their outputs are overwritten
+        """
+        self.manifest_file = manifest_file
+        self.use_cache = use_cache
+        self.manifest: Dict[str, Dict] = {}
+        if not use_cache:
+            if path.isfile(manifest_file):
+                os.remove(manifest_file)
+        elif path.isfile(manifest_file):
+            try:
+                with open(manifest_file) as mfile:
+                    self.manifest = json.load(mfile)
+            except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+                # unreadable manifests, e.g. of interrupted runs, are simply rebuilt
+                self.manifest = {}
+        # per stage whether it was loaded from cache and the time it took in this run
+        self.log: Dict[str, Dict[str, Any]] = {}
+
+    def is_current(self, stage: str, key: str) -> bool:
+        """
+        Determines whether the outputs of a stage stored by a previous run can be used
+        :param stage: The name of the stage
+        :param key: The key of the stage in this run
+        :return: True if the stage does not need to be recomputed
+        """
+        entry = self.manifest.get(stage, None)
+        if not self.use_cache or entry is None or entry["key"] != key:
+            return False
+        folder = path.dirname(self.manifest_file)
+        return all(path.isfile(path.join(folder, f)) for f in entry["outputs"])
+
+    def result(self, stage: str) -> str:
+        """
+        Returns the identifier of the current result of a stage, to be used in the keys of dependent stages
+        """
+        return self.manifest[stage]["result"]
+
+    def run(self, stage: str, key: str, compute: Callable[[], Tuple[Any, List[str]]],
+            load: Optional[Callable[[], Any]] = None, deterministic: bool = True) -> Any:
+        """
+        Runs a stage or, if it is current, loads its result
+        :param stage: The name of the stage
+        :param key: The key of the stage
+        :param compute: Function computing the stage and returning its result and the paths of the files it wrote
+        :param load: Function loading the result of the stage from its files. If None the stage has no result
+            besides its files
+        :param deterministic: If false, recomputing the stage with the same key gives different results (e.g. model
+            fits) and stages depending on it have to be recomputed as well
+        :return: The result of the stage
+        """
+        start = time.perf_counter()
+        if self.is_current(stage, key):
+            print(f"Stage '{stage}' is unchanged. Using outputs of previous run.", flush=True)
+            result = None if load is None else load()
+            cached = True
+        else:
+            result, outputs = compute()
+            self.record(stage, key, outputs, deterministic)
+            cached = False
+        self.log[stage] = {"cached": cached, "time_seconds": time.perf_counter() - start}
+        return result
+
+    def record(self, stage: str, key: str, outputs: List[str], deterministic: bool = True) -> None:
+        """
+        Records a computed stage in the manifest
+        :param stage: The name of the stage
+        :param key: The key of the stage
+        :param outputs: The paths of the files the stage wrote
+        :param deterministic: If false, recomputing the stage with the same key gives different results
+        """
+        result_id = key if deterministic else stage_key({"computed": datetime.datetime.now().isoformat()}, [key])
+        self.manifest[stage] = {"key": key, "result": result_id, "outputs": [path.basename(f) for f in outputs]}
+        self.save()
+
+    def timed(self, stage: str, compute: Callable[[], Any]) -> Any:
+        """
+        Runs a stage that is always recomputed, recording its time
+        :param stage: The name of the stage
+        :param compute: Function computing the stage and returning its result
+        :return: The result of the stage
+        """
+        start = time.perf_counter()
+        result = compute()
+        self.log[stage] = {"cached": False, "time_seconds": time.perf_counter() - start}
+        return result
+
+    def invalidate(self, stages: List[str]) -> None:
+        """
+        Removes stages whose output files were rewritten outside of the stage cache, e.g. by re-analysis, such that
+        later runs recompute them
+        :param stages: The names of the stages
+        """
+        if any(s in self.manifest for s in stages):
+            for s in stages:
+                self.manifest.pop(s, None)
+            self.save()
+
+    def save(self) -> None:
+        """
+        Writes the manifest, replacing it atomically
+        """
+        if not self.use_cache:
+            return
+        tmp_file = self.manifest_file + f".{os.getpid()}.tmp"
+        with open(tmp_file, "w") as mfile:
+            json.dump(self.manifest, mfile, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+
+
+def _replace_group(h5_file: h5py.File, name: str) -> h5py.Group:
+    """
+    Creates a group in a hdf5 file, removing a group of the same name written by a previous run
+    """
+    if name in h5_file:
+        del h5_file[name]
+    return h5_file.create_group(name)
+
+
+def _worker_init(parser_options: Dict[str, Dict[str, Any]], n_threads: int) -> None:
+    """
+    Initializes a worker process of a process pool
+    :param parser_options: The class level parser options of the parent process
+    :param n_threads: The number of threads tensorflow and numerical libraries may use within the worker
+    """
+    # the used models have very low complexity and are fit faster on the CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+    for var in ["TF_NUM_INTRAOP_THREADS", "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]:
+        os.environ[var] = str(n_threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    fh.set_parser_options(parser_options)
+
+
+def create_process_pool(n_workers: int, n_threads: int = 1):
+    """
+    Creates a pool of worker processes. Workers are spawned rather than forked since tensorflow is not fork-safe
+    :param n_workers: The number of worker processes
+    :param n_threads: The number of threads each worker may use for numerical computations
+    :return: The process pool executor
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_worker_init, initargs=(fh.get_parser_options(), n_threads))
+
+
+def _load_file(file_path: str, prefix: str) -> Tuple[np.ndarray, bool, List]:
+    """
+    Loads one data file, used as task of a process pool
+    """
+    return fh.get_parser(file_path, prefix).load_data()
+
+
+def load_files(file_paths: List[str], prefixes: List[str], n_workers: int = 1) -> List[Tuple[np.ndarray, bool, List]]:
+    """
+    Loads multiple data files, concurrently in worker processes if requested
+    :param file_paths: The paths of the files to load
+    :param prefixes: For each file the prefix used to label columns if the file has no header
+    :param n_workers: The maximal number of files to load concurrently
+    :return: For each file the outputs of the parser's load_data
+    """
+    n_workers = min(n_workers, len(file_paths))
+    if n_workers <= 1:
+        return [_load_file(f, p) for f, p in zip(file_paths, prefixes)]
+    with create_process_pool(n_workers) as pool:
+        return list(pool.map(_load_file, file_paths, prefixes))
+
+
 def load_and_pre_process_data(pred_path: List[str], resp_path: List[str], is_episodic: bool,
-                              downsampling: int) -> Tuple[bool, Any, Any, Any, List[str], List[str]]:
+                              downsampling: int, cache_dir: Optional[str] = None,
+                              n_workers: int = 1, key: Optional[str] = None) -> Tuple[bool, Any, Any, Any, List[str],
+                                                                                       List[str]]:
     """
     Loads and pre-processes predictor and response data for determination of spiking data and interpolation
     :param pred_path: Path to predictor data files
@@ -456,6 +1178,10 @@ def load_and_pre_process_data(pred_path: List[str], resp_path: List[str], is_epi
     :param is_episodic: If true, data is treated as episodic, i.e. each element in pred_path and resp_path
      identifies one episode
     :param downsampling: The downsampling factor that should be applied to the data after interpolation
+    :param cache_dir: If set, preprocessed data is cached in this directory and loaded from there if the input files
+        and preprocessing parameters did not change
+    :param n_workers: The number of processes used to parse episode files concurrently
+    :param key: The preprocessing cache key of the inputs if it was already computed
     :return:
         [0]: Whether data is spiking data (True) or continuous (False)
         [1]: The interpolated predictor data
@@ -464,27 +1190,62 @@ def load_and_pre_process_data(pred_path: List[str], resp_path: List[str], is_epi
         [4]: Predictor names
         [5]: Response names
     """
+    if cache_dir is None:
+        return _parse_and_interpolate(pred_path, resp_path, is_episodic, downsampling, n_workers)
+    if key is None:
+        key = preprocessing_cache_key(pred_path, resp_path, is_episodic, downsampling)
+    cache_file = preprocessing_cache_path(cache_dir, resp_path)
+    cached = load_preprocessing_cache(cache_file, key)
+    if cached is not None:
+        print(f"Loaded preprocessed data from {path.split(cache_file)[1]}", flush=True)
+        return cached
+    result = _parse_and_interpolate(pred_path, resp_path, is_episodic, downsampling, n_workers)
+    save_preprocessing_cache(cache_file, key, *result)
+    return result
+
+
+def _parse_and_interpolate(pred_path: List[str], resp_path: List[str], is_episodic: bool,
+                           downsampling: int, n_workers: int = 1) -> Tuple[bool, Any, Any, Any, List[str], List[str]]:
+    """
+    Parses predictor and response files, determines whether responses are spiking data, interpolates and downsamples.
+    See load_and_pre_process_data for parameters and return values
+    """
     # load data from files
-    resp_data = None
-    pred_data = None
-    resp_data_list = None
-    pred_data_list = None
     if is_episodic:
-        resp_data_list = []
-        pred_data_list = []
-        resp_header, pred_header = None, None
-        for rp, pp in zip(resp_path, pred_path):
-            rda, rhh, rh = fh.CSVParser(rp, "R").load_data()
-            if resp_header is None:
-                resp_header = rh
-            resp_data_list.append(rda)
-            pda, phh, ph = fh.CSVParser(pp, "P").load_data()
-            if pred_header is None:
-                pred_header = ph
-            pred_data_list.append(pda)
+        # episode files are independent and can therefore be parsed concurrently
+        loaded = load_files(list(resp_path) + list(pred_path), ["R"] * len(resp_path) + ["P"] * len(pred_path),
+                            n_workers)
+        resp_data = [ld[0] for ld in loaded[:len(resp_path)]]
+        pred_data = [ld[0] for ld in loaded[len(resp_path):]]
+        resp_header = loaded[0][2]
+        pred_header = loaded[len(resp_path)][2]
     else:
-        resp_data, resp_has_header, resp_header = fh.CSVParser(resp_path[0], "R").load_data()
-        pred_data, pred_has_header, pred_header = fh.CSVParser(pred_path[0], "P").load_data()
+        resp_data, resp_has_header, resp_header = fh.get_parser(resp_path[0], "R").load_data()
+        pred_data, pred_has_header, pred_header = fh.get_parser(pred_path[0], "P").load_data()
+    is_spike_data, ip_pred_data, ip_resp_data, ip_time = preprocess_arrays(pred_data, resp_data, is_episodic,
+                                                                          downsampling)
+    return is_spike_data, ip_pred_data, ip_resp_data, ip_time, pred_header, resp_header
+
+
+def preprocess_arrays(pred_data: Union[np.ndarray, List[np.ndarray]], resp_data: Union[np.ndarray, List[np.ndarray]],
+                      is_episodic: bool, downsampling: int) -> Tuple[bool, Any, Any, Any]:
+    """
+    Determines whether responses are spiking data, interpolates predictors and responses to a common timebase and
+    downsamples
+    :param pred_data: n_timepoints x (1 + n_predictors) matrix with time in the first column or, for episodic data, one
+        such matrix per episode
+    :param resp_data: n_timepoints x (1 + n_responses) matrix with time in the first column or, for episodic data, one
+        such matrix per episode
+    :param is_episodic: Whether data is given per episode
+    :param downsampling: The downsampling factor that should be applied to the data after interpolation
+    :return:
+        [0]: Whether data is spiking data (True) or continuous (False)
+        [1]: The interpolated predictor data
+        [2]: The interpolated response data
+        [3]: The timepoints after interpolation
+    """
+    if is_episodic:
+        pred_data_list, resp_data_list = pred_data, resp_data
 
     # determine if data is likely spiking data or not
     # We use a very simple heuristic to detect spiking data and we will not allow for mixed data. In other words
@@ -541,7 +1302,7 @@ def load_and_pre_process_data(pred_path: List[str], resp_path: List[str], is_epi
                 if ip_time[epix].size < 2:
                     raise MineException(f"The current downsampling factor reduces the data to less than two timepoints"
                                         f" in episode {epix}. Reduce downsampling")
-    return is_spike_data, ip_pred_data, ip_resp_data, ip_time, pred_header, resp_header
+    return is_spike_data, ip_pred_data, ip_resp_data, ip_time
 
 
 def standardize_data(ip_pred_data, ip_resp_data, time_as_pred: bool, is_episodic: bool, is_spike_data: bool):
@@ -586,251 +1347,1170 @@ def standardize_data(ip_pred_data, ip_resp_data, time_as_pred: bool, is_episodic
 
 
 
-def process_paired_files(resp_path: List[str], pred_path: List[str], configuration: Dict):
+def insights_table(mdata: Union[MineData, MineSpikingData], mdata_shuff: Optional[Union[MineData, MineSpikingData]],
+                   predictor_columns: List[str], response_names: List[str], configuration: Dict) -> pd.DataFrame:
+    """
+    Computes the insights of a fit with the analysis thresholds of the run configuration, including barcode clusters
+    and, if many controls per response were fit, permutation p-values
+    :param mdata: The Mine result data
+    :param mdata_shuff: The Mine result data on permutations or None if no shuffles were run
+    :param predictor_columns: The names of the predictors used in the fit
+    :param response_names: The names of the responses that were fit
+    :param configuration: Run configuration which contains the analysis thresholds
+    :return: Dataframe with the insights of each response
+    """
+    test_score_thresh = configuration["config"]["th_test"]
+    is_spike_data = type(mdata) == MineSpikingData
+    interpret_df = generate_insights(mdata, predictor_columns, response_names,
+                                     test_score_thresh=test_score_thresh,
+                                     taylor_sig=configuration["config"]["taylor_sig"],
+                                     taylor_cutoff=configuration["config"]["taylor_cut"],
+                                     lax_thresh=configuration["config"]["th_lax"],
+                                     sqr_thresh=configuration["config"]["th_sqr"])
+    model_scores = mdata.roc_auc_test if is_spike_data else mdata.correlations_test
+    # augment insights with the barcode cluster of each fit response, encoding its barcode as binary number
+    if np.any(model_scores >= test_score_thresh):
+        is_fit = np.array(interpret_df["Fit"] == "Y")
+        barcode = np.array(barcode_clusters(interpret_df[is_fit], predictor_columns)).astype(int)
+        barcode_cluster_numbers = np.full(interpret_df.shape[0], -1, dtype=int)
+        barcode_cluster_numbers[is_fit] = barcode @ (2 ** np.arange(barcode.shape[1]))
+        interpret_df.insert(interpret_df.shape[1], "Barcode cluster", barcode_cluster_numbers)
+    if mdata_shuff is not None:
+        shuffle_scores = mdata_shuff.roc_auc_test if is_spike_data else mdata_shuff.correlations_test
+        if shuffle_scores.ndim > 1:
+            interpret_df.insert(interpret_df.shape[1], "Permutation p-value",
+                                permutation_p_values(model_scores, shuffle_scores))
+    return interpret_df
+
+
+def planned_plots(mdata: Union[MineData, MineSpikingData], mdata_shuff: Optional[Union[MineData, MineSpikingData]],
+                  configuration: Dict) -> List[str]:
+    """
+    Determines which plots are generated for a fit
+    :param mdata: The Mine result data
+    :param mdata_shuff: The Mine result data on permutations or None if no shuffles were run
+    :param configuration: Run configuration which contains the analysis thresholds
+    :return: The names of the plots, each stored as MINE_<name>_<plot>.pdf
+    """
+    is_spike_data = type(mdata) == MineSpikingData
+    model_scores = mdata.roc_auc_test if is_spike_data else mdata.correlations_test
+    any_fit = np.any(model_scores >= configuration["config"]["th_test"])
+    plots = []
+    if any_fit:
+        plots.append("BarcodeUpsetPlot")
+    if mdata_shuff is not None:
+        plots.append("TestMetrics")
+    if configuration["config"]["train_progress"] and mdata.train_progress_data is not None:
+        plots.append("TrainCurve")
+    if any_fit:
+        plots.append("LinearityMetrics")
+    return plots
+
+
+def generate_plots(mdata: Union[MineData, MineSpikingData], mdata_shuff: Optional[Union[MineData, MineSpikingData]],
+                   insight_df: pd.DataFrame, predictor_columns: List[str], configuration: Dict, output_folder: str,
+                   output_file_name: str) -> List[str]:
+    """
+    Generates the plots of a fit
+    :param mdata: The Mine result data
+    :param mdata_shuff: The Mine result data on permutations or None if no shuffles were run
+    :param insight_df: The insights of each response as returned by insights_table
+    :param predictor_columns: The names of the predictors used in the fit
+    :param configuration: Run configuration which contains the analysis thresholds
+    :param output_folder: The folder in which to store the plots
+    :param output_file_name: The name used to label all output files
+    :return: The paths of all written plots
+    """
+    import matplotlib.pyplot as pl
+    test_score_thresh = configuration["config"]["th_test"]
+    written = []
+    for plot in planned_plots(mdata, mdata_shuff, configuration):
+        if plot == "BarcodeUpsetPlot":
+            # plot barcode clusters as upset-plot
+            try:
+                fig, _ = barcode_cluster_plot(insight_df[insight_df["Fit"] == "Y"], predictor_columns)
+            except (AttributeError, ValueError):
+                warn("Did not generate barcode upset plot. Not enough fit groups.", MineWarning)
+                continue
+        elif plot == "TestMetrics":
+            # fraction of above threshold units in data and shuffle versus correlation threshold levels
+            fig = test_metrics_plot(mdata, mdata_shuff, test_score_thresh)
+        elif plot == "TrainCurve":
+            fig = train_curve_plot(mdata)
+        else:
+            # plot linearity metrics and thresholds
+            fig = linearity_metrics_plot(mdata, configuration["config"]["th_lax"], configuration["config"]["th_sqr"])
+        written.append(path.join(output_folder, f"MINE_{output_file_name}_{plot}.pdf"))
+        fig.savefig(written[-1])
+        pl.close(fig)
+    return written
+
+
+def generate_outputs(mdata: Union[MineData, MineSpikingData], mdata_shuff: Optional[Union[MineData, MineSpikingData]],
+                     predictor_columns: List[str], response_names: List[str], configuration: Dict, output_folder: str,
+                     output_file_name: str, writer: Optional[BackgroundWriter] = None,
+                     plots: Optional[bool] = None) -> List[str]:
+    """
+    Generates all outputs that are derived from stored analysis data, i.e., the insights file with barcode clusters,
+    receptive field files and plots. No model fitting is required for these steps.
+    :param mdata: The Mine result data from a fit or reinstantiated from an analysis file
+    :param mdata_shuff: The Mine result data on permutations or None if no shuffles were run
+    :param predictor_columns: The names of the predictors used in the fit
+    :param response_names: The names of the responses that were fit
+    :param configuration: Run configuration which contains analysis thresholds as well as the interpolation time
+        delta and model history of the fit
+    :param output_folder: The folder in which to store outputs
+    :param output_file_name: The name used to label all output files
+    :param writer: If set, tables are written by this background writer, which has to be waited for before the
+        files can be used
+    :param plots: Whether to generate plots. If None, plots are generated unless disabled in the configuration
+    :return: The paths of all written files
+    """
+    written = []
+    if plots is None:
+        plots = configuration["config"].get("plots", True)
+    rf_format = configuration["config"].get("receptive_field_format", "csv")
+    test_score_thresh = configuration["config"]["th_test"]
+    fit_jacobian = configuration["config"]["jacobian"] and mdata.jacobians is not None
+    model_history = configuration["run"]["model_history_frames"]
+    ip_rate = 1 / configuration["run"]["interpolation_time_delta"]
+    is_spike_data = type(mdata) == MineSpikingData
+
+    ###
+    # Output model insights as csv
+    ###
+    interpret_name = f"MINE_{output_file_name}_Insights.csv"
+    interpret_df = insights_table(mdata, mdata_shuff, predictor_columns, response_names, configuration)
+    model_scores = mdata.roc_auc_test if is_spike_data else mdata.correlations_test
+    interpret_df.to_csv(path.join(output_folder, interpret_name), index=False)
+    written.append(path.join(output_folder, interpret_name))
+
+    # save Jacobians if requested by user: One table for each predictor, containing the Jacobians for each response
+    # column headers will be the time delay relative to t=0, since our modeling is set up
+    # such that convolutions are restricted to the past (hence model_history)
+    if fit_jacobian and np.any(model_scores >= test_score_thresh):
+        # NOTE: Jacobians are only computed for responses that passed the test score threshold during
+        # fitting - during re-analysis the threshold might be stricter than during the fit
+        valid = np.logical_and(np.logical_not(np.any(np.isnan(mdata.jacobians), axis=1)),
+                               model_scores >= test_score_thresh)
+        valid_names = [response_names[j] for j in np.flatnonzero(valid)]
+        delays = [f"{time_from_index(t, model_history, ip_rate)}" for t in range(model_history)]
+        for i, pc in enumerate(predictor_columns):
+            # index out the predictor related receptive fields
+            rfs = mdata.jacobians[valid, i*model_history:(i+1)*model_history]
+            rf_args = (path.join(output_folder, f"MINE_{output_file_name}_ReceptiveFields_{pc}"), delays, rfs,
+                       rf_format, valid_names)
+            if writer is None:
+                written.append(write_table(*rf_args))
+            else:
+                writer.submit(write_table, *rf_args)
+                written.append(rf_args[0] + table_formats[rf_format])
+
+    if plots:
+        written += generate_plots(mdata, mdata_shuff, interpret_df, predictor_columns, configuration, output_folder,
+                                  output_file_name)
+    return written
+
+
+def load_analysis_file(filepath: str) -> Tuple[BaseData, Optional[BaseData], List[str], List[str]]:
+    """
+    Loads the results of a previous fit from an analysis file
+    :param filepath: The path to the hdf5 analysis file
+    :return:
+        [0]: The Mine result data
+        [1]: The Mine result data on permutations or None if no shuffles were run
+        [2]: Predictor names
+        [3]: Response names
+    """
+    with h5py.File(filepath, "r") as f:
+        mdata = BaseData.from_hdf5(f["analysis"])
+        if "analysis_shuffled" in f:
+            mdata_shuff = BaseData.from_hdf5(f["analysis_shuffled"])
+        else:
+            mdata_shuff = None
+        name_grp = f["data_names"]
+        predictor_names = [pb[0].decode("utf-8") for pb in name_grp["predictor_names"][()]]
+        response_names = [rb[0].decode("utf-8") for rb in name_grp["response_names"][()]]
+    return mdata, mdata_shuff, predictor_names, response_names
+
+
+def analysis_file_name(analysis_path: str) -> str:
+    """
+    Returns the name used to label the output files of a fit from the path of its analysis file
+    :param analysis_path: The path to the MINE_*_analysis.hdf5 file of the fit
+    :return: The output file name
+    """
+    output_file_name = path.splitext(path.split(analysis_path)[1])[0]
+    if output_file_name.startswith("MINE_"):
+        output_file_name = output_file_name[len("MINE_"):]
+    if output_file_name.endswith("_analysis"):
+        output_file_name = output_file_name[:-len("_analysis")]
+    return output_file_name
+
+
+def plot_from_file(analysis_path: str, configuration: Dict, output_folder: Optional[str] = None) -> List[str]:
+    """
+    Generates the plots of a previous fit from its analysis file
+    :param analysis_path: The path to the MINE_*_analysis.hdf5 file of the fit
+    :param configuration: The run configuration of the fit
+    :param output_folder: The folder in which to store the plots. If None, the folder of the analysis file is used
+    :return: The paths of all written plots
+    """
+    if output_folder is None:
+        output_folder = path.dirname(analysis_path)
+    mdata, mdata_shuff, predictor_columns, response_names = load_analysis_file(analysis_path)
+    insight_df = insights_table(mdata, mdata_shuff, predictor_columns, response_names, configuration)
+    return generate_plots(mdata, mdata_shuff, insight_df, predictor_columns, configuration, output_folder,
+                          analysis_file_name(analysis_path))
+
+
+def _plot_process_main(analysis_path: str, configuration: Dict, output_folder: str) -> None:
+    """
+    Entry point of a background plot process
+    """
+    # lower the priority of plotting such that it does not slow down fits running at the same time
+    if hasattr(os, "nice"):
+        os.nice(10)
+    plot_from_file(analysis_path, configuration, output_folder)
+
+
+@dataclass
+class PlotJob:
+    """
+    The plots of one fit. Jobs are created while processing a file pair and are run by the process coordinating the
+    run, which records the plots in the stage manifest once they were written
+    """
+    analysis_path: str  # the MINE_*_analysis.hdf5 file of the fit
+    configuration: Dict  # the run configuration of the fit
+    output_folder: str  # the folder in which to store the plots
+    files: List[str]  # the paths of the plots that will be generated
+    manifest_file: Optional[str]  # the stage manifest in which to record the plots or None if stages are not cached
+    key: str  # the key of the plots stage
+
+
+def start_plot_process(job: PlotJob) -> multiprocessing.Process:
+    """
+    Generates the plots of a fit from its analysis file in a separate low-priority process such that neither the time
+    nor the memory used for plotting affect model fitting. Processes are spawned rather than forked since tensorflow
+    is not fork-safe, which also keeps matplotlib out of the fitting process
+    :param job: The plots to generate
+    :return: The started process
+    """
+    process = multiprocessing.get_context("spawn").Process(target=_plot_process_main,
+                                                           args=(job.analysis_path, job.configuration,
+                                                                 job.output_folder))
+    process.start()
+    return process
+
+
+def wait_for_plots(processes: List[Tuple[PlotJob, multiprocessing.Process]]) -> None:
+    """
+    Waits for background plot processes to finish and records the plots of successful ones in their stage manifest
+    :param processes: The plot jobs with their processes
+    """
+    if len(processes) > 0:
+        print("Waiting for plots to be generated...", flush=True)
+    for job, process in processes:
+        process.join()
+        if process.exitcode != 0:
+            warn(f"Plot generation failed with exit code {process.exitcode}.", MineWarning)
+        elif job.manifest_file is not None:
+            # plots that could not be generated, e.g. upset plots with too few clusters, are not recorded
+            written = [f for f in job.files if path.isfile(f) and path.getsize(f) > 0]
+            StageCache(job.manifest_file, True).record("plots", job.key, written)
+
+
+def reanalyze_from_file(analysis_path: str, configuration: Dict, output_folder: Optional[str] = None) -> None:
+    """
+    Re-generates insights, barcode clusters, receptive fields and plots of a previous fit with new analysis
+    thresholds, using only the data stored in the analysis file, i.e., without re-fitting any model
+    :param analysis_path: The path to the MINE_*_analysis.hdf5 file of the fit
+    :param configuration: The run configuration of the fit with updated analysis thresholds
+    :param output_folder: The folder in which to store outputs. If None, the folder of the analysis file is used
+    """
     start_time = datetime.datetime.now()
+    if output_folder is None:
+        output_folder = path.dirname(analysis_path)
+    output_file_name = analysis_file_name(analysis_path)
+
+    mdata, mdata_shuff, predictor_columns, response_names = load_analysis_file(analysis_path)
+
+    # Taylor metrics and Jacobians only exist for responses that passed the test score threshold during the fit
+    # so results for responses below that threshold cannot be recovered without re-fitting
+    fit_score_cut = configuration["run"]["fit_score_cut"]
+    if configuration["config"]["th_test"] < fit_score_cut:
+        warn(f"Test score threshold {configuration['config']['th_test']} is below the threshold of {fit_score_cut} "
+             f"used during fitting. Using {fit_score_cut} instead since no Taylor metrics are available for "
+             f"responses below the fit threshold.", MineWarning)
+        configuration["config"]["th_test"] = fit_score_cut
+
+    generate_outputs(mdata, mdata_shuff, predictor_columns, response_names, configuration, output_folder,
+                     output_file_name)
+    # outputs and plots of the fit now reflect the new thresholds, so later runs must not consider them current
+    StageCache(path.join(output_folder, f"MINE_{output_file_name}_stages.json"), True).invalidate(["outputs",
+                                                                                                   "plots"])
+
+    elapsed = datetime.datetime.now() - start_time
+    configuration["run"]["reanalysis_timestamp"] = start_time.isoformat()
+    configuration["run"]["reanalysis_time_elapsed_seconds"] = elapsed.total_seconds()
+    # the run configuration of the fit is kept unchanged such that it records how the models were fit
+    with open(path.join(output_folder, f"MINE_{output_file_name}_reanalysis_config.json"), 'w') as config_file:
+        json.dump(configuration, config_file, indent=2)
+    print(f"#### Re-analysis completed in {elapsed}. ####", flush=True)
 
-    run_shuffle = configuration["config"]["run_shuffle"]
-    time_as_pred = configuration["config"]["use_time"]
-    history_time = configuration["config"]["history"]
-    taylor_look_fraction = configuration["config"]["taylor_look"]
-    miner_train_fraction = configuration["config"]["miner_train_fraction"]
-    test_score_thresh = configuration["config"]["th_test"]
-    fit_jacobian = configuration["config"]["jacobian"]
-    fit_epochs = configuration["config"]["n_epochs"]
-    miner_verbose = configuration["config"]["miner_verbose"]
-    taylor_sig = configuration["config"]["taylor_sig"]
-    lax_thresh = configuration["config"]["th_lax"]
-    sqr_thresh = configuration["config"]["th_sqr"]
-    taylor_cutoff = configuration["config"]["taylor_cut"]
-    downsampling = configuration["config"]["downsampling"]
-    ignore_mem = configuration["config"]["ignore_memory_warning"]
-    train_progress = configuration["config"]["train_progress"]
-    is_episodic = configuration["config"]["episodic"]
 
-    if len(resp_path) != len(pred_path):
-        raise ValueError("Episodic data needs to have the same number of predictor and response files")
+def shard_indices(n_responses: int, shard_index: int, n_shards: int) -> np.ndarray:
+    """
+    Computes which responses belong to a shard when splitting one recording into independently fit blocks
+    :param n_responses: The total number of responses
+    :param shard_index: The index of the shard, 0 <= shard_index < n_shards
+    :param n_shards: The total number of shards
+    :return: The indices of the responses in the shard
+    """
+    if n_shards < 1:
+        raise ValueError("The number of shards has to be at least 1")
+    if shard_index < 0 or shard_index >= n_shards:
+        raise ValueError(f"Shard index has to be between 0 and {n_shards-1} not {shard_index}")
+    indices = np.array_split(np.arange(n_responses), n_shards)[shard_index]
+    if indices.size == 0:
+        raise MineException(f"Shard {shard_index} does not contain any responses. Reduce the number of shards to at "
+                            f"most {n_responses}.")
+    return indices
+
+
+def shard_tag(shard_index: int, n_shards: int) -> str:
+    """
+    Returns the tag appended to output file names of a shard
+    """
+    return f"_shard{shard_index}of{n_shards}"
 
-    # store all output files in a sub-folder of the response file folder - for episodic data we use the first response
-    # file to indicate the storage location, for non-episodic data if response files originate from different locations
-    # the output folders will be placed into those locations
-    output_folder = configuration["run"]["outdir"]
-    # the names of the output files are derived from the names of the corresponding response files, or in case of
-    # episodic data, from the name of the first response file
-    output_file_name = path.splitext(path.split(resp_path[0])[-1])[0]
 
-    is_spike_data, ip_pred_data, ip_resp_data, ip_time, pred_header, resp_header = load_and_pre_process_data(pred_path,
-                                                                                                             resp_path,
-                                                                                                             is_episodic,
-                                                                                                             downsampling)
+def save_analysis_file(filepath: str, mdata: BaseData, mdata_shuff: Optional[BaseData], m_pred: np.ndarray,
+                       s_pred: np.ndarray, m_resp: np.ndarray, s_resp: np.ndarray, predictor_columns: List[str],
+                       response_names: List[str], response_indices: Optional[np.ndarray] = None,
+                       replace: bool = False) -> None:
+    """
+    Saves analysis results, standardizations and data names to an analysis file
+    :param filepath: The path of the hdf5 analysis file
+    :param mdata: The Mine result data
+    :param mdata_shuff: The Mine result data on permutations or None if no shuffles were run
+    :param m_pred: The predictor means used for standardization
+    :param s_pred: The predictor standard deviations used for standardization
+    :param m_resp: The response means used for standardization
+    :param s_resp: The response standard deviations used for standardization
+    :param predictor_columns: The names of the predictors
+    :param response_names: The names of the responses
+    :param response_indices: For shards, the indices of the responses in the full recording
+    :param replace: If true, an existing analysis file is updated replacing only the groups written here, e.g. to keep
+        the results on permutations of a previous run
+    """
+    with h5py.File(filepath, "a" if replace else "w") as ana_file:
+        std_grp = _replace_group(ana_file, "standardization")
+        std_grp.create_dataset("m_pred", data=m_pred)
+        std_grp.create_dataset("s_pred", data=s_pred)
+        std_grp.create_dataset("m_resp", data=m_resp)
+        std_grp.create_dataset("s_resp", data=s_resp)
+        ana_grp = _replace_group(ana_file, "analysis")
+        mdata.save_to_hdf5(ana_grp)
+        if mdata_shuff is not None:
+            ana_grp = _replace_group(ana_file, "analysis_shuffled")
+            mdata_shuff.save_to_hdf5(ana_grp)
+        # save names of predictors and responses in analysis file
+        name_grp = _replace_group(ana_file, "data_names")
+        name_grp.create_dataset("predictor_names", data=np.vstack([str.encode(pc) for pc in predictor_columns]))
+        name_grp.create_dataset("response_names", data=np.vstack([str.encode(rn) for rn in response_names]))
+        if response_indices is not None:
+            name_grp.create_dataset("response_indices", data=response_indices)
+
 
-    if is_spike_data:
-        print("Responses are assumed to contain spikes")
+def _concatenate_optional(items: List[Any]) -> Any:
+    """
+    Concatenates per-shard analysis arrays along the first axis. Taylor predictions of shards in which no response
+    passed the test score threshold are stored as NaN scalars and are skipped
+    """
+    if all(it is None for it in items):
+        return None
+    arrays = [it for it in items if it is not None and np.ndim(it) > 0]
+    if len(arrays) == 0:
+        return np.nan
+    return np.concatenate(arrays, axis=0)
+
+
+def merge_mine_data(shard_data: List[BaseData]) -> BaseData:
+    """
+    Combines the Mine result data of consecutive shards into one result object
+    :param shard_data: List of Mine result data of each shard in shard order
+    :return: Mine result data as if all responses had been fit in one run
+    """
+    if shard_data[0].train_progress_data is not None:
+        train_progress_data = {
+            "train_score_curve": np.vstack([sd.train_progress_data["train_score_curve"] for sd in shard_data]),
+            "test_score_curve": np.vstack([sd.train_progress_data["test_score_curve"] for sd in shard_data]),
+            "cumulative_epochs": shard_data[0].train_progress_data["cumulative_epochs"],
+        }
     else:
-        print("Responses are assumed to be continuous values not spikes")
+        train_progress_data = None
+    shared = dict(
+        taylor_scores=_concatenate_optional([sd.taylor_scores for sd in shard_data]),
+        taylor_true_change=_concatenate_optional([sd.taylor_true_change for sd in shard_data]),
+        taylor_full_prediction=_concatenate_optional([sd.taylor_full_prediction for sd in shard_data]),
+        taylor_by_predictor=_concatenate_optional([sd.taylor_by_predictor for sd in shard_data]),
+        model_lin_approx_scores=_concatenate_optional([sd.model_lin_approx_scores for sd in shard_data]),
+        model_2nd_approx_scores=_concatenate_optional([sd.model_2nd_approx_scores for sd in shard_data]),
+        jacobians=_concatenate_optional([sd.jacobians for sd in shard_data]),
+        hessians=_concatenate_optional([sd.hessians for sd in shard_data]),
+        train_progress_data=train_progress_data
+    )
+    if type(shard_data[0]) == MineSpikingData:
+        return MineSpikingData(roc_auc_trained=np.concatenate([sd.roc_auc_trained for sd in shard_data]),
+                               roc_auc_test=np.concatenate([sd.roc_auc_test for sd in shard_data]),
+                               **shared)
+    return MineData(correlations_trained=np.concatenate([sd.correlations_trained for sd in shard_data]),
+                    correlations_test=np.concatenate([sd.correlations_test for sd in shard_data]),
+                    **shared)
+
+
+def find_shard_files(analysis_files: List[str]) -> Dict[str, List[str]]:
+    """
+    Groups shard analysis files by the run they belong to and sorts them by shard index
+    :param analysis_files: List of shard analysis files
+    :return: Dictionary with the output name of the merged run as key and the sorted list of shard files as value
+    """
+    shard_expr = re.compile(r"^MINE_(.+)_shard(\d+)of(\d+)_analysis\.hdf5$")
+    runs = {}
+    for af in analysis_files:
+        match = shard_expr.match(path.split(af)[1])
+        if match is None:
+            continue
+        name, shard_index, n_shards = match.group(1), int(match.group(2)), int(match.group(3))
+        if name not in runs:
+            runs[name] = {"n_shards": n_shards, "files": {}}
+        if runs[name]["n_shards"] != n_shards:
+            raise MineException(f"Shard files of {name} disagree on the total number of shards")
+        runs[name]["files"][shard_index] = af
+    grouped = {}
+    for name, run in runs.items():
+        missing = [i for i in range(run["n_shards"]) if i not in run["files"]]
+        if len(missing) > 0:
+            raise MineException(f"Cannot merge {name}. Shards {missing} of {run['n_shards']} are missing.")
+        grouped[name] = [run["files"][i] for i in range(run["n_shards"])]
+    return grouped
+
+
+def merge_shards(shard_files: List[str], output_folder: str, output_file_name: str) -> None:
+    """
+    Merges the weight and analysis files of all shards of one run and generates insights and plots as if all
+    responses had been fit in a single run
+    :param shard_files: The analysis files of each shard in shard order
+    :param output_folder: The folder in which to store the merged outputs
+    :param output_file_name: The name used to label all output files
+    """
+    start_time = datetime.datetime.now()
+    shard_data, shard_data_shuff, response_names, response_indices = [], [], [], []
+    m_resp, s_resp = [], []
+    predictor_columns, m_pred, s_pred = None, None, None
+    for sf in shard_files:
+        mdata, mdata_shuff, pn, rn = load_analysis_file(sf)
+        shard_data.append(mdata)
+        shard_data_shuff.append(mdata_shuff)
+        response_names += rn
+        if predictor_columns is None:
+            predictor_columns = pn
+        elif pn != predictor_columns:
+            raise MineException(f"Predictors of shard {sf} do not match predictors of other shards")
+        with h5py.File(sf, "r") as f:
+            response_indices.append(f["data_names"]["response_indices"][()])
+            m_resp.append(f["standardization"]["m_resp"][()])
+            s_resp.append(f["standardization"]["s_resp"][()])
+            if m_pred is None:
+                m_pred = f["standardization"]["m_pred"][()]
+                s_pred = f["standardization"]["s_pred"][()]
+    response_indices = np.concatenate(response_indices)
+    if not np.array_equal(response_indices, np.arange(response_indices.size)):
+        raise MineException("Shard files do not cover all responses of the recording in order")
+    mdata = merge_mine_data(shard_data)
+    # controls are only merged if every shard has them in both its analysis and its weight file
+    shard_weight_files = [sf.replace("_analysis.hdf5", "_weights.hdf5") for sf in shard_files]
+    with_controls = [sds is not None for sds in shard_data_shuff]
+    for i, swf in enumerate(shard_weight_files):
+        with h5py.File(swf, "r") as shard_weights:
+            with_controls[i] = with_controls[i] and "fit_shuffled" in shard_weights
+    if all(with_controls):
+        mdata_shuff = merge_mine_data(shard_data_shuff)
+    else:
+        if any(with_controls):
+            warn("Only some shards contain permuted controls. The merged outputs do not contain controls.",
+                 MineWarning)
+        mdata_shuff = None
+    # continuous response standardizations are stored as row vectors, spiking ones as 1D vectors
+    m_resp = np.concatenate(m_resp, axis=-1)
+    s_resp = np.concatenate(s_resp, axis=-1)
+    save_analysis_file(path.join(output_folder, f"MINE_{output_file_name}_analysis.hdf5"), mdata, mdata_shuff,
+                       m_pred, s_pred, m_resp, s_resp, predictor_columns, response_names)
+
+    # merge model weights renumbering each cell according to its index in the full recording
+    grp_names = ["fit"] if mdata_shuff is None else ["fit", "fit_shuffled"]
+    with h5py.File(path.join(output_folder, f"MINE_{output_file_name}_weights.hdf5"), "w") as weight_file:
+        for grp_name in grp_names:
+            weight_file.create_group(grp_name)
+            offset = 0
+            for swf in shard_weight_files:
+                with h5py.File(swf, "r") as shard_weights:
+                    n_cells = len(shard_weights["response_names"])
+                    for i in range(n_cells):
+                        shard_weights.copy(shard_weights[grp_name][f"cell_{i}_weights"], weight_file[grp_name],
+                                           name=f"cell_{i + offset}_weights")
+                    offset += n_cells
+        name_grp = weight_file.create_group("response_names")
+        for i, r in enumerate(response_names):
+            name_grp.create_dataset(f"{i}", data=r.encode('utf-8'))
 
-    # Save interpolated data with chosen column names if verbose flag is set
-    if miner_verbose:
-        if not is_episodic:
-            df_ip_resp_data = pd.DataFrame(ip_resp_data, columns=resp_header)
-            df_ip_resp_data.to_csv(path.join(output_folder, f"MINE_{output_file_name}_interpolated_responses.csv"), index=False)
-            df_ip_pred_data = pd.DataFrame(ip_pred_data, columns=pred_header)
-            df_ip_pred_data.to_csv(path.join(output_folder, f"MINE_{output_file_name}_interpolated_predictors.csv"), index=False)
-        else:
-            # save one csv file with interpolated data for each episode
-            for i, (iprd, ippd) in enumerate(zip(ip_resp_data, ip_pred_data)):
-                df_ip_resp_data = pd.DataFrame(iprd, columns=resp_header)
-                df_ip_resp_data.to_csv(path.join(output_folder, f"MINE_{output_file_name}_interpolated_responses_ep{i:03d}.csv"),
-                                       index=False)
-                df_ip_pred_data = pd.DataFrame(ippd, columns=pred_header)
-                df_ip_pred_data.to_csv(path.join(output_folder, f"MINE_{output_file_name}_interpolated_predictors_ep{i:03d}.csv"),
-                                       index=False)
+    # combine run configurations - since shards are fit independently their run-times are summed
+    configurations = []
+    for sf in shard_files:
+        with open(sf.replace("_analysis.hdf5", "_run_config.json")) as config_file:
+            configurations.append(json.load(config_file))
+    configuration = configurations[0]
+    del configuration["run"]["shard"]
+    configuration["run"]["outdir"] = output_folder
+    configuration["run"]["merged_shards"] = shard_files
+    configuration["run"]["time_elapsed_seconds"] = sum([c["run"]["time_elapsed_seconds"] for c in configurations])
+
+    generate_outputs(mdata, mdata_shuff, predictor_columns, response_names, configuration, output_folder,
+                     output_file_name)
+    # the merged files replace those of any unsharded run of the same recording in the output folder
+    StageCache(path.join(output_folder, f"MINE_{output_file_name}_stages.json"), True).invalidate(["fit", "shuffle",
+                                                                                                   "outputs", "plots"])
+
+    configuration["run"]["merge_time_elapsed_seconds"] = (datetime.datetime.now() - start_time).total_seconds()
+    with open(path.join(output_folder, f"MINE_{output_file_name}_run_config.json"), 'w') as config_file:
+        json.dump(configuration, config_file, indent=2)
+    print(f"#### Merged {len(shard_files)} shards of {output_file_name}. ####", flush=True)
 
-    mine_pred, mine_resp, m_pred, s_pred, m_resp, s_resp = standardize_data(ip_pred_data, ip_resp_data, time_as_pred,
-                                                                            is_episodic, is_spike_data)
 
+def derive_run_parameters(ip_time: Union[np.ndarray, List[np.ndarray]], is_episodic: bool, is_spike_data: bool,
+                          n_predictors: int, configuration: Dict) -> Tuple[int, int]:
+    """
+    Derives the frame based fit parameters from the interpolated timebase and stores them in the run section of the
+    configuration
+    :param ip_time: The timepoints after interpolation (list of episodes for episodic data)
+    :param is_episodic: Whether data is episodic
+    :param is_spike_data: Whether data is spiking data
+    :param n_predictors: The number of predictors
+    :param configuration: The run configuration, updated in place
+    :return:
+        [0]: The number of frames in the model history
+        [1]: The number of frames the Taylor expansion predicts ahead
+    """
     if not is_episodic:
         configuration["run"]["interpolation_time_delta"] = np.mean(np.diff(ip_time))
     else:
         configuration["run"]["interpolation_time_delta"] = np.mean(np.diff(ip_time[0]))
     configuration["run"]["is_spike_data"] = is_spike_data
-    configuration["run"]["n_predictors"] = len(mine_pred)
+    configuration["run"]["n_predictors"] = n_predictors
 
     # compute our "frame rate", i.e. frames per time-unit on the interpolated scale
-    if not is_episodic:
-        ip_rate = 1 / np.mean(np.diff(ip_time))
-    else:
-        ip_rate = 1 / np.mean(np.diff(ip_time[0]))
+    ip_rate = 1 / configuration["run"]["interpolation_time_delta"]
 
     # based on the rate, compute the number of frames within the model history and taylor-look-ahead
-    model_history = int(np.round(history_time * ip_rate, 0))
+    model_history = int(np.round(configuration["config"]["history"] * ip_rate, 0))
     if model_history < 1:
         model_history = 1
     configuration["run"]["model_history_frames"] = model_history
-    taylor_look_ahead = int(np.round(model_history * taylor_look_fraction, 0))
+    # store the test score threshold of the fit since Taylor metrics will only be available for responses above it
+    configuration["run"]["fit_score_cut"] = configuration["config"]["th_test"]
+    taylor_look_ahead = int(np.round(model_history * configuration["config"]["taylor_look"], 0))
     if taylor_look_ahead < 1:
         taylor_look_ahead = 1
+    return model_history, taylor_look_ahead
+
 
+def plan_fit_memory(ip_time: Union[np.ndarray, List[np.ndarray]], is_episodic: bool, n_predictors: int,
+                    mine_resp: Union[np.ndarray, List[np.ndarray]], model_history: int, configuration: Dict,
+                    verbose: bool = True) -> bool:
+    """
+    Plans the memory of a fit, chooses the Taylor expansion chunk size and streaming mode and stores them in the run
+    section of the configuration
+    :param ip_time: The timepoints after interpolation (list of episodes for episodic data)
+    :param is_episodic: Whether data is episodic
+    :param n_predictors: The number of predictors
+    :param mine_resp: The standardized responses (list of episodes for episodic data)
+    :param model_history: The number of frames in the model history
+    :param configuration: The run configuration, updated in place
+    :param verbose: If true, the memory plan is printed and a warning is given if little training data is available
+    :return: True if the peak memory of the fit is within the memory budget
+    """
+    episode_lengths = [ipt.size for ipt in ip_time] if is_episodic else [ip_time.size]
+    # Warn the user if there is a very small amount of training data available
+    if verbose and sum(episode_lengths) - model_history < 10:
+        warn("There are less than 10 datapoints available for training. Training will likely fail.", MineWarning)
+
+    # model the memory required by each stage of the fit and plan how to fit it into the memory budget
+    n_responses = mine_resp[0].shape[0] if is_episodic else mine_resp.shape[0]
+    memory_plan = plan_memory(episode_lengths, n_predictors, n_responses, model_history, configuration)
+    if verbose:
+        print_memory_plan(memory_plan)
+    if configuration["config"].get("apply_memory_plan", False):
+        taylor_chunk_size = memory_plan["taylor_chunk_size"]
+        stream_training_data = memory_plan["stream_training_data"]
+        peak_memory = memory_plan["planned_peak"]
+    else:
+        taylor_chunk_size, stream_training_data = 64, False
+        peak_memory = memory_plan["peak"]
+    configuration["run"]["memory_plan"] = {"peak_memory_gb": peak_memory / 1024**3,
+                                           "taylor_chunk_size": taylor_chunk_size,
+                                           "stream_training_data": stream_training_data}
+    return peak_memory <= memory_plan["budget"]
+
+
+def _create_miner(model_history: int, taylor_look_ahead: int, is_spike_data: bool, configuration: Dict,
+                  analyze: bool) -> Mine:
+    """
+    Creates a Mine object with the parameters of the run configuration
+    :param analyze: If false, the object only fits and scores models without computing any Taylor information
+    """
+    memory_plan = configuration["run"].get("memory_plan", {})
     # Set taylor_pred_every based on history length, in other words we will perform taylor prediction starting from
     # frames that are "model_history" apart, since tighter analysis likely won't yield more information due to
     # correlations induced by the model input convolution
-    taylor_pred_every = model_history
+    miner = Mine(configuration["config"]["miner_train_fraction"], model_history, configuration["config"]["th_test"],
+                 analyze, analyze and configuration["config"]["jacobian"], taylor_look_ahead, model_history,
+                 fit_spikes=is_spike_data)
+    if analyze:
+        miner.train_progress = configuration["config"]["train_progress"]
+        miner.taylor_chunk_size = memory_plan.get("taylor_chunk_size", 64)
+    miner.stream_training_data = memory_plan.get("stream_training_data", False)
+    miner.n_epochs = configuration["config"]["n_epochs"]
+    miner.verbose = configuration["config"]["miner_verbose"]
+    return miner
+
+
+def fit_models(mine_pred: Union[List[np.ndarray], List[List[np.ndarray]]],
+               mine_resp: Union[np.ndarray, List[np.ndarray]], is_episodic: bool, is_spike_data: bool,
+               model_history: int, taylor_look_ahead: int, configuration: Dict,
+               weight_store: Optional[Union[h5py.File, h5py.Group]] = None,
+               shuffle_weight_store: Optional[Union[h5py.File, h5py.Group]] = None) -> Tuple[BaseData,
+                                                                                            Optional[BaseData]]:
+    """
+    Fits and analyzes a model for each response. If the configuration requests jointly fit controls, circularly
+    permuted controls of each response are fit in the same pass
+    :param mine_pred: The standardized predictors (list of episodes for episodic data)
+    :param mine_resp: The standardized responses (list of episodes for episodic data)
+    :param is_episodic: Whether data is episodic
+    :param is_spike_data: Whether data is spiking data
+    :param model_history: The number of frames in the model history
+    :param taylor_look_ahead: The number of frames the Taylor expansion predicts ahead
+    :param configuration: The run configuration
+    :param weight_store: If set, hdf5 file or group receiving the weights of each model
+    :param shuffle_weight_store: If set, hdf5 file or group receiving the weights of the jointly fit controls
+    :return:
+        [0]: The Mine result data
+        [1]: The Mine result data on jointly fit controls or None
+    """
+    miner = _create_miner(model_history, taylor_look_ahead, is_spike_data, configuration, True)
+    miner.model_weight_store = weight_store
+    if configuration["config"]["run_shuffle"] and configuration["config"].get("joint_shuffle", False):
+        n_shuffles = configuration["config"].get("n_shuffles", 1)
+        print(f"#### FITTING {n_shuffles} PERMUTED CONTROLS (SHUFFLES) JOINTLY WITH EACH RESPONSE ####", flush=True)
+        # controls are only scored, their stacked models are stored separately from the models of the responses
+        miner.shuffle_weight_store = shuffle_weight_store
+        rolls = permutation_rolls(mine_resp, is_episodic, n_shuffles)
+        if not is_episodic:
+            return miner.analyze_data_with_shuffles(mine_pred, mine_resp, rolls)
+        return miner.analyze_episodic_with_shuffles(mine_pred, mine_resp, rolls)
+    if not is_episodic:
+        return miner.analyze_data(mine_pred, mine_resp), None
+    return miner.analyze_episodic(mine_pred, mine_resp), None
 
-    # Warn the user if there is a very small amount of training data available
+
+def fit_controls(mine_pred: Union[List[np.ndarray], List[List[np.ndarray]]],
+                 mine_resp: Union[np.ndarray, List[np.ndarray]], is_episodic: bool, is_spike_data: bool,
+                 model_history: int, taylor_look_ahead: int, configuration: Dict,
+                 weight_store: Optional[Union[h5py.File, h5py.Group]] = None) -> BaseData:
+    """
+    Rotates each response and re-fits without computing any Taylor information to get test scores of controls. See
+    fit_models for parameters
+    :return: The Mine result data on permutations
+    """
+    n_shuffles = configuration["config"].get("n_shuffles", 1)
+    miner = _create_miner(model_history, taylor_look_ahead, is_spike_data, configuration, False)
+    miner.model_weight_store = weight_store
+    if n_shuffles > 1:
+        # fit many rotations of each response jointly to obtain null distributions of test scores
+        print(f"#### RUNNING {n_shuffles} PERMUTED CONTROLS (SHUFFLES) PER RESPONSE ####", flush=True)
+        rolls = permutation_rolls(mine_resp, is_episodic, n_shuffles)
+        if not is_episodic:
+            return miner.analyze_shuffles(mine_pred, mine_resp, rolls)
+        return miner.analyze_episodic_shuffles(mine_pred, mine_resp, rolls)
+    print("#### RUNNING PERMUTED CONTROL DATA (SHUFFLES) ####", flush=True)
+    rolls = permutation_rolls(mine_resp, is_episodic, 1)
     if not is_episodic:
-        if ip_time.size - model_history < 10:
-            warn("There are less than 10 datapoints available for training. Training will likely fail.", MineWarning)
-    else:
-        if sum([ipt.size for ipt in ip_time]) - model_history < 10:
-            warn("There are less than 10 datapoints available for training. Training will likely fail.", MineWarning)
+        return miner.analyze_data(mine_pred, roll_2d_array(mine_resp, rolls[:, 0]))
+    return miner.analyze_episodic(mine_pred, [roll_2d_array(mr, r[:, 0]) for mr, r in zip(mine_resp, rolls)])
 
-    if mem_threshold_warn(ip_pred_data, model_history, is_episodic) and (not ignore_mem):
-        print("### EXITING PROGRAM ###")
-        print("### Either reduce memory by downsampling or set 'Force Run with Memory Warning' in GUI/pass -imw flag on command line, which will force the run to continue.")
-        print("If multiple files were chosen as inputs, processing of other files will continue.")
-        return
 
-    # Fit model
-    mdata_shuff = None
-    weight_file_name = f"MINE_{output_file_name}_weights.hdf5"
-    with h5py.File(path.join(output_folder, weight_file_name), "w") as weight_file:
-        w_grp = weight_file.create_group("fit")
-        miner = Mine(miner_train_fraction, model_history, test_score_thresh, True, fit_jacobian,
-                     taylor_look_ahead, taylor_pred_every, fit_spikes=is_spike_data)
-        miner.train_progress = train_progress
-        miner.n_epochs = fit_epochs
-        miner.verbose = miner_verbose
-        miner.model_weight_store = w_grp
+def process_paired_files(resp_path: List[str], pred_path: List[str],
+                         configuration: Dict) -> Optional[PlotJob]:
+    """
+    Fits and analyzes one pair of response and predictor files (one pair per episode for episodic data). Processing
+    runs as a sequence of stages: preprocessing, saving interpolated data, standardization, model fitting, fitting of
+    permuted controls, output generation and plotting. Outputs of the stages are reused by later runs in the same
+    output folder as long as their inputs and parameters did not change (see StageCache)
+    :param resp_path: Path to response data files
+    :param pred_path: Path to predictor data files
+    :param configuration: The run configuration
+    :return: The plots to generate in the background or None if no plots are generated
+    """
+    import pandas as pd
+    start_time = datetime.datetime.now()
+
+    run_shuffle = configuration["config"]["run_shuffle"]
+    n_shuffles = configuration["config"].get("n_shuffles", 1)
+    joint_shuffle = run_shuffle and configuration["config"].get("joint_shuffle", False)
+    time_as_pred = configuration["config"]["use_time"]
+    miner_verbose = configuration["config"]["miner_verbose"]
+    downsampling = configuration["config"]["downsampling"]
+    ignore_mem = configuration["config"]["ignore_memory_warning"]
+    is_episodic = configuration["config"]["episodic"]
+    preprocessing_cache = configuration["config"].get("preprocessing_cache", False)
+    stage_cache = configuration["config"].get("stage_cache", False)
+    n_workers = configuration["config"].get("n_workers", 1)
+    plots = configuration["config"].get("plots", True)
+
+    if len(resp_path) != len(pred_path):
+        raise ValueError("Episodic data needs to have the same number of predictor and response files")
+
+    # store all output files in a sub-folder of the response file folder - for episodic data we use the first response
+    # file to indicate the storage location, for non-episodic data if response files originate from different locations
+    # the output folders will be placed into those locations
+    output_folder = configuration["run"]["outdir"]
+    # the names of the output files are derived from the names of the corresponding response files, or in case of
+    # episodic data, from the name of the first response file
+    output_file_name = path.splitext(path.split(resp_path[0])[-1])[0]
+    # when running one shard of a larger job only the responses within the shard are fit - their original indices
+    # are stored such that the outputs of all shards can later be merged as if they originated from a single run
+    shard = configuration["run"].get("shard", None)
+    if shard is not None:
+        output_file_name = output_file_name + shard_tag(*shard)
+    weight_file = path.join(output_folder, f"MINE_{output_file_name}_weights.hdf5")
+    analysis_file = path.join(output_folder, f"MINE_{output_file_name}_analysis.hdf5")
+    stages = StageCache(path.join(output_folder, f"MINE_{output_file_name}_stages.json"), stage_cache)
+
+    # Stage: preprocessing - the contents of the input files identify all results derived from them
+    if preprocessing_cache or stage_cache:
+        input_key = preprocessing_cache_key(pred_path, resp_path, is_episodic, downsampling)
+    else:
+        # without caches the inputs are not hashed and no stage outputs will be reused
+        input_key = stage_key({"uncached": start_time.isoformat()}, [])
+    is_spike_data, ip_pred_data, ip_resp_data, ip_time, pred_header, resp_header = stages.timed(
+        "preprocessing", lambda: load_and_pre_process_data(pred_path, resp_path, is_episodic, downsampling,
+                                                           output_folder if preprocessing_cache else None, n_workers,
+                                                           key=input_key))
+
+    response_indices = None
+    if shard is not None:
+        shard_index, n_shards = shard
+        response_indices = shard_indices(len(resp_header) - 1, shard_index, n_shards)
+        keep_columns = np.r_[0, response_indices + 1]  # the first column is time
         if not is_episodic:
-            mdata = miner.analyze_data(mine_pred, mine_resp)
+            ip_resp_data = ip_resp_data[:, keep_columns]
         else:
-            mdata = miner.analyze_episodic(mine_pred, mine_resp)
-        # save neuron names
-        name_grp = weight_file.create_group("response_names")
-        for i, r in enumerate(resp_header[1:]):  # first entry is "Time"
-            name_grp.create_dataset(f"{i}", data=r.encode('utf-8'))
+            ip_resp_data = [iprd[:, keep_columns] for iprd in ip_resp_data]
+        resp_header = [resp_header[k] for k in keep_columns]
+        print(f"Processing shard {shard_index} of {n_shards} with responses {response_indices[0]} to "
+              f"{response_indices[-1]}", flush=True)
+    data_key = stage_key({"shard": shard}, [input_key])
 
-    # rotate mine_resp on user request and re-fit without computing any Taylor information to get test correlations
-    if run_shuffle:
-        print("#### RUNNING PERMUTED CONTROL DATA (SHUFFLES) ####", flush=True)
+    if is_spike_data:
+        print("Responses are assumed to contain spikes")
+    else:
+        print("Responses are assumed to be continuous values not spikes")
+
+    # Stage: interpolated data - save interpolated data with chosen column names if verbose flag is set. Files are
+    # written in the background while models are fit
+    writer = BackgroundWriter()
+    interpolated_format = configuration["config"].get("interpolated_format", "csv")
+
+    def save_interpolated() -> Tuple[None, List[str]]:
         if not is_episodic:
-            roll_max = (mine_resp.shape[
-                            1] * 3) // 4  # maximally permute by circularly moving data forward 3/4 of the length
-            roll_min = mine_resp.shape[1] // 4  # minimally permute by circularly moving data forward 1/4 of the length
-            rolls = np.random.randint(low=roll_min, high=roll_max, size=mine_resp.shape[0])
-            mine_resp_shuff = roll_2d_array(mine_resp, rolls)
+            tables = [("responses", ip_resp_data, resp_header), ("predictors", ip_pred_data, pred_header)]
         else:
-            mine_resp_shuff = []
-            for mr in mine_resp:
-                roll_max = (mr.shape[1] * 3) // 4
-                roll_min = mr.shape[1] // 4
-                rolls = np.random.randint(low=roll_min, high=roll_max, size=mr.shape[0])
-                mine_resp_shuff.append(roll_2d_array(mr, rolls))
-        with h5py.File(path.join(output_folder, weight_file_name), "a") as weight_file:
-            w_grp = weight_file.create_group("fit_shuffled")
-            miner = Mine(miner_train_fraction, model_history, test_score_thresh, False, False,
-                         taylor_look_ahead, taylor_pred_every, fit_spikes=is_spike_data)
-            miner.n_epochs = fit_epochs
-            miner.verbose = miner_verbose
-            miner.model_weight_store = w_grp
-            if not is_episodic:
-                mdata_shuff = miner.analyze_data(mine_pred, mine_resp_shuff)
-            else:
-                mdata_shuff = miner.analyze_episodic(mine_pred, mine_resp_shuff)
-
-    # save full analysis results (and results of shuffle if it was requested) to file
-    full_ana_file_name = f"MINE_{output_file_name}_analysis.hdf5"
-    with h5py.File(path.join(output_folder, full_ana_file_name), "w") as ana_file:
-        std_grp = ana_file.create_group("standardization")
-        std_grp.create_dataset("m_pred", data=m_pred)
-        std_grp.create_dataset("s_pred", data=s_pred)
-        std_grp.create_dataset("m_resp", data=m_resp)
-        std_grp.create_dataset("s_resp", data=s_resp)
-        ana_grp = ana_file.create_group("analysis")
-        mdata.save_to_hdf5(ana_grp)
-        if mdata_shuff is not None:
-            ana_grp = ana_file.create_group("analysis_shuffled")
-            mdata_shuff.save_to_hdf5(ana_grp)
-        # save names of predictors and responses in analysis file
-        name_grp = ana_file.create_group("data_names")
-        predictor_columns = pred_header if time_as_pred else pred_header[1:]
-        response_names = resp_header[1:]
-        name_grp.create_dataset("predictor_names", data=np.vstack([str.encode(pc) for pc in predictor_columns]))
-        name_grp.create_dataset("response_names", data=np.vstack([str.encode(rn) for rn in response_names]))
+            # save one file with interpolated data for each episode
+            tables = []
+            for i, (iprd, ippd) in enumerate(zip(ip_resp_data, ip_pred_data)):
+                tables += [(f"responses_ep{i:03d}", iprd, resp_header), (f"predictors_ep{i:03d}", ippd, pred_header)]
+        written = []
+        for name, data, header in tables:
+            file_base = path.join(output_folder, f"MINE_{output_file_name}_interpolated_{name}")
+            writer.submit(write_table, file_base, header, data, interpolated_format)
+            written.append(file_base + table_formats[interpolated_format])
+        return None, written
 
-    ###
-    # Output model insights as csv
-    ###
-    interpret_name = f"MINE_{output_file_name}_Insights.csv"
-    interpret_df = generate_insights(mdata, predictor_columns, response_names,
-                                     test_score_thresh=test_score_thresh,
-                                     taylor_sig=taylor_sig,
-                                     taylor_cutoff=taylor_cutoff,
-                                     lax_thresh=lax_thresh,
-                                     sqr_thresh=sqr_thresh)
-    model_scores = mdata.roc_auc_test if is_spike_data else mdata.correlations_test
-    # perform barcode clustering - store in insight file and as upset-plot
-    if np.any(model_scores >= test_score_thresh):
-        try:
-            fig, df_barcode = barcode_cluster_plot(interpret_df[interpret_df["Fit"] == "Y"], predictor_columns)
-            fig.savefig(path.join(output_folder, f"MINE_{output_file_name}_BarcodeUpsetPlot.pdf"))
-
-            # augment insights with barcodes and save
-            barcode_cluster_numbers = np.full(interpret_df.shape[0], -1, dtype=int)
-            fit_ix = np.arange(interpret_df.shape[0]).astype(int)[interpret_df["Fit"] == "Y"]
-            for i, fix in enumerate(fit_ix):
-                barcode = np.array(df_barcode.iloc[i]).astype(int)
-                barcode_cluster_numbers[fix] = sum([bc*(2**j) for j, bc in enumerate(barcode)])
-            interpret_df.insert(interpret_df.shape[1], "Barcode cluster", barcode_cluster_numbers)
-        except (AttributeError, ValueError):
-            warn("Did not generate barcode upset plot. Not enough fit groups.", MineWarning)
-    interpret_df.to_csv(path.join(output_folder, interpret_name), index=False)
+    if miner_verbose:
+        stages.run("interpolated_data", stage_key({"format": interpolated_format}, [data_key]), save_interpolated)
+
+    # Stage: standardization
+    mine_pred, mine_resp, m_pred, s_pred, m_resp, s_resp = stages.timed(
+        "standardization", lambda: standardize_data(ip_pred_data, ip_resp_data, time_as_pred, is_episodic,
+                                                    is_spike_data))
+
+    model_history, taylor_look_ahead = derive_run_parameters(ip_time, is_episodic, is_spike_data, len(mine_pred),
+                                                             configuration)
+
+    # the parameters that change the results of the model fits
+    fit_key = stage_key({k: configuration["config"][k] for k in ["use_time", "history", "taylor_look",
+                                                                 "miner_train_fraction", "th_test", "jacobian",
+                                                                 "n_epochs", "train_progress"]} |
+                        {"joint_shuffles": n_shuffles if joint_shuffle else 0}, [data_key])
+    shuffle_key = None
+    if run_shuffle and not joint_shuffle:
+        shuffle_key = stage_key({k: configuration["config"][k] for k in ["use_time", "history",
+                                                                         "miner_train_fraction", "n_epochs"]} |
+                                {"n_shuffles": n_shuffles}, [data_key])
+    need_fit = not stages.is_current("fit", fit_key) or (shuffle_key is not None and
+                                                         not stages.is_current("shuffle", shuffle_key))
+
+    fits_budget = plan_fit_memory(ip_time, is_episodic, len(mine_pred), mine_resp, model_history, configuration,
+                                  verbose=need_fit)
+    if need_fit and not fits_budget and (not ignore_mem):
+        writer.close()
+        print("### EXITING PROGRAM ###")
+        print("### Either apply the memory plan (-amp), reduce memory by downsampling or set 'Force Run with Memory Warning' in GUI/pass -imw flag on command line, which will force the run to continue.")
+        print("If multiple files were chosen as inputs, processing of other files will continue.")
+        return
 
-    # save Jacobians if requested by user: One CSV file for each predictor, containing the Jacobians for each response
-    # column headers will be the time delay relative to t=0, since our modeling is set up
-    # such that convolutions are restricted to the past (hence model_history)
-    n_objects = model_scores.size
-    if fit_jacobian and np.any(model_scores >= test_score_thresh):
-        for i, pc in enumerate(predictor_columns):
-            jac_dict = {"Response": []} | {f"{time_from_index(t, model_history, ip_rate)}": [] for t in range(model_history)}
-            jac_file_name = f"MINE_{output_file_name}_ReceptiveFields_{pc}.csv"
-            for j in range(n_objects):
-                if np.any(np.isnan(mdata.jacobians[j, :])):
-                    continue
-                response = resp_header[j + 1]  # because resp_header still contains the first "time" column
-                jac_dict["Response"].append(response)
-                # index out the predictor related receptive field
-                rf = mdata.jacobians[j, i*model_history:(i+1)*model_history]
-                for t in range(model_history):
-                    jac_dict[f"{time_from_index(t, model_history, ip_rate)}"].append(rf[t])
-            df_jac = pd.DataFrame(jac_dict)
-            df_jac.to_csv(path.join(output_folder, jac_file_name), index=False)
-
-    # if shuffles were calculated plot fraction of above threshold units in data and shuffle
-    # versus correlation threshold levels
-    if run_shuffle:
-        fig = test_metrics_plot(mdata, mdata_shuff, test_score_thresh)
-        fig.savefig(path.join(output_folder, f"MINE_{output_file_name}_TestMetrics.pdf"))
-
-    if train_progress:
-        fig = train_curve_plot(mdata)
-        fig.savefig(path.join(output_folder, f"MINE_{output_file_name}_TrainCurve.pdf"))
-
-    # plot linearity metrics and thresholds
-    if np.any(model_scores >= test_score_thresh):
-        fig = linearity_metrics_plot(mdata, lax_thresh, sqr_thresh)
-        fig.savefig(path.join(output_folder, f"MINE_{output_file_name}_LinearityMetrics.pdf"))
+    predictor_columns = pred_header if time_as_pred else pred_header[1:]
+    response_names = resp_header[1:]
+
+    # Stage: fit - fit model and, if controls are fit jointly, the permuted controls. Results are saved to the
+    # analysis file, replacing only the groups of this stage such that the results of other stages are kept
+    def fit() -> Tuple[Tuple, List[str]]:
+        with h5py.File(weight_file, "a") as w_file:
+            mdata, mdata_joint = fit_models(mine_pred, mine_resp, is_episodic, is_spike_data, model_history,
+                                            taylor_look_ahead, configuration, _replace_group(w_file, "fit"),
+                                            _replace_group(w_file, "fit_shuffled") if joint_shuffle else None)
+            # save neuron names
+            name_grp = _replace_group(w_file, "response_names")
+            for i, r in enumerate(response_names):
+                name_grp.create_dataset(f"{i}", data=r.encode('utf-8'))
+        save_analysis_file(analysis_file, mdata, mdata_joint, m_pred, s_pred, m_resp, s_resp, predictor_columns,
+                           response_names, response_indices, replace=True)
+        return (mdata, mdata_joint), [weight_file, analysis_file]
+
+    def load_fit() -> Tuple:
+        with h5py.File(analysis_file, "r") as ana_file:
+            mdata = BaseData.from_hdf5(ana_file["analysis"])
+            mdata_joint = BaseData.from_hdf5(ana_file["analysis_shuffled"]) if joint_shuffle else None
+        return mdata, mdata_joint
+
+    mdata, mdata_shuff = stages.run("fit", fit_key, fit, load_fit, deterministic=False)
+
+    # Stage: shuffle - rotate mine_resp on user request and re-fit without computing any Taylor information to get
+    # test correlations
+    def fit_shuffles() -> Tuple[BaseData, List[str]]:
+        with h5py.File(weight_file, "a") as w_file:
+            mdata_s = fit_controls(mine_pred, mine_resp, is_episodic, is_spike_data, model_history, taylor_look_ahead,
+                                   configuration, _replace_group(w_file, "fit_shuffled"))
+        with h5py.File(analysis_file, "a") as ana_file:
+            mdata_s.save_to_hdf5(_replace_group(ana_file, "analysis_shuffled"))
+        return mdata_s, [weight_file, analysis_file]
+
+    def load_shuffles() -> BaseData:
+        with h5py.File(analysis_file, "r") as ana_file:
+            return BaseData.from_hdf5(ana_file["analysis_shuffled"])
+
+    if shuffle_key is not None:
+        mdata_shuff = stages.run("shuffle", shuffle_key, fit_shuffles, load_shuffles, deterministic=False)
+    elif not run_shuffle:
+        # remove controls a previous run in the same folder might have stored
+        for file_name, group in [(weight_file, "fit_shuffled"), (analysis_file, "analysis_shuffled")]:
+            with h5py.File(file_name, "a") as h5_file:
+                if group in h5_file:
+                    del h5_file[group]
+
+    # Stage: outputs - insights, receptive fields and plots depend on the fits and the analysis thresholds
+    if shard is None:
+        output_key = stage_key({k: configuration["config"][k] for k in ["th_test", "taylor_sig", "taylor_cut",
+                                                                        "th_lax", "th_sqr", "jacobian",
+                                                                        "train_progress"]} |
+                               {"receptive_field_format": configuration["config"].get("receptive_field_format",
+                                                                                      "csv")},
+                               [stages.result("fit"), "none" if shuffle_key is None else stages.result("shuffle")])
+        stages.run("outputs", output_key, lambda: (None, generate_outputs(mdata, mdata_shuff, predictor_columns,
+                                                                          response_names, configuration,
+                                                                          output_folder, output_file_name,
+                                                                          writer, plots=False)))
+    else:
+        print("Insights and plots will be generated once all shards are merged.", flush=True)
+    stages.timed("writing outputs", writer.close)
+
+    # Stage: plots - generated from the analysis file by a background process while the next files are processed.
+    # The stage is recorded by the process waiting for the plots once they were written
+    plot_job = None
+    if shard is None and plots:
+        plots_key = stage_key({}, [stages.result("outputs")])
+        if stages.is_current("plots", plots_key):
+            print("Stage 'plots' is unchanged. Using outputs of previous run.", flush=True)
+            stages.log["plots"] = {"cached": True, "time_seconds": 0.0}
+        else:
+            files = [path.join(output_folder, f"MINE_{output_file_name}_{p}.pdf")
+                     for p in planned_plots(mdata, mdata_shuff, configuration)]
+            plot_job = PlotJob(analysis_file, configuration, output_folder, files,
+                               stages.manifest_file if stage_cache else None, plots_key)
 
     # compute elapsed time across all data processing
     end_time = datetime.datetime.now()
     elapsed = end_time - start_time
-    # add elapsed time to configuration
+    # add elapsed time and the time spent in each stage to configuration
     configuration["run"]["time_elapsed_seconds"] = elapsed.total_seconds()
+    configuration["run"]["stages"] = stages.log
     # Save configuration to file
     with open(path.join(output_folder, f"MINE_{output_file_name}_run_config.json"), 'w') as config_file:
         json.dump(configuration, config_file, indent=2)
     # Print elapsed time to command line
     print(f"#### Analysis completed in {elapsed}. ####", flush=True)
+    return plot_job
+
+
+@dataclass
+class MineResult:
+    """
+    Results of fitting MINE on data held in memory (see analyze_arrays)
+    """
+    mdata: BaseData  # the Mine result data
+    mdata_shuff: Optional[BaseData]  # the Mine result data on permutations or None if no shuffles were run
+    insights: pd.DataFrame  # the insights of each response with barcode clusters
+    predictor_names: List[str]
+    response_names: List[str]
+    standardization: Dict[str, np.ndarray]  # means and standard deviations of predictors and responses
+    configuration: Dict  # the run configuration including the parameters derived during the fit
+    weights: Optional[List[List[np.ndarray]]]  # for each response the model weights if requested
+
+
+def analyze_arrays(predictors: Union[np.ndarray, List[np.ndarray]], responses: Union[np.ndarray, List[np.ndarray]],
+                   pred_times: Union[np.ndarray, List[np.ndarray]], resp_times: Union[np.ndarray, List[np.ndarray]],
+                   options: Optional[Dict] = None, predictor_names: Optional[List[str]] = None,
+                   response_names: Optional[List[str]] = None, return_weights: bool = False,
+                   output_folder: Optional[str] = None, output_file_name: str = "arrays") -> MineResult:
+    """
+    Runs MINE on predictors and responses held in memory, performing the same interpolation, standardization, fits and
+    analysis as for input files. Nothing is written to disk unless an output folder is given
+    :param predictors: n_timepoints x n_predictors matrix or, for episodic data, a list with one matrix per episode
+    :param responses: n_timepoints x n_responses matrix or, for episodic data, a list with one matrix per episode
+    :param pred_times: The time of each predictor timepoint (list of episodes for episodic data)
+    :param resp_times: The time of each response timepoint (list of episodes for episodic data)
+    :param options: Run parameters as in the config section of a run configuration. Parameters that are not set are
+        taken from the default options
+    :param predictor_names: The names of the predictors. If None predictors are named P_0, P_1, ...
+    :param response_names: The names of the responses. If None responses are named R_0, R_1, ...
+    :param return_weights: If true, the model weights of each response are returned
+    :param output_folder: If set, weight and analysis files, insights, receptive fields, plots and the run
+        configuration are written to this folder as for input files
+    :param output_file_name: The name used to label output files if an output folder is given
+    :return: The results of the fit
+    """
+    config_dict = dict(default_options)
+    if options is not None:
+        config_dict.update(options)
+    is_episodic = isinstance(predictors, list)
+    config_dict["episodic"] = is_episodic
+    configuration = {"config": config_dict,
+                     "run": {"outdir": output_folder, "timestamp": datetime.datetime.now().isoformat()}}
+    if output_folder is not None and not path.isdir(output_folder):
+        raise NotADirectoryError(f"Output folder {output_folder} is not a directory.")
+
+    # combine times and data into the layout of input files with time in the first column
+    def with_time(data: np.ndarray, times: np.ndarray) -> np.ndarray:
+        data = np.asarray(data, dtype=float)
+        if data.ndim == 1:
+            data = data[:, None]
+        if data.shape[0] != np.size(times):
+            raise ValueError(f"Got {np.size(times)} timepoints for data with {data.shape[0]} rows")
+        return np.c_[np.asarray(times, dtype=float), data]
+
+    if is_episodic:
+        if not (len(predictors) == len(responses) == len(pred_times) == len(resp_times)):
+            raise ValueError("Predictors, responses and their times need to be given for each episode")
+        pred_data = [with_time(p, t) for p, t in zip(predictors, pred_times)]
+        resp_data = [with_time(r, t) for r, t in zip(responses, resp_times)]
+        n_pred_cols, n_resp_cols = pred_data[0].shape[1], resp_data[0].shape[1]
+    else:
+        pred_data = with_time(predictors, pred_times)
+        resp_data = with_time(responses, resp_times)
+        n_pred_cols, n_resp_cols = pred_data.shape[1], resp_data.shape[1]
+    if predictor_names is None:
+        predictor_names = [f"P_{i}" for i in range(n_pred_cols - 1)]
+    if response_names is None:
+        response_names = [f"R_{i}" for i in range(n_resp_cols - 1)]
+    if len(predictor_names) != n_pred_cols - 1 or len(response_names) != n_resp_cols - 1:
+        raise ValueError("The number of names has to match the number of predictors and responses")
+
+    is_spike_data, ip_pred_data, ip_resp_data, ip_time = preprocess_arrays(pred_data, resp_data, is_episodic,
+                                                                          config_dict["downsampling"])
+    mine_pred, mine_resp, m_pred, s_pred, m_resp, s_resp = standardize_data(ip_pred_data, ip_resp_data,
+                                                                            config_dict["use_time"], is_episodic,
+                                                                            is_spike_data)
+    model_history, taylor_look_ahead = derive_run_parameters(ip_time, is_episodic, is_spike_data, len(mine_pred),
+                                                             configuration)
+    fits_budget = plan_fit_memory(ip_time, is_episodic, len(mine_pred), mine_resp, model_history, configuration,
+                                  verbose=config_dict["miner_verbose"])
+    if not fits_budget and not config_dict["ignore_memory_warning"]:
+        raise MineException("The estimated peak memory of the fit exceeds the memory budget. Apply the memory plan, "
+                            "downsample or set ignore_memory_warning to fit anyway.")
+
+    # model weights are only kept in memory unless they are written to an output folder
+    if output_folder is not None:
+        weight_file = h5py.File(path.join(output_folder, f"MINE_{output_file_name}_weights.hdf5"), "w")
+    elif return_weights:
+        weight_file = h5py.File(io.BytesIO(), "w")
+    else:
+        weight_file = None
+    try:
+        weight_store = None if weight_file is None else weight_file.create_group("fit")
+        shuffle_weight_store = None
+        if weight_file is not None and config_dict["run_shuffle"]:
+            shuffle_weight_store = weight_file.create_group("fit_shuffled")
+        mdata, mdata_shuff = fit_models(mine_pred, mine_resp, is_episodic, is_spike_data, model_history,
+                                        taylor_look_ahead, configuration, weight_store, shuffle_weight_store)
+        if config_dict["run_shuffle"] and mdata_shuff is None:
+            mdata_shuff = fit_controls(mine_pred, mine_resp, is_episodic, is_spike_data, model_history,
+                                       taylor_look_ahead, configuration, shuffle_weight_store)
+        weights = None
+        if return_weights:
+            weights = [utilities.modelweights_from_hdf5(weight_store[f"cell_{i}_weights"])
+                       for i in range(len(response_names))]
+        if output_folder is not None:
+            name_grp = weight_file.create_group("response_names")
+            for i, r in enumerate(response_names):
+                name_grp.create_dataset(f"{i}", data=r.encode('utf-8'))
+    finally:
+        if weight_file is not None:
+            weight_file.close()
+
+    predictor_columns = (["Time"] + list(predictor_names)) if config_dict["use_time"] else list(predictor_names)
+    insights = insights_table(mdata, mdata_shuff, predictor_columns, response_names, configuration)
+    if output_folder is not None:
+        save_analysis_file(path.join(output_folder, f"MINE_{output_file_name}_analysis.hdf5"), mdata, mdata_shuff,
+                           m_pred, s_pred, m_resp, s_resp, predictor_columns, response_names)
+        generate_outputs(mdata, mdata_shuff, predictor_columns, response_names, configuration, output_folder,
+                         output_file_name)
+        with open(path.join(output_folder, f"MINE_{output_file_name}_run_config.json"), 'w') as config_file:
+            json.dump(configuration, config_file, indent=2)
+    return MineResult(mdata, mdata_shuff, insights, predictor_columns, list(response_names),
+                      {"m_pred": m_pred, "s_pred": s_pred, "m_resp": m_resp, "s_resp": s_resp}, configuration,
+                      weights)
+
+
+def _estimate_pair_memory(pair: Tuple[str, str], configuration: Dict) -> int:
+    """
+    Estimates the memory required to fit one file pair from the size and time span of its files without parsing
+    them, used as task of a process pool
+    :param pair: The (response file, predictor file) tuple
+    :param configuration: The run configuration
+    :return: The estimated memory in bytes
+    """
+    n_pred_rows, n_pred_cols, pred_start, pred_end = fh.get_parser(pair[1], "P").data_extent()
+    n_resp_rows, n_resp_cols, resp_start, resp_end = fh.get_parser(pair[0], "R").data_extent()
+    # as in ip_time_proposal data is interpolated to the timespan covered by both files at the rate of the file with
+    # fewer timepoints within that timespan
+    start, end = max(pred_start, resp_start), min(pred_end, resp_end)
+    if end <= start:
+        return 0  # there is no data to fit, which processing of the pair will report
+    n_time = min([int((n - 1) * (end - start) / (e - s)) + 1 if e > s else n
+                  for n, s, e in [(n_pred_rows, pred_start, pred_end), (n_resp_rows, resp_start, resp_end)]])
+    downsampling = configuration["config"]["downsampling"]
+    ip_delta = (end - start) / max(1, n_time - 1) * downsampling
+    n_time = max(2, n_time // downsampling)
+    model_history = max(1, int(np.round(configuration["config"]["history"] / ip_delta, 0)))
+    n_predictors = n_pred_cols if configuration["config"]["use_time"] else n_pred_cols - 1
+    plan = plan_memory([n_time], n_predictors, n_resp_cols - 1, model_history, configuration)
+    return plan["planned_peak"] if configuration["config"].get("apply_memory_plan", False) else plan["peak"]
+
+
+def _process_pair(pair: Tuple[str, str], configuration: Dict) -> Optional[PlotJob]:
+    """
+    Processes one non-episodic file pair
+    :param pair: The (response file, predictor file) tuple
+    :param configuration: The run configuration, file information is added to the "run" section
+    :return: The plots to generate or None if no plots are generated
+    """
+    # add files to config information
+    configuration["run"]["predictor_file"] = pair[1]
+    configuration["run"]["response_file"] = pair[0]
+    return process_paired_files([pair[0]], [pair[1]], configuration)
+
+
+def run_file_pairs_concurrently(file_pairs: List[Tuple[str, str]], configuration: Dict) -> None:
+    """
+    Processes independent non-episodic file pairs concurrently in worker processes. The cores of the machine are
+    divided among the workers and pairs are only started while the estimated memory of all running fits stays within
+    the memory budget. Pairs that exceed the budget on their own are processed while no other pair is running. Plots
+    are generated by processes of the coordinating process such that workers can start the next pair right away
+    :param file_pairs: List of (response file, predictor file) tuples
+    :param configuration: The run configuration with "config" and "run" sections
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+    import copy
+    n_workers = min(configuration["config"]["n_workers"], len(file_pairs))
+    budget = memory_budget(configuration)
+    n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    print(f"#### Processing {len(file_pairs)} file pairs with {n_workers} workers using {n_threads} threads each and "
+          f"a memory budget of {budget / 1024**3:.1f} GB ####", flush=True)
+    plot_processes = []
+    with create_process_pool(n_workers, n_threads) as pool:
+        # the sizes of the input files determine the memory requirements of each pair
+        estimates = list(pool.map(_estimate_pair_memory, file_pairs, [configuration] * len(file_pairs)))
+        pending = list(range(len(file_pairs)))
+        running = {}
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < n_workers:
+                estimate = estimates[pending[0]]
+                if len(running) > 0 and sum(running.values()) + estimate > budget:
+                    break
+                if estimate > budget:
+                    print(f"### {file_pairs[pending[0]][0]} is estimated to require {estimate / 1024**3:.1f} GB which "
+                          f"exceeds the memory budget. It will be processed on its own. ###", flush=True)
+                ix = pending.pop(0)
+                future = pool.submit(_process_pair, file_pairs[ix], copy.deepcopy(configuration))
+                running[future] = estimate
+            done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                plot_job = future.result()  # re-raise exceptions of failed pairs
+                if plot_job is not None:
+                    plot_processes.append((plot_job, start_plot_process(plot_job)))
+    wait_for_plots(plot_processes)
+
+
+def run_file_pairs(file_pairs: List[Tuple[str, str]], configuration: Dict) -> None:
+    """
+    Processes all pairs of response and predictor files of one run, either one by one or as episodes of one recording.
+    Plots of each pair are generated in the background while the following pairs are processed
+    :param file_pairs: List of (response file, predictor file) tuples
+    :param configuration: The run configuration with "config" and "run" sections. File information is added to the
+        "run" section
+    """
+    plot_processes = []
+    if not configuration["config"]["episodic"]:
+        if configuration["config"].get("n_workers", 1) > 1 and len(file_pairs) > 1:
+            run_file_pairs_concurrently(file_pairs, configuration)
+            return
+        for pair in file_pairs:
+            plot_job = _process_pair(pair, configuration)
+            if plot_job is not None:
+                # started right away such that plotting overlaps with processing of the next pair
+                plot_processes.append((plot_job, start_plot_process(plot_job)))
+    else:
+        r_files = [pair[0] for pair in file_pairs]
+        p_files = [pair[1] for pair in file_pairs]
+        # add files to config information
+        configuration["run"]["predictor_files"] = p_files
+        configuration["run"]["response_files"] = r_files
+        plot_job = process_paired_files(r_files, p_files, configuration)
+        if plot_job is not None:
+            plot_processes.append((plot_job, start_plot_process(plot_job)))
+    wait_for_plots(plot_processes)
 
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    pass
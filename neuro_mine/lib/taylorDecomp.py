@@ -279,7 +279,7 @@ def _compute_by_reg(taylor_d1: np.ndarray, taylor_d2: np.ndarray, nregs: int, in
 
 
 def taylor_decompose(mdl: model.ActivityPredictor, regressors: np.ndarray, take_every: int, predict_ahead: int,
-                     use_d2=True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+                     use_d2=True, chunk_size=64) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Uses taylor decomposition to predict changes in network output around chosen point using
     all information as well as only the information corresponding to each regressor and their
@@ -289,6 +289,8 @@ def taylor_decompose(mdl: model.ActivityPredictor, regressors: np.ndarray, take_
     :param take_every: Only form predictions every n frames to save time
     :param predict_ahead: The number of frames to predict ahead with the taylor expansion
     :param use_d2: If set to false only the first derivative will be used in the taylor expansion
+    :param chunk_size: The number of timepoints for which hessians are computed at once. Memory scales with
+        chunk_size x (n_regressors*input_length)^2
     :returns:
         [0]: The true change for each timepoint by going predict_ahead frames into the future
                 (n_timesteps-input_length-predict_ahead)/n long vector
@@ -297,7 +299,7 @@ def taylor_decompose(mdl: model.ActivityPredictor, regressors: np.ndarray, take_
         [2]: Array of predicted changes by regressors and their interactions
                 (n_timesteps-input_length-predict_ahead)/n x n_regressors x n_regressors
     """
-    return taylor_decompose_batched(mdl, regressors, take_every, predict_ahead, use_d2)
+    return taylor_decompose_batched(mdl, regressors, take_every, predict_ahead, use_d2, chunk_size)
 
 
 def data_mean_prediction(mdl: model.ActivityPredictor, x_bar, j_x_bar, h_x_bar, regressors: np.ndarray, take_every: int,
@@ -1,5 +1,6 @@
 from .plotting import UpSet
-from .data import from_indicators
+from .data import from_indicators, from_indicator_counts
 
 __all__ = ["UpSet",
-           "from_indicators"]
\ No newline at end of file
+           "from_indicators",
+           "from_indicator_counts"]
\ No newline at end of file
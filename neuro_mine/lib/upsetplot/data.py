@@ -237,6 +237,64 @@ def from_indicators(indicators, data=None):
     return data
 
 
+def from_indicator_counts(indicators):
+    """Count the records of each category combination of a boolean indicator matrix
+
+    Gives the subset sizes that ``UpSet(from_indicators(indicators),
+    subset_size="count")`` computes, but rows are grouped by their packed
+    indicator bits with ``np.unique`` instead of a pandas groupby on a
+    MultiIndex with one entry per record. The cost of building the plot from
+    the result therefore scales with the number of distinct combinations
+    rather than the number of records. Plot the result with
+    ``subset_size="auto"``.
+
+    Parameters
+    ----------
+    indicators : DataFrame-like of booleans
+        Its columns should correspond to categories, values should be True
+        where a record is in that category, and False or NA otherwise.
+
+    Returns
+    -------
+    Series
+        The number of records of each combination, indexed by category
+        membership. Combinations are listed in the order of their first
+        occurrence, as with ``from_indicators``.
+
+    Notes
+    -----
+    Categories with indicators that are all False will be removed.
+
+    Examples
+    --------
+    >>> indicators = {"cat1": [True, False, True, False],
+    ...               "cat2": [False, True, False, False],
+    ...               "cat3": [True, True, True, False]}
+    >>> from_indicator_counts(indicators)
+    cat1   cat2   cat3
+    True   False  True     2
+    False  True   True     1
+           False  False    1
+    Name: size, dtype: int64
+    """
+    indicators = pd.DataFrame(indicators).fillna(False).infer_objects()
+    # drop all-False as in from_indicators
+    indicators = indicators.loc[:, indicators.any(axis=0)]
+
+    if not all(dtype.kind == "b" for dtype in indicators.dtypes):
+        raise ValueError("The indicators must all be boolean")
+    if indicators.shape[1] == 0:
+        raise ValueError("At least one category needs to contain records")
+
+    n_categories = indicators.shape[1]
+    packed = np.packbits(indicators.to_numpy(dtype=bool), axis=1)
+    _, first, counts = np.unique(packed, axis=0, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    combinations = np.unpackbits(packed[first[order]], axis=1, count=n_categories).astype(bool)
+    index = pd.MultiIndex.from_arrays(list(combinations.T), names=list(indicators.columns))
+    return pd.Series(counts[order].astype(np.int64), index=index, name="size")
+
+
 def _convert_to_pandas(data, copy=True):
     is_series = False
     if hasattr(data, "loc"):
@@ -6,15 +6,14 @@ from __future__ import annotations
 import numpy as np
 import h5py
 from typing import Union, List, Any, Optional, Tuple
-from numba import njit
 from warnings import warn
 import os
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-import tensorflow as tf
-tf.get_logger().setLevel("ERROR")
+import logging
+logging.getLogger("tensorflow").setLevel(logging.ERROR)
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
-import pandas as pd
+# NOTE: tensorflow and pandas are imported within the functions that need them to keep importing this module fast
 
 
 def create_overwrite(storage: Union[h5py.File, h5py.Group], name: str, data: Any, overwrite: bool,
@@ -162,39 +161,19 @@ def barcode_cluster(x: np.ndarray, threshold: Union[float, np.ndarray]) -> np.nd
     :return: n_samples long vector of cluster numbers. Ordered as if contributions were binary digits with index 0
         of x having highest significance (no contribution would be first, all contributing last)
     """
-
-    def split(m, row_ix=None, index=0):
-        if row_ix is None:
-            row_ix = np.arange(m.shape[0])
-        above = m[m[:, index] > 0]
-        rix_above = row_ix[m[:, index] > 0]
-        below = m[m[:, index] <= 0]
-        rix_below = row_ix[m[:, index] <= 0]
-        if above.size == 0 and index == m.shape[1]-1:
-            return [rix_below]
-        if below.size == 0 and index == m.shape[1]-1:
-            return [rix_above]
-        if index == m.shape[1]-1:
-            return [rix_above, rix_below]
-        if above.size == 0:
-            return split(below, rix_below, index+1)
-        if below.size == 0:
-            return split(above, rix_above, index+1)
-        return split(above, rix_above, index+1) + split(below, rix_below, index+1)
-
     if not np.isscalar(threshold):
         if threshold.size != x.shape[1]:
             raise ValueError("Threshold either has to be a scalar or a vector with n_features element")
         threshold = threshold.ravel()[None, :]
     xt = x > threshold
-    clustered_indices = split(xt)
-    cluster_numbers = np.full(x.shape[0], np.nan)
-    for i, clust in enumerate(reversed(clustered_indices)):
-        cluster_numbers[clust] = i
-    return cluster_numbers
+    # pack the contributions of each sample into bytes with feature 0 as the most significant bit, such that ordering
+    # the bytes of samples lexicographically orders them as binary numbers, and number the occurring codes in order
+    packed = np.ascontiguousarray(np.packbits(xt, axis=1))
+    codes = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+    _, cluster_numbers = np.unique(codes, return_inverse=True)
+    return cluster_numbers.ravel().astype(float)
 
 
-@njit
 def rearrange_hessian(hessian: np.ndarray, npreds: int, inp_length: int) -> np.ndarray:
     """
     Re-arranges contents of our hessian matrices so that consecutive rows/columns are grouped by predictor
@@ -204,16 +183,11 @@ def rearrange_hessian(hessian: np.ndarray, npreds: int, inp_length: int) -> np.n
     :param inp_length: The timelength of each regressor input
     :return: The re-arranged hessian
     """
+    # element k (time k // npreds of predictor k % npreds) moves to position predictor * inp_length + time
+    k = np.arange(hessian.shape[0])
+    new_ix = (k % npreds) * inp_length + k // npreds
     hessian_r = np.empty_like(hessian, dtype=np.float32)
-    for row in range(hessian.shape[0]):
-        regnum = row % npreds
-        time = row // npreds
-        row_ix = regnum * inp_length + time
-        for col in range(hessian.shape[1]):
-            regnum = col % npreds
-            time = col // npreds
-            col_ix = regnum * inp_length + time
-            hessian_r[row_ix, col_ix] = hessian[row, col]
+    hessian_r[np.ix_(new_ix, new_ix)] = hessian
     return hessian_r
 
 
@@ -223,7 +197,8 @@ def simulate_response(act_predictor, predictors: np.ndarray, chunk_size=256) ->
     :param act_predictor: The model used to predict the response
     :param predictors: n_time x m_predictors matrix of predictor inputs
     :param chunk_size: Predictions will be performed in chunks of size chunk_size x input_length x m_predictors
-    :return: n_time - history_length + 1 long vector of predicted neural responses
+    :return: n_time - history_length + 1 long vector of predicted neural responses (n_time - history_length + 1 x
+        n_models matrix for stacked models)
     """
     h = act_predictor.input_length
     chunk_starts = np.arange(h -1, predictors.shape[0], chunk_size).astype(int)
@@ -235,7 +210,7 @@ def simulate_response(act_predictor, predictors: np.ndarray, chunk_size=256) ->
         overlapped_predictors = np.vstack(
             [predictors[None, t - h + 1:t + 1, :] for t in range(cs, ce)])
         prediction.append(act_predictor.get_output(overlapped_predictors))
-    return np.hstack(prediction)
+    return np.concatenate(prediction, axis=0)
 
 
 def modified_gram_schmidt(col_mat: np.ndarray) -> np.ndarray:
@@ -269,94 +244,198 @@ def sigmoid(x):
     return 1/(1 + np.exp(-x))
 
 
+def interp_columns(x: np.ndarray, xp: np.ndarray, fp: np.ndarray, block_size: int = 1 << 18) -> np.ndarray:
+    """
+    Linearly interpolates all columns of a matrix giving the same results as calling numpy interp on each column.
+    Interval indices and offsets are computed once for the time grid and applied to all columns
+    :param x: The desired timepoints after interpolation
+    :param xp: The original timepoints, must be increasing
+    :param fp: The n_timepoints x n_columns data before interpolation
+    :param block_size: The approximate number of values interpolated at once to keep temporaries in cache
+    :return: The len(x) x n_columns interpolated data
+    """
+    if fp.ndim != 2 or xp.size != fp.shape[0]:
+        raise ValueError(f"fp must be a matrix with one row for each of the {xp.size} elements in xp")
+    x = np.asarray(x, dtype=np.float64)
+    xp = np.asarray(xp, dtype=np.float64)
+    fp = np.asarray(fp, dtype=np.float64)
+    out = np.empty((x.size, fp.shape[1]))
+    if xp.size == 1:
+        out[:] = fp[0]
+        return out
+    # as numpy interp: values left and right of xp are set to the first and last value respectively
+    out[x < xp[0]] = fp[0]
+    out[x >= xp[-1]] = fp[-1]
+    inner = np.flatnonzero(np.logical_and(x >= xp[0], x < xp[-1]))
+    j = np.searchsorted(xp, x[inner], side="right") - 1  # xp[j] <= x < xp[j+1]
+    dx = (x[inner] - xp[j])[:, None]
+    x_width = (xp[j + 1] - xp[j])[:, None]
+    rows_per_block = max(1, block_size // max(1, fp.shape[1]))
+    for start in range(0, inner.size, rows_per_block):
+        rows = slice(start, start + rows_per_block)
+        fp_lo = np.take(fp, j[rows], axis=0)
+        fp_hi = np.take(fp, j[rows] + 1, axis=0)
+        with np.errstate(invalid="ignore"):
+            values = np.subtract(fp_hi, fp_lo)
+            values /= x_width[rows]
+            values *= dx[rows]
+            values += fp_lo
+            nan_values = np.isnan(values)
+            if np.any(nan_values):
+                # resolve infinite values in the same manner as numpy interp
+                slope = (fp_hi - fp_lo) / x_width[rows]
+                dx_next = x[inner[rows]][:, None] - np.take(xp, j[rows] + 1)[:, None]
+                values[nan_values] = (slope * dx_next + fp_hi)[nan_values]
+                still_nan = np.logical_and(np.isnan(values), fp_lo == fp_hi)
+                values[still_nan] = fp_lo[still_nan]
+        # timepoints that coincide with original timepoints take the original values
+        on_xp = dx[rows, 0] == 0
+        values[on_xp] = fp_lo[on_xp]
+        out[inner[rows]] = values
+    return out
+
+
 def interp_events(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> np.ndarray:
     """
     Interpolate spiking trace adding spikes to the correct intervals without generating in-between values
     :param x: The desired timepoints after interpolation
     :param xp: The timepoints original timepoints
-    :param fp: The spike data before interpolation
+    :param fp: The spike data before interpolation, either a vector or a n_timepoints x n_units matrix
+    :return: The interpolated spike data with the same number of dimensions as fp
     """
-    if xp.size != fp.size:
-        raise ValueError(f"xp and fp must have the same size but sizes are {xp.size} and {fp.size}")
+    if xp.size != fp.shape[0] or (fp.ndim == 1 and xp.size != fp.size):
+        raise ValueError(f"xp and fp must have the same size but sizes are {xp.size} and {fp.shape[0]}")
     if x.min() < xp.min() or x.max() > xp.max():
         warn("Trying to extrapolate spike data", UserWarning)
     if not np.all(np.logical_or(fp==0, fp==1)):
         raise ValueError("Values in fp suggest that this is not 0/1 coded spike data")
-    f = np.zeros_like(x)
-    for x_, f_ in zip(xp, fp):
-        # for each spike that is within the bounds of the interpolation time
-        # find the closest x to assign it to
-        if x_ < x.min():
-            continue
-        if x_ > x.max():
-            break
-        if f_ == 1:
-            ix = np.argmin(np.abs(x - x_))
-            if ix.size > 1:
-                ix = ix[0]
-            f[ix] += 1
+    fp_2d = fp.reshape(fp.shape[0], -1)
+    n_units = fp_2d.shape[1]
+    f = np.zeros((x.size, n_units), dtype=x.dtype)
+    # spikes before the first interpolation time are ignored, as are all spikes from the first original timepoint
+    # after the last interpolation time onwards
+    beyond = np.flatnonzero(xp > x.max())
+    n_valid = beyond[0] if beyond.size > 0 else xp.size
+    valid = np.flatnonzero(xp[:n_valid] >= x.min())
+    spike_rows, spike_units = np.nonzero(fp_2d[valid] == 1)
+    if spike_rows.size > 0:
+        # for each spike find the closest x to assign it to - on ties the first index is chosen
+        order = np.argsort(x, kind="stable")
+        x_sorted = x[order]
+        spike_times = xp[valid[spike_rows]]
+        upper = np.clip(np.searchsorted(x_sorted, spike_times, side="left"), 0, x.size - 1)
+        # among equal values the stable sort places the lowest original index first
+        upper = np.searchsorted(x_sorted, x_sorted[upper], side="left")
+        lower = np.searchsorted(x_sorted, x_sorted[np.maximum(upper - 1, 0)], side="left")
+        d_lower = np.abs(x_sorted[lower] - spike_times)
+        d_upper = np.abs(x_sorted[upper] - spike_times)
+        ix = np.where(d_lower < d_upper, order[lower],
+                      np.where(d_upper < d_lower, order[upper], np.minimum(order[lower], order[upper])))
+        f += np.bincount(ix * n_units + spike_units, minlength=x.size * n_units).reshape(x.size, n_units)
     if np.any(f > 1):
         print(f"Interpolation times too coarse for data. {np.sum(f > 1)} timepoints in interpolated data correspond to"
               f" more than one spike")
     f[f > 1] = 1
-    return f
+    return f.reshape(x.size) if fp.ndim == 1 else f
 
 
-def compute_autocorr_time(df: pd.DataFrame) -> pd.DataFrame:
+def _autocorr_times(x: np.ndarray, memory_budget: float) -> np.ndarray:
+    """
+    Computes the autocorrelation time of each timeseries as the lag where its autocorrelation drops below 1/e
+    :param x: n_series x n_timepoints matrix without NaN values
+    :param memory_budget: The memory in GB that may be used for the FFTs, series are processed in chunks that fit
+    :return: n_series vector of autocorrelation times in timepoints, NaN where it could not be determined
+    """
+    from scipy import fft
+    n_series, n = x.shape
+    taus = np.full(n_series, np.nan)
+    if n < 2:
+        return taus
+    threshold = 1.0 / np.e
+    # pad to at least 2*n-1 to prevent circular convolution artifacts, using a length the FFT is fast for
+    n_fft = fft.next_fast_len(2 * n - 1, real=True)
+    # padded input, its spectrum and the inverse transform of the power spectrum of each series
+    chunk_size = max(1, int(memory_budget * 1024**3 // (32 * n_fft)))
+    for start in range(0, n_series, chunk_size):
+        chunk = x[start:start + chunk_size]
+        chunk = chunk - np.mean(chunk, axis=1, keepdims=True)
+        f = fft.rfft(chunk, n=n_fft, axis=1, workers=-1)
+        acf = fft.irfft(f.real**2 + f.imag**2, n=n_fft, axis=1, workers=-1)[:, :n]
+        # normalize (variance is acf[0])
+        variance = acf[:, 0]
+        valid = variance != 0
+        acf /= np.where(valid, variance, 1)[:, None]
+        # first lag at which the acf drops below 1/e, linearly interpolated with the preceding lag
+        below = acf[:, 1:] < threshold
+        crossed = np.any(below, axis=1)
+        lag = np.argmax(below, axis=1) + 1
+        rows = np.arange(acf.shape[0])
+        y1 = acf[rows, lag - 1]
+        y2 = acf[rows, lag]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tau = np.where(y1 == y2, lag, (lag - 1) + (threshold - y1) / (y2 - y1))
+        # NaN where the acf never drops below 1/e in the given sample
+        taus[start:start + chunk.shape[0]] = np.where(np.logical_and(valid, crossed), tau, np.nan)
+    return taus
+
+
+def compute_autocorr_time(df: pd.DataFrame, memory_budget: float = 0.015) -> pd.DataFrame:
     """
     Computes autocorrelation time according to Thompson, 2010 (http://arxiv.org/abs/1011.0175) for each column in
     a timeseries pandas DataFrame as the time where the autocorrelation drops below 1/e
     :param df: Dataframe containing timeseries data
+    :param memory_budget: The memory in GB that may be used for computing the autocorrelations. The default keeps
+        the working set of each chunk of columns small enough to be cached, which is faster than larger chunks
     :return: Dataframe of autocorrelation times
     """
-    # in large parts generated using Google Gemini
-    def _single_col_act(series):
-        # Drop NaNs to ensure contiguous array
-        x = series.dropna().values
-        n = len(x)
-
-        if n < 2:
-            return np.nan
+    import pandas as pd
+
+    # one row per column such that the FFTs run along contiguous memory
+    x = np.ascontiguousarray(df.to_numpy(dtype=float).T)
+    has_nan = np.any(np.isnan(x), axis=1)
+    taus = np.full(x.shape[0], np.nan)
+    # columns without missing values are processed together
+    taus[~has_nan] = _autocorr_times(x[~has_nan], memory_budget)
+    # NaNs are dropped to obtain contiguous timeseries, which differ in length across columns
+    for i in np.flatnonzero(has_nan):
+        taus[i] = _autocorr_times(x[i, ~np.isnan(x[i])][None, :], memory_budget)[0]
 
-        # Mean center the data
-        x = x - np.mean(x)
-
-        # Compute autocorrelation via FFT
-        # Pad to 2*n to prevent circular convolution artifacts
-        f = np.fft.fft(x, n=2 * n)
-        acf = np.fft.ifft(f * np.conjugate(f))[:n].real
-
-        # Normalize (variance is acf[0])
-        if acf[0] == 0:
-            return np.nan
-        acf /= acf[0]
-
-        threshold = 1.0 / np.e
-
-        # Find where ACF drops below 1/e
-        for i in range(1, n):
-            if acf[i] < threshold:
-                # Linearly interpolate between lag (i-1) and lag i for a precise float
-                y1 = acf[i - 1]
-                y2 = acf[i]
-
-                if y1 == y2:  # Prevent division by zero
-                    return float(i)
+    # Return as a DataFrame
+    return pd.DataFrame(taus[None, :], columns=df.columns, index=["Autocorrelation time [Timepoints]"])
 
-                tau = (i - 1) + (threshold - y1) / (y2 - y1)
-                return tau
 
-        # Return NaN if the ACF never drops below 1/e in the given sample
-        return np.nan
+_shuffle_buffer_size = 1000  # limit dataset shuffle buffer to 1000 rows
 
-    # Calculate for each column and pack into a 1-row dictionary
-    taus = {col: [_single_col_act(df[col])] for col in df.columns}
 
-    # Return as a DataFrame
-    return pd.DataFrame(taus, index=["Autocorrelation time [Timepoints]"])
+def streamed_training_data(regressors: List[np.ndarray], out_data: List[np.ndarray], input_steps: int,
+                           batch_size: int):
+    """
+    Creates a training dataset that forms the model input windows of each batch on the fly instead of materializing
+    and caching all (n_timesteps x input_steps x n_regressors) windows in memory
+    :param regressors: For each episode the n_timesteps x n_regressors matrix of regressors
+    :param out_data: For each episode the corresponding n_timesteps-input_steps+1 long vector of responses or
+        matrix with one column per jointly trained response
+    :param input_steps: The number of regressor timesteps into the past to use to model the response
+    :param batch_size: The training batch size to use
+    :return: Tensorflow dataset that can be used for training with randomization
+    """
+    import tensorflow as tf
+    # the window of each output starts input_steps-1 frames earlier within the regressors of its episode
+    starts, offset = [], 0
+    for regs, outd in zip(regressors, out_data):
+        starts.append(np.arange(outd.shape[0]) + offset)
+        offset += regs.shape[0]
+    regs = tf.constant(np.vstack(regressors).astype(np.float32))
+    outs = tf.constant(np.concatenate(out_data, axis=0).astype(np.float32))
+    starts = tf.constant(np.hstack(starts))
+    window = tf.range(input_steps, dtype=starts.dtype)
 
+    def gather_windows(ix):
+        return tf.gather(regs, tf.gather(starts, ix)[:, None] + window[None, :]), tf.gather(outs, ix)
 
-_shuffle_buffer_size = 1000  # limit dataset shuffle buffer to 1000 rows
+    train_ds = tf.data.Dataset.range(outs.shape[0]).shuffle(_shuffle_buffer_size, reshuffle_each_iteration=True).\
+        batch(batch_size, drop_remainder=True).map(gather_windows)
+    return train_ds.prefetch(buffer_size=tf.data.AUTOTUNE)
 
 
 class EpisodicData:
@@ -384,19 +463,27 @@ class EpisodicData:
 
     @staticmethod
     def generate_data_object(in_data: List, out_data: List, batch_size: int):
+        import tensorflow as tf
         in_data = np.vstack(in_data)
-        out_data = np.hstack(out_data)
+        out_data = np.concatenate(out_data, axis=0)
         dobj = tf.data.Dataset.from_tensor_slices((in_data, out_data)). \
             shuffle(_shuffle_buffer_size, reshuffle_each_iteration=True).batch(batch_size, drop_remainder=True)
         return dobj.cache().prefetch(buffer_size=tf.data.AUTOTUNE)
 
-    def training_data(self, sample_ix: int, batch_size=32):
+    def training_data(self, sample_ix: int, batch_size=32, streaming=False):
         """
         Creates training data for the indicated calcium response sample (cell)
         :param sample_ix: The index of the cell
         :param batch_size: The training batch size to use
+        :param streaming: If true, input windows are formed for each batch instead of being stored in memory
         :return: Tensorflow dataset that can be used for training with randomization
         """
+        if streaming:
+            regressors, out_data = [], []
+            for data in self.data_objects[:self.n_train_ep]:
+                regressors.append(data.regressor_matrix(sample_ix))
+                out_data.append(data.ca_responses[sample_ix, self.input_steps - 1:])
+            return streamed_training_data(regressors, out_data, self.input_steps, batch_size)
         in_data, out_data = [], []
         for data in self.data_objects[:self.n_train_ep]:
             ind, outd = data.training_data_arrays(sample_ix)
@@ -404,6 +491,29 @@ class EpisodicData:
             out_data.append(outd)
         return self.generate_data_object(in_data, out_data, batch_size)
 
+    def joint_training_data(self, batch_size=32, streaming=False):
+        """
+        Creates training data for all calcium responses at once, to train a stacked model with one model per response
+        :param batch_size: The training batch size to use
+        :param streaming: If true, input windows are formed for each batch instead of being stored in memory
+        :return: Tensorflow dataset with n_responses long label vectors that can be used for training with
+            randomization
+        """
+        if streaming:
+            regressors, out_data = [], []
+            for data in self.data_objects[:self.n_train_ep]:
+                if any(reg.shape[0] != 1 for reg in data.regressors):
+                    raise ValueError("Joint training data requires regressors that are shared by all responses")
+                regressors.append(data.regressor_matrix(0))
+                out_data.append(data.ca_responses[:, self.input_steps - 1:].T)
+            return streamed_training_data(regressors, out_data, self.input_steps, batch_size)
+        in_data, out_data = [], []
+        for data in self.data_objects[:self.n_train_ep]:
+            ind, outd = data.joint_training_arrays()
+            in_data.append(ind)
+            out_data.append(outd)
+        return self.generate_data_object(in_data, out_data, batch_size)
+
     def test_data(self, sample_ix: int, batch_size=32):
         """
         Creates test data for the indicated calcium response sample (cell)
@@ -496,18 +606,57 @@ class Data:
                 in_data[t - self.input_steps + 1, :, i] = this_reg[0, t - self.input_steps + 1:t + 1]
         return in_data, out_data
 
-    def training_data(self, sample_ix: int, batch_size=32):
+    def training_data(self, sample_ix: int, batch_size=32, streaming=False):
         """
         Creates training data for the indicated calcium response sample (cell)
         :param sample_ix: The index of the cell
         :param batch_size: The training batch size to use
+        :param streaming: If true, input windows are formed for each batch instead of being stored in memory
         :return: Tensorflow dataset that can be used for training with randomization
         """
+        if streaming:
+            regressors = self.regressor_matrix(sample_ix)[:self.tsteps_for_train]
+            out_data = self.ca_responses[sample_ix, self.input_steps - 1:self.tsteps_for_train]
+            return streamed_training_data([regressors], [out_data], self.input_steps, batch_size)
+        import tensorflow as tf
         in_data, out_data = self.training_data_arrays(sample_ix)
         train_ds = tf.data.Dataset.from_tensor_slices((in_data, out_data)).\
             shuffle(_shuffle_buffer_size, reshuffle_each_iteration=True).batch(batch_size, drop_remainder=True)
         return train_ds.cache().prefetch(buffer_size=tf.data.AUTOTUNE)
 
+    def joint_training_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Creates the training inputs shared by all calcium responses together with the training labels of all responses
+        :return:
+            [0]: n_timesteps x input_steps x n_regressors training inputs
+            [1]: n_timesteps x n_responses training labels
+        """
+        if any(reg.shape[0] != 1 for reg in self.regressors):
+            raise ValueError("Joint training data requires regressors that are shared by all responses")
+        in_data = self.training_data_arrays(0)[0]
+        out_data = self.ca_responses[:, self.input_steps - 1:self.tsteps_for_train].T.astype(np.float32)
+        return in_data, out_data
+
+    def joint_training_data(self, batch_size=32, streaming=False):
+        """
+        Creates training data for all calcium responses at once, to train a stacked model with one model per response
+        :param batch_size: The training batch size to use
+        :param streaming: If true, input windows are formed for each batch instead of being stored in memory
+        :return: Tensorflow dataset with n_responses long label vectors that can be used for training with
+            randomization
+        """
+        if streaming:
+            if any(reg.shape[0] != 1 for reg in self.regressors):
+                raise ValueError("Joint training data requires regressors that are shared by all responses")
+            regressors = self.regressor_matrix(0)[:self.tsteps_for_train]
+            out_data = self.ca_responses[:, self.input_steps - 1:self.tsteps_for_train].T
+            return streamed_training_data([regressors], [out_data], self.input_steps, batch_size)
+        import tensorflow as tf
+        in_data, out_data = self.joint_training_arrays()
+        train_ds = tf.data.Dataset.from_tensor_slices((in_data, out_data)).\
+            shuffle(_shuffle_buffer_size, reshuffle_each_iteration=True).batch(batch_size, drop_remainder=True)
+        return train_ds.cache().prefetch(buffer_size=tf.data.AUTOTUNE)
+
     def test_data_arrays(self, sample_ix: int) -> Tuple[np.ndarray, np.ndarray]:
         out_data = self.ca_responses[sample_ix, self.tsteps_for_train + self.input_steps - 1:].copy()
         in_data = np.full((out_data.size, self.input_steps, len(self.regressors)), np.nan).astype(np.float32)
@@ -530,6 +679,7 @@ class Data:
         """
         if self.tsteps_for_train == self.ca_responses.shape[1]:
             raise ValueError("All data is training data")
+        import tensorflow as tf
         in_data, out_data = self.test_data_arrays(sample_ix)
         test_ds = tf.data.Dataset.from_tensor_slices((in_data, out_data)).batch(batch_size, drop_remainder=False)
         return test_ds.cache().prefetch(buffer_size=tf.data.AUTOTUNE)
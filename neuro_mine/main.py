@@ -2,36 +2,58 @@
 Module for easy running of MINE on user data
 """
 
-import subprocess
 import importlib.resources
+import runpy
 import sys
 
+
+def _run_script(package: str, script: str, args: list) -> None:
+    """
+    Runs a script of the package within the current interpreter as if it had been called from the command line.
+    This avoids the startup cost of launching a second python interpreter
+    :param package: The package containing the script
+    :param script: The file name of the script
+    :param args: The command line arguments to pass to the script
+    """
+    with importlib.resources.path(package, script) as script_path:
+        sys.argv = [str(script_path)] + args
+        runpy.run_path(str(script_path), run_name="__main__")
+
 def main():
         if len(sys.argv) > 1:
-            with importlib.resources.path("neuro_mine.scripts", "neuromine_train.py") as script_path:
-                subprocess.run(["python", str(script_path)] + sys.argv[1:])
+            _run_script("neuro_mine.scripts", "neuromine_train.py", sys.argv[1:])
         else:
-            with importlib.resources.path("neuro_mine.ui", "train_gui.py") as script_path:
-                subprocess.run(["python", str(script_path)])
+            _run_script("neuro_mine.ui", "train_gui.py", [])
 
 def predict():
         if len(sys.argv) > 1:
-            with importlib.resources.path("neuro_mine.scripts", "neuromine_prediction.py") as script_path:
-                subprocess.run(["python", str(script_path)] + sys.argv[1:])
+            _run_script("neuro_mine.scripts", "neuromine_prediction.py", sys.argv[1:])
         else:
-            with importlib.resources.path("neuro_mine.ui", "predict_gui.py") as script_path:
-                subprocess.run(["python", str(script_path)])
+            _run_script("neuro_mine.ui", "predict_gui.py", [])
 
 def timetrial():
-    with importlib.resources.path("neuro_mine.scripts", "neuromine_timetrial.py") as script_path:
-        if len(sys.argv) > 1:
-            subprocess.run(["python", str(script_path)] + sys.argv[1:])
-        else:
-            subprocess.run(["python", str(script_path)])
+    _run_script("neuro_mine.scripts", "neuromine_timetrial.py", sys.argv[1:])
 
 def data_diag():
-    with importlib.resources.path("neuro_mine.scripts", "data_diagnostics.py") as script_path:
-        if len(sys.argv) > 1:
-            subprocess.run(["python", str(script_path)] + sys.argv[1:])
-        else:
-            subprocess.run(["python", str(script_path)] + ["--help"])
+    if len(sys.argv) > 1:
+        _run_script("neuro_mine.scripts", "data_diagnostics.py", sys.argv[1:])
+    else:
+        _run_script("neuro_mine.scripts", "data_diagnostics.py", ["--help"])
+
+def reanalyze():
+    if len(sys.argv) > 1:
+        _run_script("neuro_mine.scripts", "neuromine_reanalysis.py", sys.argv[1:])
+    else:
+        _run_script("neuro_mine.scripts", "neuromine_reanalysis.py", ["--help"])
+
+def merge():
+    if len(sys.argv) > 1:
+        _run_script("neuro_mine.scripts", "neuromine_merge.py", sys.argv[1:])
+    else:
+        _run_script("neuro_mine.scripts", "neuromine_merge.py", ["--help"])
+
+def worker():
+    if len(sys.argv) > 1:
+        _run_script("neuro_mine.scripts", "neuromine_worker.py", sys.argv[1:])
+    else:
+        _run_script("neuro_mine.scripts", "neuromine_worker.py", ["--help"])
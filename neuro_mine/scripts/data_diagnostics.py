@@ -2,21 +2,22 @@
 Script to save simple data descriptors that can be helpful to tune and interpret outcomes reported by neuro-mine
 """
 
+from __future__ import annotations
 import argparse
 from neuro_mine.lib.processing import load_and_pre_process_data
 import numpy as np
 from os import path
 import neuro_mine.lib.file_handling as fh
 from typing import List
-import pandas as pd
-import matplotlib.pyplot as pl
 from neuro_mine.lib.utilities import compute_autocorr_time
+# NOTE: pandas and matplotlib are imported within functions such that the command line help shows up without delay
 
 
 def plot_auto_corr_times(ac_times_pred: np.ndarray, ac_times_resp: np.ndarray, time_delta: float) -> pl.Figure:
     """
     Plots autocorrelation times for predictors and responses as box-plots
     """
+    import matplotlib.pyplot as pl
     # functions for y-axis unit conversion
     def frames_to_time(x):
         return x * time_delta
@@ -48,6 +49,7 @@ def plot_pw_corrs(df_corrs: pd.DataFrame) -> pl.Figure:
     """
     Plots pairwise correlations as a heatmap
     """
+    import matplotlib.pyplot as pl
     fig, ax = pl.subplots()
     try:
         im = ax.matshow(df_corrs, vmin=-1, vmax=1, cmap="managua_r")
@@ -63,11 +65,12 @@ def plot_pw_corrs(df_corrs: pd.DataFrame) -> pl.Figure:
 
 
 def process_episodic(p_files: List[str], r_files: List[str], output_dir: str):
+    import pandas as pd
     r_out_prefix = path.splitext(path.split(r_files[0])[-1])[0]
     p_out_prefix = path.splitext(path.split(p_files[0])[-1])[0]
     _, i_pred_data, i_resp_data, i_times, pred_names, resp_names = load_and_pre_process_data(p_files, r_files,
                                                                                                       True,
-                                                                                                      1)
+                                                                                                      1, output_dir)
     # remove time column from predictors if not used
     if not use_time:
         i_pred_data = [ipd[:, 1:] for ipd in i_pred_data]
@@ -107,12 +110,13 @@ def process_episodic(p_files: List[str], r_files: List[str], output_dir: str):
 
 
 def process_single(p_file: str, r_file: str, output_dir: str):
+    import pandas as pd
     r_out_prefix = path.splitext(path.split(r_file)[-1])[0]
     p_out_prefix = path.splitext(path.split(p_file)[-1])[0]
     _, i_pred_data, i_resp_data, i_times, pred_names, resp_names = load_and_pre_process_data([p_file],
                                                                                                       [r_file],
                                                                                                       False,
-                                                                                                      1)
+                                                                                                      1, output_dir)
     # remove time column from predictors if not used
     if not use_time:
         i_pred_data = i_pred_data[:, 1:]
@@ -147,10 +151,10 @@ if __name__ == '__main__':
     a_parser = argparse.ArgumentParser(prog="Data-diagnostic",
                                        description="Reports key-characteristics of input data to guide decisions about"
                                                    " potential downsampling of data or orthogonalization of predictors.")
-    a_parser.add_argument("-p", "--predictors", help="Path to CSV files of predictors or alternatively "
+    a_parser.add_argument("-p", "--predictors", help="Path to data files (CSV, NPY, NPZ, HDF5, NWB or Parquet) of predictors or alternatively "
                                                      "directory with predictor files.",
                           type=str, required=True, nargs='+')
-    a_parser.add_argument("-r", "--responses", help="Path to CSV files of responses or alternatively "
+    a_parser.add_argument("-r", "--responses", help="Path to data files (CSV, NPY, NPZ, HDF5, NWB or Parquet) of responses or alternatively "
                                                     "directory with response files.",
                           type=str, required=True, nargs='+')
     a_parser.add_argument("-ut", "--use_time", help="If set time will be used as one predictor.",
@@ -0,0 +1,43 @@
+"""
+Script to combine the outputs of a run that was split into shards of responses (see --shard option of Mine) into the
+weights, analysis, insights and plots of a single run
+"""
+
+import argparse
+import os
+from os import path
+from neuro_mine.lib.processing import find_shard_files, merge_shards
+
+
+if __name__ == '__main__':
+
+    a_parser = argparse.ArgumentParser(prog="Mine-merge",
+                                       description="Merges the outputs of all shards of a sharded run into the outputs"
+                                                   " of a single run and generates insights and plots.")
+    a_parser.add_argument("-i", "--indir", help="Path to directory containing shard outputs.", required=True,
+                          type=str)
+    a_parser.add_argument("-od", "--outdir", help="Path to output directory. If not set merged outputs will be stored"
+                                                  " in the directory of the shard outputs.", type=str, default=None)
+
+    args = a_parser.parse_args()
+
+    if not os.path.isdir(args.indir):
+        raise NotADirectoryError(f"Shard directory {args.indir} is not a directory.")
+    outdir = args.indir if args.outdir is None else args.outdir
+    if not os.path.exists(outdir):
+        raise FileNotFoundError(f"Output directory {outdir} does not exist.")
+    if not os.path.isdir(outdir):
+        raise NotADirectoryError(f"Output directory {outdir} is not a directory.")
+
+    runs = find_shard_files([path.join(args.indir, f) for f in sorted(os.listdir(args.indir))])
+    if len(runs) == 0:
+        raise FileNotFoundError(f"No shard analysis files found in {args.indir}")
+
+    print()
+    print("#### MERGE STARTED ####", flush=True)
+
+    for name, shard_files in runs.items():
+        merge_shards(shard_files, outdir, name)
+
+    print()
+    print("#### MERGE ENDED ####", flush=True)
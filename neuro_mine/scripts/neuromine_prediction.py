@@ -3,7 +3,6 @@ Script to predict responses based on previously fit models and new predictor inp
 """
 
 import argparse
-import pandas as pd
 import h5py
 import os
 import neuro_mine.lib.file_handling as fh
@@ -14,7 +13,6 @@ from warnings import warn
 import numpy as np
 from typing import Optional
 from neuro_mine.lib.utilities import modelweights_from_hdf5, simulate_response
-from neuro_mine.lib import model
 
 if __name__ == '__main__':
     # the following will prevent tensorflow from using the GPU - as the used models have very low complexity
@@ -25,7 +23,7 @@ if __name__ == '__main__':
     a_parser = argparse.ArgumentParser(prog="Mine-predict",
                                        description="Uses previously fit models to predict responses based on provided"
                                                    " predictor data.")
-    a_parser.add_argument("-p", "--predictors", help="Path to CSV files of predictors or alternatively "
+    a_parser.add_argument("-p", "--predictors", help="Path to data files (CSV, NPY, NPZ, HDF5, NWB or Parquet) of predictors or alternatively "
                                                      "directory with predictor files.",
                           type=str, required=True, nargs='+')
     a_parser.add_argument("-o", "--config", help="Path to fit configuration json file.", required=True, type=str)
@@ -37,6 +35,11 @@ if __name__ == '__main__':
                           type=float, required=False)
 
     args = a_parser.parse_args()
+
+    # heavy imports are deferred until arguments are parsed such that the command line help shows up without delay
+    import pandas as pd
+    from neuro_mine.lib import model
+
     predictor_files = fh.process_file_args(args.predictors)
     run_dict = None
     conf_dict = None
@@ -81,7 +84,7 @@ if __name__ == '__main__':
     pred_data = []
     i_times = None
     for pf in predictor_files:
-        p_data = fh.CSVParser(pf, "P").load_data()[0]
+        p_data = fh.get_parser(pf, "P").load_data()[0]
         pred_times = p_data[:, 0]
         if not use_time:
             p_data = p_data[:, 1:]
@@ -0,0 +1,98 @@
+"""
+Script to re-compute insights, barcode clusters, receptive fields and plots of a previous fit with new analysis
+thresholds without re-fitting any models
+"""
+
+import argparse
+import json
+import os
+from os import path
+from neuro_mine.lib.processing import reanalyze_from_file
+from neuro_mine.lib.options import default_options
+from neuro_mine.scripts.neuromine_train import ConfigException
+
+
+if __name__ == '__main__':
+
+    a_parser = argparse.ArgumentParser(prog="Mine-reanalyze",
+                                       description="Re-computes insights, barcode clusters, receptive fields and plots"
+                                                   " of a previous fit using new analysis thresholds without"
+                                                   " re-fitting models.")
+    a_parser.add_argument("-a", "--analysis", help="Path to analysis hdf5 file of fit.", required=True, type=str)
+    a_parser.add_argument("-o", "--config", help="Path to run configuration json file of the fit. If not set the"
+                                                 " configuration file next to the analysis file will be used.",
+                          type=str, default=None)
+    a_parser.add_argument("-od", "--outdir", help="Path to output directory. If not set outputs will be stored"
+                                                  " next to the analysis file.", type=str, default=None)
+
+    # Analysis parameters - if not set on command line will be drawn from the configuration file of the fit
+    a_parser.add_argument("-ct", "--th_test", help="The test score threshold to "
+                                                   "decide that fit was successful.",
+                          type=float, default=None)
+    a_parser.add_argument("-ts", "--taylor_sig", help="The significance threshold for taylor expansion.",
+                          type=float, default=None)
+    a_parser.add_argument("-tc", "--taylor_cut", help="The variance fraction that has to be lost to "
+                                                      "consider component important for fit.",
+                          type=float, default=None)
+    a_parser.add_argument("-la", "--th_lax", help="The threshold of variance explained by the linear "
+                                                  "approximation to consider the fit linear.",
+                          type=float, default=None)
+    a_parser.add_argument("-lsq", "--th_sqr", help="The threshold of variance explained by the 2nd order "
+                                                   "approximation to consider the fit 2nd order.",
+                          type=float, default=None)
+    a_parser.add_argument("-npl", "--no_plots", help="If set, only insights and receptive fields are re-generated.",
+                          action="store_true")
+
+    args = a_parser.parse_args()
+
+    if not path.isfile(args.analysis):
+        raise FileNotFoundError(f"Analysis file {args.analysis} does not exist.")
+
+    config_path = args.config
+    if config_path is None:
+        # by default the run configuration is stored next to the analysis file with a matching name
+        config_path = args.analysis.replace("_analysis.hdf5", "_run_config.json")
+    if not path.exists(config_path):
+        raise ConfigException("Config file does not exist")
+    if not path.isfile(config_path):
+        raise ConfigException("Config path is not a file")
+    try:
+        with open(config_path) as config_file:
+            configuration = json.load(config_file)
+        config_dict = configuration["config"]
+        run_dict = configuration["run"]
+    except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+        raise ConfigException("Config file does not contain valid JSON")
+    except KeyError:
+        raise ConfigException("Config file does not contain config and run sections")
+    for k in ["model_history_frames", "interpolation_time_delta"]:
+        if k not in run_dict:
+            raise ConfigException(f"Run section of config file does not contain {k}")
+    # in case the config file of an older version was loaded, supplement with default keys where necessary:
+    for k in default_options:
+        if k not in config_dict:
+            config_dict[k] = default_options[k]
+    # configuration files of older versions do not store the threshold used during fitting separately
+    if "fit_score_cut" not in run_dict:
+        run_dict["fit_score_cut"] = config_dict["th_test"]
+
+    if args.outdir is not None:
+        if not os.path.exists(args.outdir):
+            raise FileNotFoundError(f"Output directory {args.outdir} does not exist.")
+        if not os.path.isdir(args.outdir):
+            raise NotADirectoryError(f"Output directory {args.outdir} is not a directory.")
+
+    # parameters set on the command line override those of the fit
+    for k in ["th_test", "taylor_sig", "taylor_cut", "th_lax", "th_sqr"]:
+        if getattr(args, k) is not None:
+            config_dict[k] = getattr(args, k)
+    # plots are re-generated on request even if they were not generated during the fit
+    config_dict["plots"] = not args.no_plots
+
+    print()
+    print("#### RE-ANALYSIS STARTED ####", flush=True)
+
+    reanalyze_from_file(args.analysis, configuration, args.outdir)
+
+    print()
+    print("#### RE-ANALYSIS ENDED ####", flush=True)
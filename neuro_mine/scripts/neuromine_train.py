@@ -1,6 +1,6 @@
 import argparse
 from datetime import datetime
-from neuro_mine.lib.processing import process_paired_files
+from neuro_mine.lib.processing import run_file_pairs
 import json
 import os
 from os import path
@@ -29,11 +29,11 @@ if __name__ == '__main__':
                                        description="Uses MINE to fit and interpret CNN models that relate predictors"
                                                    "identified by one CSV file to responses identified by another.")
     # Files and directories - required no defaults
-    a_parser.add_argument("-p", "--predictors", help="Path to CSV files of predictors or alternatively "
+    a_parser.add_argument("-p", "--predictors", help="Path to data files (CSV, NPY, NPZ, HDF5, NWB or Parquet) of predictors or alternatively "
                                                "directory with predictor files.",
                     type=str, required=True, nargs='+')
-    a_parser.add_argument("-r", "--responses", help="Path to CSV files of responses or alternatively "
-                                              "directory with response files.",
+    a_parser.add_argument("-r", "--responses", help="Path to data files (CSV, NPY, NPZ, HDF5, NWB or Parquet) of responses or alternatively "
+                                              "directory with response files or suite2p output directory.",
                     type=str, required=True, nargs='+')
     a_parser.add_argument("-od", "--outdir", help="Path to model output directory.", type=str, required=True)
     a_parser.add_argument("-o", "--config", help="Path to config file with run parameters.", type=str, default=None)
@@ -60,13 +60,13 @@ if __name__ == '__main__':
                           type=float, default=None)
     a_parser.add_argument("-ts", "--taylor_sig", help="The significance threshold for taylor expansion.",
                           type=float, default=None)
-    a_parser.add_argument("-tc", "--taylor_cut", help="The variance fraction that has to be lost to"
+    a_parser.add_argument("-tc", "--taylor_cut", help="The variance fraction that has to be lost to "
                                                       "consider component important for fit.",
                           type=float, default=None)
-    a_parser.add_argument("-la", "--th_lax", help="The threshold of variance explained by the linear"
+    a_parser.add_argument("-la", "--th_lax", help="The threshold of variance explained by the linear "
                                                   "approximation to consider the fit linear.",
                           type=float, default=None)
-    a_parser.add_argument("-lsq", "--th_sqr", help="The threshold of variance explained by the 2nd order"
+    a_parser.add_argument("-lsq", "--th_sqr", help="The threshold of variance explained by the 2nd order "
                                                    "approximation to consider the fit 2nd order.",
                           type=float, default=None)
 
@@ -78,6 +78,13 @@ if __name__ == '__main__':
                           action="store_true")
     a_parser.add_argument("-sh", "--run_shuffle", help="If set shuffled controls will be run as well.",
                           action='store_true')
+    a_parser.add_argument("-nsh", "--n_shuffles", help="Number of shuffled controls per response. If larger than 1 all"
+                                                       " controls of a response are fit jointly and permutation"
+                                                       " p-values are reported.",
+                          type=int, default=None)
+    a_parser.add_argument("-jsh", "--joint_shuffle", help="If set, shuffled controls of each response are fit in the"
+                                                          " same training pass as the model of the real response.",
+                          action='store_true')
     a_parser.add_argument("-j", "--jacobian", help="Store the Jacobians (linear receptive fields) for each response.",
                           action='store_true')
     a_parser.add_argument("-mq", "--miner_quiet", help="Do not receive updates on model fitting in command line",
@@ -88,9 +95,70 @@ if __name__ == '__main__':
     a_parser.add_argument("-z", "--train_progress", help="If set, training progress across episodes will"
                                                          " be saved and plotted.",
                           action="store_true")
+    a_parser.add_argument("-nc", "--no_cache", help="If set, input data will be parsed and interpolated even if"
+                                                    " preprocessed data of a previous run is stored in the output"
+                                                    " directory.",
+                          action="store_true")
+    a_parser.add_argument("-nsc", "--no_stage_cache", help="If set, models are re-fit and all outputs re-generated"
+                                                           " even if a previous run in the output directory used the"
+                                                           " same data and parameters. No stage manifest is written.",
+                          action="store_true")
+    a_parser.add_argument("-npl", "--no_plots", help="If set, no plots are generated. They can later be generated"
+                                                     " from the analysis file with Mine-reanalyze.",
+                          action="store_true")
+    a_parser.add_argument("-nw", "--n_workers", help="Number of processes used to parse episode files and to fit"
+                                                     " independent (non-episodic) file pairs concurrently.",
+                          type=int, default=None)
+    a_parser.add_argument("-mb", "--memory_budget", help="Memory in GB that a fit, or concurrently fit file pairs in"
+                                                         " total, may use. Defaults to 3/4 of the system memory.",
+                          type=float, default=None)
+    a_parser.add_argument("-amp", "--apply_memory_plan", help="If set, Taylor expansion chunk size and streaming of"
+                                                              " training data are adjusted to fit the memory budget.",
+                          action="store_true")
+    a_parser.add_argument("-ipf", "--interpolated_format", help="File format of the interpolated predictors and"
+                                                                " responses.",
+                          type=str, choices=["csv", "hdf5", "parquet"], default=None)
+    a_parser.add_argument("-rff", "--receptive_field_format", help="File format of the receptive field tables.",
+                          type=str, choices=["csv", "hdf5", "parquet"], default=None)
+    a_parser.add_argument("-sd", "--shard", help="Only fit one shard of the responses, given as i/n where i is the"
+                                                 " 0-based index of the shard and n the total number of shards."
+                                                 " Shard outputs are combined with Mine-merge.",
+                          type=str, default=None)
+    # Suite2p parameters - only used if responses are suite2p output directories
+    a_parser.add_argument("-isc", "--th_iscell", help="Threshold on suite2p classifier to consider object as a neuron.",
+                          type=float, default=0.5)
+    a_parser.add_argument("-dc", "--deconv", help="If set use deconvolved suite2p data instead of fluorescence.",
+                          action="store_true")
+    a_parser.add_argument("-ft", "--frame_time", help="Time between consecutive suite2p frames in the same unit as"
+                                                      " used for predictors. If not set the suite2p frame rate is"
+                                                      " used.",
+                          type=float, default=None)
+
+    # NWB parameters - only used if predictors or responses are NWB files
+    a_parser.add_argument("-nwp", "--nwb_predictors", help="Names of NWB time series to use as predictors. If not set"
+                                                           " all non-imaging time series are used.",
+                          type=str, nargs='+', default=None)
+    a_parser.add_argument("-nwr", "--nwb_responses", help="Names of NWB time series to use as responses. If not set"
+                                                          " all RoiResponseSeries are used.",
+                          type=str, nargs='+', default=None)
 
     args = a_parser.parse_args()
 
+    fh.Suite2pParser.th_iscell = args.th_iscell
+    fh.Suite2pParser.deconvolved = args.deconv
+    fh.Suite2pParser.frame_time = args.frame_time
+    fh.NWBParser.predictor_series = args.nwb_predictors
+    fh.NWBParser.response_series = args.nwb_responses
+
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = [int(v) for v in args.shard.split("/")]
+        except ValueError:
+            raise ValueError(f"Shard has to be given as i/n not {args.shard}")
+        if len(shard) != 2 or shard[1] < 1 or not (0 <= shard[0] < shard[1]):
+            raise ValueError(f"Shard has to be given as i/n with 0 <= i < n not {args.shard}")
+
     # Deal with path-type arguments
     r_paths = fh.process_file_args(args.responses)
     p_paths = fh.process_file_args(args.predictors)
@@ -142,6 +210,13 @@ if __name__ == '__main__':
     else:
         fit_jacobian = False
     miner_verbose = False if args.miner_quiet else True
+    n_shuffles = config_dict["n_shuffles"] if args.n_shuffles is None else args.n_shuffles
+    if n_shuffles < 1:
+        raise ValueError(f"Number of shuffles has to be at least 1 not {n_shuffles}")
+    if args.joint_shuffle or config_dict["joint_shuffle"]:
+        joint_shuffle = True
+    else:
+        joint_shuffle = False
     if args.ignore_mem or config_dict["ignore_memory_warning"]:
         ignore_mem = True
     else:
@@ -150,6 +225,21 @@ if __name__ == '__main__':
         train_progress = True
     else:
         train_progress = False
+    preprocessing_cache = False if args.no_cache else config_dict["preprocessing_cache"]
+    stage_cache = False if args.no_stage_cache else config_dict["stage_cache"]
+    plots = False if args.no_plots else config_dict["plots"]
+    n_workers = config_dict["n_workers"] if args.n_workers is None else args.n_workers
+    memory_budget = config_dict["memory_budget"] if args.memory_budget is None else args.memory_budget
+    if args.apply_memory_plan or config_dict["apply_memory_plan"]:
+        apply_memory_plan = True
+    else:
+        apply_memory_plan = False
+    interpolated_format = config_dict["interpolated_format"] if args.interpolated_format is None \
+        else args.interpolated_format
+    receptive_field_format = config_dict["receptive_field_format"] if args.receptive_field_format is None \
+        else args.receptive_field_format
+    if n_workers < 1:
+        raise ValueError(f"Number of workers has to be at least 1 not {n_workers}")
 
     # set valued parameters
     history = config_dict["history"] if args.history is None else args.history
@@ -173,6 +263,8 @@ if __name__ == '__main__':
             {
                 "use_time": time_as_pred,
                 "run_shuffle": run_shuffle,
+                "n_shuffles": n_shuffles,
+                "joint_shuffle": joint_shuffle,
                 "th_test": th_test,
                 "taylor_sig": taylor_sig,
                 "taylor_cut": taylor_cut,
@@ -187,6 +279,14 @@ if __name__ == '__main__':
                 "downsampling": downsampling,
                 "ignore_memory_warning": ignore_mem,
                 "train_progress": train_progress,
+                "preprocessing_cache": preprocessing_cache,
+                "stage_cache": stage_cache,
+                "n_workers": n_workers,
+                "memory_budget": memory_budget,
+                "apply_memory_plan": apply_memory_plan,
+                "interpolated_format": interpolated_format,
+                "receptive_field_format": receptive_field_format,
+                "plots": plots,
                 "episodic": is_episodic
             },
         "run":
@@ -195,29 +295,13 @@ if __name__ == '__main__':
                 "timestamp": datetime.now().isoformat(),
             }
     }
+    if shard is not None:
+        configuration["run"]["shard"] = shard
 
     print()
     print("#### RUN STARTED ####", flush=True)
 
-    if not is_episodic:
-        for i, pair in enumerate(file_pairs):
-            # add files to config information
-            configuration["run"]["predictor_file"] = pair[1]
-            configuration["run"]["response_file"] = pair[0]
-
-
-            ###
-            # Load and process data
-            ###
-            process_paired_files([pair[0]], [pair[1]], configuration)
-    else:
-        r_files = [pair[0] for pair in file_pairs]
-        p_files = [pair[1] for pair in file_pairs]
-        # add files to config information
-        configuration["run"]["predictor_files"] = p_files
-        configuration["run"]["response_files"] = r_files
-
-        process_paired_files(r_files, p_files, configuration)
+    run_file_pairs(file_pairs, configuration)
 
     print()
     print("#### RUN ENDED ####", flush=True)
\ No newline at end of file
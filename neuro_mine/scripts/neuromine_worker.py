@@ -0,0 +1,335 @@
+"""
+Script for a long-running worker that processes MINE jobs from a queue directory in one warm process. This avoids
+paying interpreter startup, TensorFlow import and graph compilation for every recording. Several workers, also on
+different machines sharing a file system, can process the same queue as jobs are claimed through lock files.
+
+A job is a JSON file in the queue directory with the following structure:
+    {
+        "predictors": [<predictor directory or filepath(s)>],
+        "responses": [<response directory or filepath(s)>],
+        "outdir": <output directory>,
+        "config": {<optional run parameters as in the config section of a run configuration file>},
+        "shard": <optional shard as [i, n]>
+    }
+Besides run parameters, "config" may contain the file parser options of Mine: "th_iscell", "deconv" and "frame_time"
+for suite2p directories and "nwb_predictors" and "nwb_responses" for NWB files.
+For each job <name>.json the worker creates <name>.json.lock when claiming it and writes the state of the job to
+<name>.json.status. To re-run a job delete its lock and status files. While a job is running, its worker regularly
+refreshes the modification time of the lock. Locks of unfinished jobs that were not refreshed for longer than the
+stale time, or whose worker process no longer exists on the same host, are taken over by other workers such that jobs
+of killed workers are not lost.
+"""
+
+import argparse
+from datetime import datetime
+import json
+import os
+from os import path
+import psutil
+import socket
+import threading
+import time
+import traceback
+from typing import Dict, Optional, Tuple
+import neuro_mine.lib.file_handling as fh
+from neuro_mine.lib.mine import Mine
+from neuro_mine.lib.options import default_options
+from neuro_mine.lib.processing import run_file_pairs
+
+
+# job config keys of parser options and the parser class attributes they set
+job_parser_options = {
+    "th_iscell": (fh.Suite2pParser, "th_iscell"),
+    "deconv": (fh.Suite2pParser, "deconvolved"),
+    "frame_time": (fh.Suite2pParser, "frame_time"),
+    "nwb_predictors": (fh.NWBParser, "predictor_series"),
+    "nwb_responses": (fh.NWBParser, "response_series")
+}
+
+
+class JobException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def claim_job(job_path: str, worker_name: str) -> bool:
+    """
+    Atomically claims a job by creating its lock file, which records the worker, its host and process id
+    :param job_path: The path to the job file
+    :param worker_name: The name of the worker claiming the job
+    :return: True if the job was claimed, False if it was already claimed by another worker
+    """
+    try:
+        fd = os.open(job_path + ".lock", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as lock_file:
+        json.dump({"worker": worker_name, "host": socket.gethostname(), "pid": os.getpid(),
+                   "claimed": datetime.now().isoformat()}, lock_file)
+    return True
+
+
+def job_state(job_path: str) -> Optional[str]:
+    """
+    Returns the state recorded in the status file of a job
+    :param job_path: The path to the job file
+    :return: The state or None if the job has no readable status
+    """
+    try:
+        with open(job_path + ".status") as status_file:
+            return json.load(status_file).get("state", None)
+    except (OSError, json.decoder.JSONDecodeError):
+        return None
+
+
+def read_lock(lock_path: str) -> Optional[Tuple[float, str]]:
+    """
+    Reads a lock file, identifying the claim of its worker
+    :param lock_path: The path to the lock file
+    :return: The modification time and contents of the lock or None if it does not exist or can't be read
+    """
+    try:
+        mtime = os.path.getmtime(lock_path)
+        with open(lock_path, "rb") as lock_file:
+            return mtime, lock_file.read().decode(errors="replace")
+    except OSError:
+        return None
+
+
+def lock_is_stale(lock: Tuple[float, str], stale_after: float) -> bool:
+    """
+    Determines whether a lock belongs to a worker that stopped, either because it was not refreshed within the stale
+    time or because its process no longer exists on this host
+    :param lock: The modification time and contents of the lock as returned by read_lock
+    :param stale_after: Seconds after which a lock that was not refreshed is considered stale
+    :return: True if the lock is stale
+    """
+    mtime, contents = lock
+    if time.time() - mtime > stale_after:
+        return True
+    try:
+        owner = json.loads(contents)
+    except json.decoder.JSONDecodeError:
+        # locks of older workers only contain the worker name
+        return False
+    return owner.get("host", None) == socket.gethostname() and not psutil.pid_exists(owner.get("pid", -1))
+
+
+def reclaim_job(job_path: str, worker_name: str, stale_after: float) -> bool:
+    """
+    Takes over the lock of an unfinished job whose worker stopped. The stale lock is atomically moved aside such that
+    only one worker can take it over. If the moved lock is not the one that was judged stale, e.g. because another
+    worker took over the job in the meantime, it is put back without replacing any lock claimed since
+    :param job_path: The path to the job file
+    :param worker_name: The name of the worker claiming the job
+    :param stale_after: Seconds after which a lock that was not refreshed is considered stale
+    :return: True if the job was claimed
+    """
+    lock_path = job_path + ".lock"
+    if job_state(job_path) in ["done", "failed"]:
+        return False
+    lock = read_lock(lock_path)
+    if lock is None or not lock_is_stale(lock, stale_after):
+        return False
+    stale_path = lock_path + f".{worker_name}.stale"
+    try:
+        os.rename(lock_path, stale_path)
+    except OSError:
+        # another worker took over the lock first
+        return False
+    if read_lock(stale_path) != lock:
+        # the lock was refreshed or replaced by another worker between our check and the move, give it back. Linking
+        # fails instead of overwriting if yet another worker claimed the job while the lock was moved aside
+        try:
+            os.link(stale_path, lock_path)
+        except FileExistsError:
+            print(f"### The lock of {job_path} was claimed while being checked for staleness. The job may be "
+                  f"processed twice. ###", flush=True)
+        os.remove(stale_path)
+        return False
+    os.remove(stale_path)
+    print(f"#### Taking over stale lock of {job_path} ####", flush=True)
+    return claim_job(job_path, worker_name)
+
+
+def refresh_lock(lock_path: str, stop: threading.Event, interval: float) -> None:
+    """
+    Regularly refreshes the modification time of a lock until stopped, marking its job as still being processed
+    :param lock_path: The path to the lock file
+    :param stop: Event that ends refreshing
+    :param interval: Seconds between refreshes
+    """
+    while not stop.wait(interval):
+        try:
+            os.utime(lock_path)
+        except OSError as e:
+            # the lock can briefly be missing while another worker checks it for staleness
+            print(f"### Could not refresh lock {lock_path}: {e}. Retrying. ###", flush=True)
+
+
+def set_job_parser_options(job_config: Dict, defaults: Dict) -> None:
+    """
+    Sets the parser options of a job, using the worker defaults for options that the job does not set
+    :param job_config: The config section of the job
+    :param defaults: The parser options of the worker as returned by get_parser_options
+    """
+    fh.set_parser_options(defaults)
+    for key, (cls, attribute) in job_parser_options.items():
+        if key in job_config:
+            setattr(cls, attribute, job_config[key])
+
+
+def write_status(job_path: str, status: Dict) -> None:
+    """
+    Writes the status of a job, replacing the status file atomically such that readers never see partial files
+    :param job_path: The path to the job file
+    :param status: The status dictionary
+    """
+    tmp_path = job_path + f".status.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as status_file:
+        json.dump(status, status_file, indent=2)
+    os.replace(tmp_path, job_path + ".status")
+
+
+def build_configuration(job: Dict) -> Dict:
+    """
+    Creates the run configuration of a job, supplementing parameters that are not set with the default options
+    :param job: The job dictionary
+    :return: Run configuration with "config" and "run" sections
+    """
+    for k in ["predictors", "responses", "outdir"]:
+        if k not in job:
+            raise JobException(f"Job does not contain {k}")
+    if not path.isdir(job["outdir"]):
+        raise NotADirectoryError(f"Output directory {job['outdir']} is not a directory.")
+    config_dict = dict(default_options)
+    config_dict.update(job.get("config", {}))
+    configuration = {
+        "config": config_dict,
+        "run":
+            {
+                "outdir": job["outdir"],
+                "timestamp": datetime.now().isoformat(),
+            }
+    }
+    if job.get("shard", None) is not None:
+        configuration["run"]["shard"] = [int(v) for v in job["shard"]]
+    return configuration
+
+
+def run_job(job_path: str, worker_name: str, stale_after: float, parser_defaults: Dict) -> bool:
+    """
+    Processes one claimed job and records its outcome in the status file
+    :param job_path: The path to the job file
+    :param worker_name: The name of the worker processing the job
+    :param stale_after: Seconds after which a lock that was not refreshed is considered stale
+    :param parser_defaults: The parser options of the worker used for options that the job does not set
+    :return: True if the job succeeded, False otherwise
+    """
+    status = {"state": "running", "worker": worker_name, "started": datetime.now().isoformat()}
+    write_status(job_path, status)
+    stop_refresh = threading.Event()
+    refresher = threading.Thread(target=refresh_lock, args=(job_path + ".lock", stop_refresh, stale_after / 4),
+                                 daemon=True)
+    refresher.start()
+    try:
+        with open(job_path) as job_file:
+            job = json.load(job_file)
+        # like command line arguments predictors and responses may be given as single path or list of paths
+        resp_args = job["responses"] if isinstance(job.get("responses"), list) else [job.get("responses")]
+        pred_args = job["predictors"] if isinstance(job.get("predictors"), list) else [job.get("predictors")]
+        configuration = build_configuration(job)
+        set_job_parser_options(job.get("config", {}), parser_defaults)
+        file_pairs = fh.pair_files(fh.process_file_args(resp_args), fh.process_file_args(pred_args))
+        if len(file_pairs) < 2:
+            # avoids bug in processing single files as episodic data
+            configuration["config"]["episodic"] = False
+        run_file_pairs(file_pairs, configuration)
+        status["state"] = "done"
+    except Exception as e:
+        print(f"### Job {job_path} failed: {e} ###", flush=True)
+        status["state"] = "failed"
+        status["error"] = str(e)
+        status["traceback"] = traceback.format_exc()
+    finally:
+        stop_refresh.set()
+        refresher.join()
+    status["finished"] = datetime.now().isoformat()
+    write_status(job_path, status)
+    return status["state"] == "done"
+
+
+def next_job(queue_dir: str, worker_name: str, stale_after: float) -> Optional[str]:
+    """
+    Finds and claims the next unclaimed job in the queue, in alphabetical order of job files. Jobs whose lock is stale
+    are taken over
+    :param queue_dir: The queue directory
+    :param worker_name: The name of the worker
+    :param stale_after: Seconds after which a lock that was not refreshed is considered stale
+    :return: The path to the claimed job or None if no unclaimed jobs are left
+    """
+    for f in sorted(os.listdir(queue_dir)):
+        if not f.endswith(".json") or f[0] == '.':
+            continue
+        job_path = path.join(queue_dir, f)
+        if path.exists(job_path + ".lock"):
+            if reclaim_job(job_path, worker_name, stale_after):
+                return job_path
+            continue
+        if claim_job(job_path, worker_name):
+            return job_path
+    return None
+
+
+if __name__ == '__main__':
+
+    # the following will prevent tensorflow from using the GPU - as the used models have very low complexity
+    # they will generally be fit faster on the CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+    a_parser = argparse.ArgumentParser(prog="Mine-worker",
+                                       description="Long-running worker that processes MINE jobs from a queue"
+                                                   " directory, reusing compiled models across jobs.")
+    a_parser.add_argument("-q", "--queue", help="Path to the queue directory containing job JSON files.",
+                          type=str, required=True)
+    a_parser.add_argument("-pi", "--poll_interval", help="Seconds to wait before checking the queue for new jobs.",
+                          type=float, default=10.0)
+    a_parser.add_argument("-n", "--name", help="Name of the worker recorded in lock and status files.", type=str,
+                          default=f"{socket.gethostname()}-{os.getpid()}")
+    a_parser.add_argument("-sa", "--stale_after", help="Seconds after which the lock of an unfinished job that was not"
+                                                        " refreshed by its worker is taken over.",
+                          type=float, default=600.0)
+    a_parser.add_argument("-x", "--exit_when_empty", help="If set, the worker exits once the queue is empty instead"
+                                                          " of waiting for new jobs.", action="store_true")
+
+    args = a_parser.parse_args()
+
+    if not path.isdir(args.queue):
+        raise NotADirectoryError(f"Queue directory {args.queue} is not a directory.")
+
+    # reuse models and their compiled graphs across jobs
+    Mine.cache_models = True
+    parser_defaults = fh.get_parser_options()
+
+    print()
+    print(f"#### WORKER {args.name} STARTED ####", flush=True)
+
+    n_done, n_failed = 0, 0
+    try:
+        while True:
+            job_path = next_job(args.queue, args.name, args.stale_after)
+            if job_path is None:
+                if args.exit_when_empty:
+                    break
+                time.sleep(args.poll_interval)
+                continue
+            print(f"#### Processing job {job_path} ####", flush=True)
+            if run_job(job_path, args.name, args.stale_after, parser_defaults):
+                n_done += 1
+            else:
+                n_failed += 1
+    except KeyboardInterrupt:
+        print("Worker interrupted", flush=True)
+
+    print()
+    print(f"#### WORKER {args.name} ENDED. {n_done} jobs done, {n_failed} jobs failed ####", flush=True)
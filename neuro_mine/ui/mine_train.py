@@ -353,7 +353,7 @@ class Ui_Form(object):
 
         self.layoutWidget4 = QWidget(Form)
         self.layoutWidget4.setObjectName(u"layoutWidget4")
-        self.layoutWidget4.setGeometry(QRect(20, 550, 268, 32))
+        self.layoutWidget4.setGeometry(QRect(20, 550, 581, 32))
         self.horizontalLayout_16 = QHBoxLayout(self.layoutWidget4)
         self.horizontalLayout_16.setObjectName(u"horizontalLayout_16")
         self.horizontalLayout_16.setContentsMargins(0, 0, 0, 0)
@@ -371,6 +371,13 @@ class Ui_Form(object):
 
         self.horizontalLayout_16.addWidget(self.pushButton_6)
 
+        self.pushButton_8 = QPushButton(self.layoutWidget4)
+        self.pushButton_8.setObjectName(u"pushButton_8")
+        sizePolicy.setHeightForWidth(self.pushButton_8.sizePolicy().hasHeightForWidth())
+        self.pushButton_8.setSizePolicy(sizePolicy)
+
+        self.horizontalLayout_16.addWidget(self.pushButton_8)
+
         self.layoutWidget5 = QWidget(Form)
         self.layoutWidget5.setObjectName(u"layoutWidget5")
         self.layoutWidget5.setGeometry(QRect(20, 590, 581, 33))
@@ -563,6 +570,7 @@ class Ui_Form(object):
         self.checkBox_3.setText("")
         self.pushButton_5.setText(QCoreApplication.translate("Form", u"Restore Presets", None))
         self.pushButton_6.setText(QCoreApplication.translate("Form", u"Save Parameters", None))
+        self.pushButton_8.setText(QCoreApplication.translate("Form", u"Re-analyze Existing Fit...", None))
         self.pushButton_4.setText(QCoreApplication.translate("Form", u"Populate Parameters from JSON...", None))
         self.groupBox_6.setTitle(QCoreApplication.translate("Form", u"Processing Parameters", None))
         self.label_29.setText(QCoreApplication.translate("Form", u"Use Time as a Predictor:", None))
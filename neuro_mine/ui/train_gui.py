@@ -59,12 +59,13 @@ class Mine_App(QWidget, Ui_Form):
 
         # connect signals
         self.pushButton.clicked.connect(self.on_run_clicked)
-        self.pushButton_2.clicked.connect(lambda: uu.browse_multiple_files(self, self.textEdit, "Predictor File(s)", "Data Files (*.csv *.tsv);;All Files (*)", self.last_dir))
-        self.pushButton_3.clicked.connect(lambda: uu.browse_multiple_files(self, self.textEdit_2, "Response File(s)", "Data Files (*.csv *.tsv);;All Files (*)", self.last_dir))
+        self.pushButton_2.clicked.connect(lambda: uu.browse_multiple_files(self, self.textEdit, "Predictor File(s)", uu.data_file_filter, self.last_dir))
+        self.pushButton_3.clicked.connect(lambda: uu.browse_multiple_files(self, self.textEdit_2, "Response File(s)", uu.data_file_filter, self.last_dir))
         self.pushButton_4.clicked.connect(lambda: self.handle_json_browse(self.lineEdit_11))
         self.pushButton_5.clicked.connect(self.restore_defaults)
         self.pushButton_6.clicked.connect(self.save_to_json)
         self.pushButton_7.clicked.connect(lambda:uu.browse_for_directory(self, self.lineEdit,"Select Output Directory"))
+        self.pushButton_8.clicked.connect(self.on_reanalyze_clicked)
 
         # connect field validation
         self.valid_fields = {}
@@ -204,6 +205,8 @@ class Mine_App(QWidget, Ui_Form):
 
         self.pushButton_6.setEnabled(all_valid)
 
+        self.pushButton_8.setEnabled(all_valid and (self.p is None))
+
     def restore_defaults(self):
         """Restore UI elements to their default preset values."""
         global default_options
@@ -317,6 +320,42 @@ class Mine_App(QWidget, Ui_Form):
             self.p.readyReadStandardError.connect(self.handle_command_line_error)
             self.p.start(sys.executable, args)
 
+    def on_reanalyze_clicked(self):
+        """Re-computes insights and plots of an existing fit using the current analysis thresholds."""
+        analysis_file, _ = QFileDialog.getOpenFileName(self, "Select Analysis File", self.last_dir or "",
+                                                       "Analysis Files (*_analysis.hdf5);;All Files (*)",
+                                                       options=QFileDialog.DontUseNativeDialog)
+        if not analysis_file:
+            return
+        config_file = analysis_file.replace("_analysis.hdf5", "_run_config.json")
+        if not os.path.isfile(config_file):
+            config_file, _ = QFileDialog.getOpenFileName(self, "Select Run Configuration of Fit",
+                                                         os.path.dirname(analysis_file),
+                                                         "JSON Files (*.json)",
+                                                         options=QFileDialog.DontUseNativeDialog)
+            if not config_file:
+                return
+        self.last_dir = os.path.dirname(analysis_file)
+
+        with importlib.resources.path("neuro_mine.scripts", "neuromine_reanalysis.py") as script_path:
+            args = [str(script_path), "--analysis", analysis_file, "--config", config_file]
+
+            for flag, line_edit in [("--th_test", self.lineEdit_2),
+                                    ("--taylor_sig", self.lineEdit_3),
+                                    ("--taylor_cut", self.lineEdit_5),
+                                    ("--th_lax", self.lineEdit_6),
+                                    ("--th_sqr", self.lineEdit_7)]:
+                if line_edit.text():
+                    args.extend([flag, line_edit.text()])
+
+            self.pushButton.setEnabled(False)
+            self.pushButton_8.setEnabled(False)
+            self.p = QProcess()
+            self.p.finished.connect(self.process_finished)
+            self.p.readyReadStandardOutput.connect(self.handle_command_line_update)
+            self.p.readyReadStandardError.connect(self.handle_command_line_error)
+            self.p.start(sys.executable, args)
+
     def process_finished(self):
         self.p = None
         self.update_button_states()
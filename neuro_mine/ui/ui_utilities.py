@@ -5,6 +5,10 @@ Module with common UI functions for main app and predict app
 from PySide6.QtWidgets import QFileDialog, QLineEdit, QTextEdit, QMessageBox
 from PySide6.QtGui import QPalette, QColor
 from pathlib import Path
+from neuro_mine.lib.file_handling import parsers
+
+# file dialog filter for all supported predictor and response file formats
+data_file_filter = f"Data Files ({' '.join(['*' + ext for ext in parsers])});;All Files (*)"
 
 def browse_multiple_files(parent, target_textedit, file_type, file_filter, last_dir):
     files, _ = QFileDialog.getOpenFileNames(